@@ -0,0 +1,544 @@
+"""
+ASGI entry point serving the same resources as the Flask app in api.py, with
+async handlers over an async SQLAlchemy engine. Run it with:
+
+    uvicorn asgi:app
+"""
+import asyncio
+import json
+import os
+
+import api
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.endpoints import HTTPEndpoint
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from api import (
+    STREAM_HEARTBEAT,
+    STREAM_INTERVAL,
+    STREAM_QUEUE_SIZE,
+    STREAM_RETRY,
+    USERS_CHUNK_SIZE,
+    app as flask_app,
+    configure_sqlite_connections,
+    event_catalog,
+    events_schema,
+    queue_scans,
+    repository,
+    select_event_counts,
+    select_skill_counts,
+    select_users_chunk,
+    serialize_user,
+    skills_schema,
+    users_schema,
+    utc_now,
+)
+from changes import (
+    deletion_rows,
+    scan_batch,
+    select_scan_counts,
+    select_scans,
+    sequence_statement,
+    stamp_statements,
+)
+from counters import (
+    event_count_statements,
+    event_seats_statement,
+    skill_count_statements,
+    timeline_statements,
+)
+from models import (
+    ChangeSequence,
+    DeletedUser,
+    EventCount,
+    Skill,
+    SkillName,
+    User,
+)
+from repository import keyset_pages, next_page
+from scripts import profile_skills, skill_rows, valid_skills
+from signals import events_scanned, users_changed, users_deleted
+from stream import MAX_MESSAGE_SCANS, EventStream, format_event
+
+
+def async_database_url(url):
+    """Swap the driver of a database URL for its asyncio counterpart."""
+    url = make_url(url)
+    if url.drivername == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    if url.get_backend_name() == "postgresql":
+        return url.set(drivername="postgresql+asyncpg")
+
+    return url
+
+
+engine = create_async_engine(
+    os.environ.get("ASYNC_DATABASE_URL")
+    or async_database_url(flask_app.config["SQLALCHEMY_DATABASE_URI"])
+)
+configure_sqlite_connections(engine.sync_engine)
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+def respond(data, status):
+    return JSONResponse(data, status_code=status)
+
+
+async def get_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def find_user(session, email, *relationships):
+    return await session.scalar(
+        select(User)
+        .options(*(selectinload(relationship) for relationship in relationships))
+        .where(User.email == email)
+    )
+
+
+async def insert_skills(session, user_id, profile):
+    """Async counterpart of inserting the skill rows of a profile."""
+    names = list(profile_skills(profile))
+    await session.execute(
+        repository.insert(SkillName).on_conflict_do_nothing(
+            index_elements=[SkillName.name]
+        ),
+        [{"name": name} for name in names],
+    )
+    skill_ids = dict(
+        (
+            await session.execute(
+                select(SkillName.name, SkillName.id).where(SkillName.name.in_(names))
+            )
+        ).all()
+    )
+    await session.execute(
+        Skill.__table__.insert(), skill_rows(user_id, profile, skill_ids)
+    )
+
+    return names
+
+
+async def reserve_versions(session, count):
+    """Async counterpart of changes.reserve_versions."""
+    return (await session.execute(sequence_statement(count))).scalar_one() - count + 1
+
+
+async def record_user_changes(session, user_ids):
+    """Async counterpart of changes.record_user_changes."""
+    user_ids = sorted(set(user_ids))
+    first_version = await reserve_versions(session, len(user_ids))
+    for statement, parameters in stamp_statements(user_ids, first_version, utc_now()):
+        await session.execute(statement, parameters)
+
+
+async def generate_users(after_id, limit):
+    """Async counterpart of api.generate_users."""
+    yield "["
+
+    first = True
+    pages = keyset_pages(after_id, limit, USERS_CHUNK_SIZE)
+    page = next(pages, None)
+    async with Session() as session:
+        while page is not None:
+            users = (await session.scalars(select_users_chunk(*page))).all()
+            for user in users:
+                yield ("" if first else ",") + json.dumps(serialize_user(user))
+                first = False
+            page = next_page(pages, users)
+
+    yield "]"
+
+
+class UsersResource(HTTPEndpoint):
+    # GET /users?after_id=after_id&limit=limit
+    async def get(self, request):
+        errors = users_schema.validate(request.query_params)
+        if errors:
+            return respond("Invalid request arguments", 400)
+
+        args = users_schema.load(request.query_params)
+
+        return StreamingResponse(
+            generate_users(args.get("after_id", 0), args.get("limit")),
+            media_type="application/json",
+        )
+
+    # POST /users
+    async def post(self, request):
+        body = await get_json(request) or {}
+
+        name = body.get("name")
+        company = body.get("company")
+        email = body.get("email")
+        phone = body.get("phone")
+
+        # Check for all required body fields
+        if not (name and company and email and phone):
+            return respond("Missing fields in body", 400)
+
+        # If data is missing from a skill, reject the whole registration
+        skills = body.get("skills")
+        if skills and not valid_skills(skills):
+            return respond("Invalid skill entry provided", 400)
+
+        async with Session() as session:
+            # Check if the user is already registered
+            if await find_user(session, email):
+                return respond(f"User '{email}' already exists", 400)
+
+            # Add the new user to the database
+            user = User(name=name, company=company, email=email, phone=phone)
+            session.add(user)
+            await session.flush()
+
+            # Add the skills to the skills database table
+            if skills:
+                names = await insert_skills(session, user.id, body)
+                for statement in skill_count_statements(names, 1):
+                    await session.execute(statement)
+
+            await record_user_changes(session, [user.id])
+            await session.commit()
+
+        users_changed.send(emails=[email])
+
+        return respond(f"User '{email}' was successfully registered", 200)
+
+
+class UserResource(HTTPEndpoint):
+    # GET /users/:email
+    async def get(self, request):
+        email = request.path_params["email"]
+        async with Session() as session:
+            user = await find_user(session, email, User.skills, User.events)
+
+            if not user:
+                return respond(f"User '{email}' does not exist", 400)
+
+            return respond(serialize_user(user), 200)
+
+    # PUT /users/:email
+    async def put(self, request):
+        email = request.path_params["email"]
+        body = await get_json(request)
+
+        async with Session() as session:
+            user = await find_user(session, email, User.skills)
+
+            if not user:
+                return respond(f"User '{email}' does not exist", 400)
+
+            if not body:
+                return respond("Could not update user '{email}'", 400)
+
+            new_email = body.get("email")
+            new_skills = body.get("skills")
+
+            # If data is missing from a skill, reject the whole update
+            if new_skills and not valid_skills(new_skills):
+                return respond("Invalid skill entry provided", 400)
+
+            if new_email:
+                if await find_user(session, new_email):
+                    return respond(
+                        f"Update failed, user with email '{new_email}' already exists",
+                        400,
+                    )
+
+                user.email = new_email
+            for column in ("name", "company", "phone"):
+                if body.get(column):
+                    setattr(user, column, body.get(column))
+            if new_skills:
+                # Replace all existing skills for the user
+                old_skill_names = [skill.skill for skill in user.skills]
+                await session.execute(delete(Skill).where(Skill.user_id == user.id))
+                names = await insert_skills(session, user.id, body)
+
+                for statement in [
+                    *skill_count_statements(old_skill_names, -1),
+                    *skill_count_statements(names, 1),
+                ]:
+                    await session.execute(statement)
+
+            await record_user_changes(session, [user.id])
+            await session.commit()
+
+        users_changed.send(emails=[email, new_email or email])
+
+        return respond(f"User '{email}' was successfully updated", 200)
+
+    # DELETE /users/:email
+    async def delete(self, request):
+        email = request.path_params["email"]
+        async with Session() as session:
+            user = await find_user(session, email, User.skills, User.events)
+
+            if not user:
+                return respond(f"User '{email}' does not exist", 400)
+
+            for statement in [
+                *skill_count_statements([skill.skill for skill in user.skills], -1),
+                *event_count_statements(
+                    [(event.event, event.category) for event in user.events], -1
+                ),
+                *timeline_statements(
+                    [
+                        (event.event, event.category, event.scanned_at)
+                        for event in user.events
+                        if event.scanned_at is not None
+                    ],
+                    -1,
+                ),
+            ]:
+                await session.execute(statement)
+            await session.delete(user)
+            await session.execute(
+                DeletedUser.__table__.insert(),
+                deletion_rows(
+                    [(user.id, email)], await reserve_versions(session, 1), utc_now()
+                ),
+            )
+            await session.commit()
+
+        users_deleted.send(emails=[email])
+
+        return respond(f"User '{email}' was successfully deleted", 200)
+
+
+class UserEventsResource(HTTPEndpoint):
+    # GET /users/events/:email
+    async def get(self, request):
+        email = request.path_params["email"]
+        async with Session() as session:
+            user = await find_user(session, email, User.events)
+
+            if not user:
+                return respond(f"User '{email}' does not exist", 400)
+
+            return respond(
+                [
+                    {"event": event.event, "category": event.category}
+                    for event in user.events
+                ],
+                200,
+            )
+
+    # POST /users/events/:email
+    async def post(self, request):
+        email = request.path_params["email"]
+        async with Session() as session:
+            user = await find_user(session, email)
+
+            if not user:
+                return respond(f"User '{email}' does not exist", 400)
+
+            body = await get_json(request) or {}
+            event = body.get("event")
+            category = body.get("category")
+
+            if not (event and category):
+                return respond("Missing fields in body", 400)
+
+            # Check if the event is one from the approved list
+            if not (isinstance(event, str) and isinstance(category, str)):
+                return respond("Invalid event data in body", 400)
+            entry = await run_in_threadpool(lookup_event, event, category)
+            if entry is None:
+                return respond("Invalid event data in body", 400)
+
+            # Appending to the scan queue waits for an fsync, so run it in the
+            # thread pool
+            if api.scan_queue is not None:
+                busy = await run_in_threadpool(
+                    queue_scans,
+                    [{"email": email, "event": event, "category": category}],
+                )
+                if busy:
+                    message, status, headers = busy
+                    return JSONResponse(message, status_code=status, headers=headers)
+                return respond(f"Scan of user '{email}' to event was queued", 202)
+
+            # Add the new event, unless the user is already registered to it
+            # (including concurrently)
+            scanned_at = utc_now()
+            inserted = await session.execute(
+                repository.new_events_statement(),
+                {"user_id": user.id, "event_id": entry.id, "scanned_at": scanned_at},
+            )
+            if not inserted.first():
+                return respond(f"User '{email}' is already registered to event", 400)
+
+            # Take a seat at the event if it is limited, counting the user. A
+            # full event rolls the registration back
+            if entry.capacity is None:
+                statements = event_count_statements([(event, category)], 1)
+            else:
+                seat = await session.execute(
+                    event_seats_statement(event, category, 1, entry.capacity)
+                )
+                if not seat.first():
+                    return respond(f"Event '{event}' is full", 400)
+                statements = []
+
+            for statement in [
+                *statements,
+                *timeline_statements([(event, category, scanned_at)], 1),
+            ]:
+                await session.execute(statement)
+            await record_user_changes(session, [user.id])
+            await session.commit()
+
+        events_scanned.send(scans=[(email, event, category)])
+
+        return respond(f"Successfully registered event to user '{email}'", 200)
+
+
+def lookup_event(event, category):
+    # A changed catalog file is reloaded, through the engine of the Flask app.
+    # Blocking, so run it in the thread pool
+    with flask_app.app_context():
+        return event_catalog.lookup(event, category)
+
+
+async def read_event_counts(keys=None):
+    """
+    Return the {event, category, count} counts of the (event, category) keys,
+    or of every event, in descending order of popularity.
+    """
+    statement = select_event_counts({})
+    if keys is not None:
+        statement = statement.where(
+            tuple_(EventCount.event, EventCount.category).in_(list(keys))
+        )
+    async with Session() as session:
+        rows = (await session.execute(statement)).all()
+
+    return [{"event": row[0], "category": row[1], "count": row[2]} for row in rows]
+
+
+async def read_scans(since):
+    """
+    Return the last version given out and the scans written after version
+    since up to it, by any process: the first MAX_MESSAGE_SCANS of them as
+    (email, event, category) tuples, their number, and the (event, category)
+    pairs scanned into. With since None, only the last version is read.
+    """
+    async with Session() as session:
+        head = await session.scalar(select(ChangeSequence.value)) or 0
+        if since is None or head <= since:
+            return scan_batch(head, [], [])
+
+        return scan_batch(
+            head,
+            (
+                await session.execute(
+                    select_scans(since, head).limit(MAX_MESSAGE_SCANS)
+                )
+            ).all(),
+            (await session.execute(select_scan_counts(since, head))).all(),
+        )
+
+
+event_stream = EventStream(
+    read_scans,
+    read_event_counts,
+    interval=STREAM_INTERVAL,
+    queue_size=STREAM_QUEUE_SIZE,
+)
+
+
+async def generate_stream():
+    queue = await event_stream.subscribe()
+    try:
+        # Subscribed before reading the counts, so no scan is missed in between
+        yield f"retry: {STREAM_RETRY}\n\n".encode() + format_event(
+            "counts", {"counts": await read_event_counts()}
+        )
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), STREAM_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            # The client fell too far behind, and reconnects to catch up
+            if message is None:
+                return
+            yield message
+    finally:
+        event_stream.unsubscribe(queue)
+
+
+class EventStreamResource(HTTPEndpoint):
+    # GET /stream/events
+    async def get(self, request):
+        return StreamingResponse(
+            generate_stream(),
+            media_type="text/event-stream",
+            # Keep proxies from buffering the stream
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+
+class SkillsResource(HTTPEndpoint):
+    # GET /skills?min_frequency=min_frequency&max_frequency=max_frequency&limit=limit&offset=offset
+    async def get(self, request):
+        errors = skills_schema.validate(request.query_params)
+        if errors:
+            return respond("Invalid request arguments", 400)
+
+        args = skills_schema.load(request.query_params)
+        async with Session() as session:
+            skills = (await session.execute(select_skill_counts(args))).all()
+
+        return respond([{"skill": row[0], "count": row[1]} for row in skills], 200)
+
+
+class EventsResource(HTTPEndpoint):
+    # GET /events?category=category&min_frequency=min_frequency&max_frequency=max_frequency&limit=limit&offset=offset
+    async def get(self, request):
+        errors = events_schema.validate(request.query_params)
+        if errors:
+            return respond("Invalid request arguments", 400)
+
+        args = events_schema.load(request.query_params)
+        async with Session() as session:
+            events = (await session.execute(select_event_counts(args))).all()
+
+        return respond(
+            [{"event": row[0], "category": row[1], "count": row[2]} for row in events],
+            200,
+        )
+
+
+async def connect_engine():
+    # SQLAlchemy runs the handlers of the first connection of a pool under a
+    # thread lock, which concurrent first requests would wait on with the
+    # event loop blocked, so open it before serving
+    async with engine.connect():
+        pass
+
+
+app = Starlette(
+    routes=[
+        Route("/users", UsersResource),
+        Route("/users/events/{email}", UserEventsResource),
+        Route("/users/{email}", UserResource),
+        Route("/skills", SkillsResource),
+        Route("/events", EventsResource),
+        Route("/stream/events", EventStreamResource),
+    ],
+    on_startup=[connect_engine, event_stream.start],
+    on_shutdown=[event_stream.stop, engine.dispose],
+)
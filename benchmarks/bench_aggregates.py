@@ -0,0 +1,182 @@
+"""
+Benchmark GET /skills and GET /events with frequency and category filters.
+
+For 10k, 100k and 1M skill rows (and as many event rows), compares the original
+implementation (GROUP BY over unindexed tables, then filtering in Python)
+against the current one (filters pushed into SQL over the popularity counters
+maintained on write).
+Run from the project root:
+
+    python -m benchmarks.bench_aggregates
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(SCRATCH_DIR, "bench.db")
+
+from flask import request
+from flask_restful import Resource
+from sqlalchemy import func, text
+
+from api import api, app, db, event_catalog, Event, Skill
+from counters import rebuild_counters
+from models import CatalogEvent, SkillName
+from scripts import bulk_load_profiles
+from .synthetic import generate_profiles, generate_scans
+
+
+SCALES = [10_000, 100_000, 1_000_000]
+REPEAT = 5
+
+# Average number of skills per synthetic profile
+SKILLS_PER_PROFILE = 3
+
+INDEXES = [
+    "ix_skill_skill_id",
+    "ix_event_category_event",
+    "ix_event_user_id",
+]
+
+
+class LegacySkillsResource(Resource):
+    # The GET /skills implementation before filters were pushed into SQL
+    def get(self):
+        skills = (
+            db.session.query(SkillName.name, func.count().label("count"))
+            .join(Skill.skill_name)
+            .group_by(SkillName.name)
+            .order_by(func.count().desc())
+            .all()
+        )
+
+        min_frequency = request.args.getlist("min_frequency")
+        if min_frequency:
+            skills = list(
+                filter(lambda skill: (skill.count >= int(min_frequency[0])), skills)
+            )
+
+        max_frequency = request.args.getlist("max_frequency")
+        if max_frequency:
+            skills = list(
+                filter(lambda skill: (skill.count <= int(max_frequency[0])), skills)
+            )
+
+        return [{"skill": row[0], "count": row[1]} for row in skills], 200
+
+
+class LegacyEventsResource(Resource):
+    # The GET /events implementation before filters were pushed into SQL
+    def get(self):
+        events = (
+            db.session.query(
+                CatalogEvent.event,
+                CatalogEvent.category,
+                func.count(CatalogEvent.event).label("count"),
+            )
+            .join(Event.catalog_event)
+            .group_by(CatalogEvent.event)
+            .order_by(func.count(CatalogEvent.event).desc())
+            .all()
+        )
+
+        category = request.args.getlist("category")
+        if category:
+            events = list(filter(lambda event: (event.category == category[0]), events))
+
+        min_frequency = request.args.getlist("min_frequency")
+        if min_frequency:
+            events = list(
+                filter(lambda event: (event.count >= int(min_frequency[0])), events)
+            )
+
+        max_frequency = request.args.getlist("max_frequency")
+        if max_frequency:
+            events = list(
+                filter(lambda event: (event.count <= int(max_frequency[0])), events)
+            )
+
+        return [
+            {"event": row[0], "category": row[1], "count": row[2]} for row in events
+        ], 200
+
+
+api.add_resource(LegacySkillsResource, "/legacy/skills")
+api.add_resource(LegacyEventsResource, "/legacy/events")
+
+
+def seed(skill_rows):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        event_catalog.load()
+
+        user_count, _ = bulk_load_profiles(
+            generate_profiles(skill_rows // SKILLS_PER_PROFILE)
+        )
+        db.session.execute(
+            Event.__table__.insert(),
+            generate_scans(
+                range(1, user_count + 1),
+                [entry.id for entry in event_catalog.entries()],
+            ),
+        )
+        rebuild_counters()
+        db.session.commit()
+
+        return (
+            db.session.query(func.count()).select_from(Skill).scalar(),
+            db.session.query(func.count(Event.id)).scalar(),
+        )
+
+
+def drop_indexes():
+    with app.app_context(), db.engine.begin() as connection:
+        for index in INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {index}"))
+
+
+def median_latency(client, url):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.data
+
+    return statistics.median(timings)
+
+
+def main(scales):
+    client = app.test_client()
+
+    print(
+        f"{'skill rows':>10} {'event rows':>10} {'query':<52} "
+        f"{'before ms':>10} {'after ms':>10}"
+    )
+    for scale in scales:
+        skill_count, event_count = seed(scale)
+        frequency = scale // 200
+        queries = [
+            "/skills",
+            f"/skills?min_frequency={frequency}&max_frequency={frequency * 2}",
+            "/events",
+            f"/events?category=Workshop&min_frequency={frequency}",
+        ]
+
+        after = {query: median_latency(client, query) for query in queries}
+        drop_indexes()
+        before = {query: median_latency(client, "/legacy" + query) for query in queries}
+
+        for query in queries:
+            print(
+                f"{skill_count:>10} {event_count:>10} {query:<52} "
+                f"{before[query] * 1000:>10.1f} {after[query] * 1000:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SCALES)
@@ -0,0 +1,98 @@
+"""
+Benchmark GET /export/users over 10k and 100k synthetic profiles.
+
+Reports, for each format with and without gzip, the time to the first byte,
+the time to the last byte, the size of the export and the peak memory
+allocated while streaming it, which should stay flat as the number of
+profiles grows. Run from the project root:
+
+    python -m benchmarks.bench_export
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(SCRATCH_DIR, "bench.db")
+
+from api import app, db, event_catalog, Event
+from scripts import bulk_load_profiles
+from .synthetic import generate_profiles, generate_scans
+
+
+SCALES = [10_000, 100_000]
+URLS = [
+    ("/export/users?format=ndjson", {}),
+    ("/export/users?format=ndjson", {"Accept-Encoding": "gzip"}),
+    ("/export/users?format=csv", {}),
+    ("/export/users?format=csv", {"Accept-Encoding": "gzip"}),
+]
+
+
+def seed(count):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        event_catalog.load()
+
+        user_count, _ = bulk_load_profiles(generate_profiles(count))
+        db.session.execute(
+            Event.__table__.insert(),
+            generate_scans(
+                range(1, user_count + 1),
+                [entry.id for entry in event_catalog.entries()],
+            ),
+        )
+        db.session.commit()
+
+
+def stream(client, url, headers):
+    start = time.perf_counter()
+    response = client.get(url, headers=headers, buffered=False)
+
+    first_byte = None
+    size = 0
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        size += len(chunk)
+    response.close()
+
+    return first_byte, time.perf_counter() - start, size
+
+
+def measure(client, url, headers):
+    first_byte, elapsed, size = stream(client, url, headers)
+
+    # Tracing allocations slows the export down, so it gets a run of its own
+    tracemalloc.start()
+    stream(client, url, headers)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return first_byte, elapsed, size, peak
+
+
+def main(scales):
+    client = app.test_client()
+
+    print(
+        f"{'profiles':>10} {'export':<36} {'ttfb ms':>10} {'total ms':>10} "
+        f"{'MB':>8} {'peak MB':>8}"
+    )
+    for count in scales:
+        seed(count)
+
+        for url, headers in URLS:
+            first_byte, elapsed, size, peak = measure(client, url, headers)
+            name = url + (" (gzip)" if headers else "")
+            print(
+                f"{count:>10} {name:<36} {first_byte * 1000:>10.1f} "
+                f"{elapsed * 1000:>10.1f} {size / 2**20:>8.1f} {peak / 2**20:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SCALES)
@@ -0,0 +1,83 @@
+"""
+Benchmark the streaming profile import over 10k and 100k synthetic profiles.
+
+Writes the profiles to a JSON array file and an NDJSON file, then reports for
+each the import throughput and the peak memory allocated while importing,
+which should stay flat as the files grow. Run from the project root:
+
+    python -m benchmarks.bench_import
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(SCRATCH_DIR, "bench.db")
+# Measure the import rather than the cache invalidations
+os.environ["CACHE_BACKEND"] = "none"
+
+from api import app, db
+from importer import import_profiles
+from .synthetic import generate_profiles
+
+
+SCALES = [10_000, 100_000]
+
+
+def write_files(count):
+    profiles = generate_profiles(count)
+    json_path = os.path.join(SCRATCH_DIR, f"profiles-{count}.json")
+    with open(json_path, "w") as f:
+        json.dump(profiles, f)
+
+    ndjson_path = os.path.join(SCRATCH_DIR, f"profiles-{count}.ndjson")
+    with open(ndjson_path, "w") as f:
+        for profile in profiles:
+            f.write(json.dumps(profile) + "\n")
+
+    return [("json", json_path), ("ndjson", ndjson_path)]
+
+
+def run_import(path, trace):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        if trace:
+            tracemalloc.start()
+        with open(path, "rb") as f:
+            report = import_profiles(f, path)
+        peak = tracemalloc.get_traced_memory()[1] if trace else None
+        tracemalloc.stop()
+
+    assert report["completed"] and not report["rejected"], report
+    return report, peak
+
+
+def main(scales):
+    print(
+        f"{'profiles':>10} {'format':<8} {'file MB':>8} {'seconds':>8} "
+        f"{'profiles/sec':>13} {'peak MB':>8}"
+    )
+    for count in scales:
+        for format, path in write_files(count):
+            start = time.perf_counter()
+            report, _ = run_import(path, trace=False)
+            elapsed = time.perf_counter() - start
+
+            # Tracing allocations slows the import down, so it gets a run of
+            # its own
+            _, peak = run_import(path, trace=True)
+
+            print(
+                f"{count:>10} {format:<8} {os.path.getsize(path) / 2**20:>8.1f} "
+                f"{elapsed:>8.2f} {report['profiles_per_second']:>13} "
+                f"{peak / 2**20:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SCALES)
@@ -0,0 +1,99 @@
+"""
+Benchmark the in-memory read model over 100k synthetic profiles.
+
+Reports how long building the read model from the database, writing its
+snapshot and memory-mapping the snapshot take, along with its size, then the
+median latency of the read endpoints served from the database and from the
+read model. Run from the project root:
+
+    python -m benchmarks.bench_readmodel
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(SCRATCH_DIR, "bench.db")
+# Measure the read paths rather than the cache
+os.environ["CACHE_BACKEND"] = "none"
+
+from sqlalchemy import select
+
+import api
+from api import app, db, User
+from readmodel import ReadModel
+from scripts import bulk_load_profiles
+from .synthetic import generate_profiles
+
+
+SCALES = [100_000]
+REPEAT = 50
+
+
+def seed(count):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        bulk_load_profiles(generate_profiles(count))
+        db.session.commit()
+
+        return db.session.scalar(select(User.email).where(User.id == count // 2))
+
+
+def median_latency(client, url):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        response = client.get(url)
+        response.get_data()
+        timings.append(time.perf_counter() - start)
+
+    assert response.status_code == 200, url
+    return statistics.median(timings)
+
+
+def main(scales):
+    client = app.test_client()
+    for count in scales:
+        email = seed(count)
+        path = os.path.join(SCRATCH_DIR, f"read_model-{count}.snapshot")
+        database_url = app.config["SQLALCHEMY_DATABASE_URI"]
+
+        with app.app_context():
+            start = time.perf_counter()
+            ReadModel(database_url, max_age=60, snapshot_path=path).warm_up()
+            build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            read_model = ReadModel(database_url, max_age=60, snapshot_path=path)
+            read_model.warm_up()
+            load = time.perf_counter() - start
+
+        print(
+            f"{count} profiles: built and wrote the snapshot in {build:.2f}s, "
+            f"memory-mapped it in {load * 1000:.1f}ms "
+            f"({os.path.getsize(path) / 2**20:.1f}MB)"
+        )
+
+        urls = [
+            "/users?after_id=5000&limit=100",
+            "/users?after_id=5000&limit=2000",
+            f"/users/{email}",
+            "/skills?min_frequency=10",
+            "/events?category=Workshop",
+        ]
+        print(f"{'url':<36} {'database ms':>12} {'read model ms':>14}")
+        for url in urls:
+            api.read_model = None
+            database = median_latency(client, url)
+            api.read_model = read_model
+            in_memory = median_latency(client, url)
+            print(f"{url:<36} {database * 1000:>12.2f} {in_memory * 1000:>14.2f}")
+
+        api.read_model = None
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SCALES)
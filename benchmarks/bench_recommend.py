@@ -0,0 +1,130 @@
+"""
+Benchmark skill matching and similar-user lookups over 100k synthetic profiles
+drawing from 300 distinct skills.
+
+Reports how long building the skill matrix takes, and the median latency of
+matching and similarity queries against the matrix and against a pure Python
+scan of every user's skills. Run from the project root:
+
+    python -m benchmarks.bench_recommend
+"""
+import heapq
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(SCRATCH_DIR, "bench.db")
+
+
+from api import app, db, skill_matrix
+from scripts import bulk_load_profiles
+from search import select_skill_rows
+from .synthetic import generate_profiles
+
+
+SCALES = [100_000]
+SKILL_COUNT = 300
+REPEAT = 20
+LIMIT = 10
+
+
+def seed(count):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        bulk_load_profiles(
+            generate_profiles(
+                count, skill_names=[f"Skill {i}" for i in range(SKILL_COUNT)]
+            )
+        )
+        db.session.commit()
+
+        skills = {}
+        for user_id, skill, rating in db.session.execute(select_skill_rows()):
+            skills.setdefault(user_id, {})[skill.lower()] = rating
+
+    skill_matrix.invalidate()
+    return skills
+
+
+def python_match(skills, requirements):
+    scores = []
+    for user_id, ratings in skills.items():
+        if all(ratings.get(skill, 0) >= rating for skill, rating, _ in requirements):
+            score = sum(ratings[skill] * weight for skill, _, weight in requirements)
+            scores.append((-score, user_id))
+
+    return heapq.nsmallest(LIMIT, scores)
+
+
+def python_similar(skills, user_id):
+    ratings = skills[user_id]
+    norm = math.sqrt(sum(rating * rating for rating in ratings.values()))
+    similarities = []
+    for other_id, other_ratings in skills.items():
+        dot = sum(
+            rating * other_ratings.get(skill, 0) for skill, rating in ratings.items()
+        )
+        if other_id != user_id and dot:
+            other_norm = math.sqrt(sum(r * r for r in other_ratings.values()))
+            similarities.append((-dot / (norm * other_norm), other_id))
+
+    return heapq.nsmallest(LIMIT, similarities)
+
+
+def median_latency(query):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        query()
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings)
+
+
+def main(scales):
+    requirements = [("skill 1", 3, 2.0), ("skill 2", 1, 1.0)]
+    any_requirements = [("skill 1", 4, 1.0), ("skill 2", 4, 1.0), ("skill 3", 4, 1.0)]
+
+    print(f"{'profiles':>10} {'query':<32} {'matrix ms':>10} {'python ms':>10}")
+    for count in scales:
+        skills = seed(count)
+
+        with app.app_context():
+            start = time.perf_counter()
+            skill_matrix.match(requirements)
+            elapsed = time.perf_counter() - start
+            print(f"{count:>10} {'(matrix build)':<32} {elapsed * 1000:>10.1f}")
+
+            queries = [
+                (
+                    "match all of 2 skills",
+                    lambda: skill_matrix.match(requirements),
+                    lambda: python_match(skills, requirements),
+                ),
+                (
+                    "match any of 3 skills",
+                    lambda: skill_matrix.match(any_requirements, require_all=False),
+                    None,
+                ),
+                (
+                    "similar users",
+                    lambda: skill_matrix.similar(1),
+                    lambda: python_similar(skills, 1),
+                ),
+            ]
+            for name, query, baseline in queries:
+                latency = median_latency(query)
+                baseline_latency = median_latency(baseline) if baseline else math.nan
+                print(
+                    f"{count:>10} {name:<32} {latency * 1000:>10.1f} "
+                    f"{baseline_latency * 1000:>10.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SCALES)
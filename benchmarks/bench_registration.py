@@ -0,0 +1,64 @@
+"""
+Benchmark user registration throughput: one POST /users request per user
+against POST /users/bulk batches. Run from the project root:
+
+    python -m benchmarks.bench_registration
+"""
+import os
+import sys
+import tempfile
+import time
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(SCRATCH_DIR, "bench.db")
+os.environ["SEED_MODE"] = "reset"
+
+from api import app
+from scripts import init_db
+from .synthetic import generate_profiles
+
+
+USER_COUNT = 2000
+BATCH_SIZES = [100, 1000]
+
+
+def bench_single(client, profiles):
+    init_db()
+    start = time.perf_counter()
+    for profile in profiles:
+        response = client.post("/users", json=profile)
+        assert response.status_code == 200, response.data
+    return time.perf_counter() - start
+
+
+def bench_bulk(client, profiles, batch_size):
+    init_db()
+    start = time.perf_counter()
+    for i in range(0, len(profiles), batch_size):
+        response = client.post("/users/bulk", json=profiles[i : i + batch_size])
+        assert response.status_code == 200, response.data
+    return time.perf_counter() - start
+
+
+def main(user_count):
+    client = app.test_client()
+    # Synthetic emails don't collide with the seeded ones
+    profiles = generate_profiles(user_count)
+
+    print(f"{'mode':<20} {'users':>8} {'seconds':>10} {'users/sec':>12}")
+
+    elapsed = bench_single(client, profiles)
+    print(
+        f"{'single':<20} {user_count:>8} {elapsed:>10.3f} {user_count / elapsed:>12.0f}"
+    )
+
+    for batch_size in BATCH_SIZES:
+        elapsed = bench_bulk(client, profiles, batch_size)
+        mode = f"bulk of {batch_size}"
+        print(
+            f"{mode:<20} {user_count:>8} {elapsed:>10.3f} {user_count / elapsed:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else USER_COUNT)
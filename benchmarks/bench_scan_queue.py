@@ -0,0 +1,135 @@
+"""
+Benchmark the latency of POST /users/events/:email under a burst of concurrent
+scans sent to gunicorn, committing every scan in its own transaction against
+appending it to the write-behind scan queue (SCAN_QUEUE=1), which then writes
+the scans in batches. Reports the p50/p99 latency of the scans and how long
+after the burst every scan was registered. Run from the project root:
+
+    python -m benchmarks.bench_scan_queue [scan_count]
+"""
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from .load_test import free_port
+
+SCRATCH_DIR = tempfile.mkdtemp()
+
+SCAN_COUNT = 5000
+CONCURRENCY = 32
+WORKERS = 4
+
+EVENTS = json.load(open("./mock_data/events_data.json"))
+
+
+def start_server(port, scan_queue):
+    env = {
+        **os.environ,
+        "DATABASE_URL": "sqlite:///" + os.path.join(SCRATCH_DIR, f"{scan_queue}.db"),
+        "SEED_MODE": "reset",
+        "CACHE_BACKEND": "none",
+        "BIND": f"127.0.0.1:{port}",
+        "WEB_CONCURRENCY": str(WORKERS),
+        "SCAN_QUEUE": scan_queue,
+        "SCAN_QUEUE_DIR": os.path.join(SCRATCH_DIR, "scans"),
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "api:app"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            return process, request(port, "GET", "/users?limit=100000")[1]
+        except OSError:
+            time.sleep(0.2)
+
+    process.kill()
+    raise RuntimeError("gunicorn did not start")
+
+
+def request(port, method, url, body=None, connection=None):
+    connection = connection or http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"Content-Type": "application/json"}
+    connection.request(method, url, body and json.dumps(body), headers)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def burst(port, scans):
+    """Send scans from CONCURRENCY clients, returning the latency of each."""
+    latencies = []
+    statuses = []
+
+    def client(scans):
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        for scan in scans:
+            body = {"event": scan["event"], "category": scan["category"]}
+            start = time.perf_counter()
+            status, _ = request(
+                port, "POST", f"/users/events/{scan['email']}", body, connection
+            )
+            latencies.append(time.perf_counter() - start)
+            statuses.append(status)
+
+    threads = [
+        threading.Thread(target=client, args=(scans[i::CONCURRENCY],))
+        for i in range(CONCURRENCY)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert set(statuses) <= {200, 202, 400}, set(statuses)
+    return sorted(latencies)
+
+
+def registered_scans(port):
+    _, events = request(port, "GET", "/events")
+    return sum(event["count"] for event in events)
+
+
+def main(scan_count):
+    print(f"{'mode':<8} {'scans':>8} {'p50 ms':>8} {'p99 ms':>8} {'written s':>10}")
+    for mode, scan_queue in [("direct", "0"), ("queued", "1")]:
+        port = free_port()
+        process, users = start_server(port, scan_queue)
+        try:
+            rng = random.Random(0)
+            scans = [
+                {"email": rng.choice(users)["email"], **rng.choice(EVENTS)}
+                for _ in range(scan_count)
+            ]
+            expected = len({(scan["email"], scan["event"]) for scan in scans})
+            expected += registered_scans(port)
+
+            start = time.perf_counter()
+            latencies = burst(port, scans)
+            # Wait for every queued scan to be registered
+            while registered_scans(port) < expected:
+                time.sleep(0.01)
+            written = time.perf_counter() - start
+
+            print(
+                f"{mode:<8} {scan_count:>8} "
+                f"{latencies[len(latencies) // 2] * 1000:>8.2f} "
+                f"{latencies[int(len(latencies) * 0.99)] * 1000:>8.2f} "
+                f"{written:>10.3f}"
+            )
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else SCAN_COUNT)
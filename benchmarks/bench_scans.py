@@ -0,0 +1,80 @@
+"""
+Benchmark event scanning throughput: one POST /users/events/:email request per
+badge against POST /events/scans batches. Run from the project root:
+
+    python -m benchmarks.bench_scans
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(SCRATCH_DIR, "bench.db")
+os.environ["SEED_MODE"] = "reset"
+
+from api import app, db, Event, EventCount, User
+
+EVENTS = json.load(open("./mock_data/events_data.json"))
+
+
+SCAN_COUNT = 5000
+BATCH_SIZES = [100, 1000, 5000]
+
+
+def generate_scans(count, seed=0):
+    with app.app_context():
+        emails = [email for (email,) in db.session.query(User.email)]
+
+    rng = random.Random(seed)
+    return [{"email": rng.choice(emails), **rng.choice(EVENTS)} for _ in range(count)]
+
+
+def clear_scans():
+    with app.app_context():
+        db.session.execute(Event.__table__.delete())
+        db.session.execute(EventCount.__table__.delete())
+        db.session.commit()
+
+
+def bench_single(client, scans):
+    clear_scans()
+    start = time.perf_counter()
+    for scan in scans:
+        body = {"event": scan["event"], "category": scan["category"]}
+        client.post(f"/users/events/{scan['email']}", json=body)
+    return time.perf_counter() - start
+
+
+def bench_batch(client, scans, batch_size):
+    clear_scans()
+    start = time.perf_counter()
+    for i in range(0, len(scans), batch_size):
+        response = client.post("/events/scans", json=scans[i : i + batch_size])
+        assert response.status_code == 200, response.data
+    return time.perf_counter() - start
+
+
+def main(scan_count):
+    client = app.test_client()
+    scans = generate_scans(scan_count)
+
+    print(f"{'mode':<20} {'scans':>8} {'seconds':>10} {'scans/sec':>12}")
+
+    elapsed = bench_single(client, scans)
+    print(
+        f"{'single':<20} {scan_count:>8} {elapsed:>10.3f} {scan_count / elapsed:>12.0f}"
+    )
+
+    for batch_size in BATCH_SIZES:
+        elapsed = bench_batch(client, scans, batch_size)
+        mode = f"batch of {batch_size}"
+        print(
+            f"{mode:<20} {scan_count:>8} {elapsed:>10.3f} {scan_count / elapsed:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else SCAN_COUNT)
@@ -0,0 +1,89 @@
+"""
+Benchmark GET /users/search over 10k and 100k synthetic profiles.
+
+Reports how long building the search index takes, and the median latency of
+text, fuzzy, filtered and unfiltered searches (facet counts included) once it
+is built. Run from the project root:
+
+    python -m benchmarks.bench_search
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(SCRATCH_DIR, "bench.db")
+# Measure the index rather than the response cache
+os.environ["CACHE_BACKEND"] = "none"
+
+from api import app, db, event_catalog, search_index, Event
+from scripts import bulk_load_profiles
+from .synthetic import generate_profiles, generate_scans, load_events
+
+
+SCALES = [10_000, 100_000]
+REPEAT = 20
+
+
+def seed(count):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        event_catalog.load()
+
+        user_count, _ = bulk_load_profiles(generate_profiles(count))
+        db.session.execute(
+            Event.__table__.insert(),
+            generate_scans(
+                range(1, user_count + 1),
+                [entry.id for entry in event_catalog.entries()],
+            ),
+        )
+        db.session.commit()
+
+    search_index.invalidate()
+
+
+def median_latency(client, url):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.data
+
+    return statistics.median(timings)
+
+
+def main(scales):
+    client = app.test_client()
+    event, category = load_events()[0]
+    queries = [
+        "/users/search",
+        "/users/search?q=gra",
+        "/users/search?q=grace%20nguyen",
+        "/users/search?q=nguyne",
+        "/users/search?skill=python&min_rating=4",
+        f"/users/search?event={event}&category={category}",
+        f"/users/search?q=hiro&skill=python&min_rating=3&category={category}",
+    ]
+
+    print(f"{'profiles':>10} {'query':<72} {'ms':>10}")
+    for count in scales:
+        seed(count)
+
+        with app.app_context():
+            start = time.perf_counter()
+            search_index.search()
+            elapsed = time.perf_counter() - start
+        print(f"{count:>10} {'(index build)':<72} {elapsed * 1000:>10.1f}")
+
+        for query in queries:
+            latency = median_latency(client, query)
+            print(f"{count:>10} {query:<72} {latency * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SCALES)
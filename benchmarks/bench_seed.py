@@ -0,0 +1,58 @@
+"""
+Benchmark the bulk seed loader used by scripts.init_db.
+
+Seeds 1k, 10k and 100k synthetic profiles into a scratch SQLite database and
+reports how long each load takes. Run from the project root:
+
+    python -m benchmarks.bench_seed
+
+Set BENCH_DATABASE_URL to benchmark another database instead, e.g. the COPY
+path of a local PostgreSQL server (every table in it is dropped).
+"""
+import os
+import sys
+import tempfile
+import time
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = os.environ.get(
+    "BENCH_DATABASE_URL", "sqlite:///" + os.path.join(SCRATCH_DIR, "bench.db")
+)
+
+from api import app, db
+from scripts import bulk_load_profiles
+from .synthetic import generate_profiles
+
+
+SCALES = [1_000, 10_000, 100_000]
+
+
+def bench_seed(count):
+    profiles = generate_profiles(count)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        start = time.perf_counter()
+        user_count, skill_count = bulk_load_profiles(profiles)
+        elapsed = time.perf_counter() - start
+
+    return user_count, skill_count, elapsed
+
+
+def main(scales):
+    print(
+        f"{'profiles':>10} {'users':>10} {'skills':>10} {'seconds':>10} {'rows/sec':>12}"
+    )
+    for count in scales:
+        user_count, skill_count, elapsed = bench_seed(count)
+        rows_per_sec = (user_count + skill_count) / elapsed
+        print(
+            f"{count:>10} {user_count:>10} {skill_count:>10} "
+            f"{elapsed:>10.3f} {rows_per_sec:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SCALES)
@@ -0,0 +1,116 @@
+"""
+Benchmark the share of GET /users latency spent serializing users to JSON, over
+100k synthetic profiles, reading them from the database and from the read
+model.
+
+Compares encoding every user with the json module, with orjson, and joining
+per-user fragments cached by an earlier request. Serialization time comes from
+the request metrics. Run from the project root:
+
+    python -m benchmarks.bench_serialization
+"""
+import os
+import random
+import sys
+import tempfile
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(SCRATCH_DIR, "bench.db")
+# Only the fragments are cached, never whole responses
+os.environ["CACHE_BACKEND"] = "none"
+
+import api
+import serialization
+from api import app, db
+from cache import LRUBackend
+from metrics import request_duration, request_serialization_duration
+from readmodel import ReadModel
+from scripts import bulk_load_profiles
+from .synthetic import generate_profiles
+
+
+SCALES = [100_000]
+REQUESTS = 50
+PAGE_SIZE = 1000
+
+
+def seed(count):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        bulk_load_profiles(generate_profiles(count))
+        db.session.commit()
+
+
+def totals(histogram, labels):
+    """Return the number and sum of the observations of a series."""
+    counts = histogram.snapshot().get(labels, [0])
+    return sum(counts[:-1]), counts[-1] if len(counts) > 1 else 0
+
+
+def measure(client, count):
+    """
+    Return the mean latency and serialization time of GET /users requests
+    for pages of PAGE_SIZE users, in milliseconds.
+    """
+    rng = random.Random(0)
+    labels = ("GET", "/users")
+    _, duration = totals(request_duration, (*labels, "200"))
+    _, serialization_time = totals(request_serialization_duration, labels)
+
+    for _ in range(REQUESTS):
+        after_id = rng.randint(0, count - PAGE_SIZE)
+        # Metrics are recorded once the response is closed
+        with client.get(f"/users?after_id={after_id}&limit={PAGE_SIZE}") as response:
+            response.get_data()
+
+    new_duration = totals(request_duration, (*labels, "200"))[1] - duration
+    new_serialization = (
+        totals(request_serialization_duration, labels)[1] - serialization_time
+    )
+    return new_duration / REQUESTS * 1000, new_serialization / REQUESTS * 1000
+
+
+def main(scales):
+    client = app.test_client()
+    orjson = serialization.orjson
+    fragments = LRUBackend(max_entries=None, max_bytes=512 * 1024 * 1024, ttl=3600)
+    modes = [
+        ("json module", None, None),
+        ("orjson", orjson, None),
+        ("orjson + cached fragments", orjson, fragments),
+    ]
+
+    print(
+        f"{'profiles':>10} {'source':<11} {'encoding':<26} {'latency ms':>11} "
+        f"{'serialize ms':>13} {'share':>6}"
+    )
+    for count in scales:
+        seed(count)
+        read_model = ReadModel(app.config["SQLALCHEMY_DATABASE_URI"])
+        with app.app_context():
+            read_model.warm_up()
+
+        for source, model in [("database", None), ("read model", read_model)]:
+            api.read_model = model
+            for name, encoder, backend in modes:
+                serialization.orjson = encoder
+                api.user_fragments.backend = backend
+                if backend is not None:
+                    backend.clear()
+                    # Cache the fragments of every user
+                    measure(client, count)
+
+                latency, serialization_time = measure(client, count)
+                print(
+                    f"{count:>10} {source:<11} {name:<26} {latency:>11.2f} "
+                    f"{serialization_time:>13.2f} {serialization_time / latency:>6.0%}"
+                )
+
+        api.read_model = None
+        serialization.orjson = orjson
+        api.user_fragments.backend = None
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SCALES)
@@ -0,0 +1,180 @@
+"""
+Benchmark the storage of skills: (user_id, skill_id, rating) rows referencing
+the interned names of the skill_name table, against the legacy skill table
+holding the name of the skill in every row, under an id of its own.
+
+Seeds 1M skill rows into a scratch SQLite database and builds a copy of it with
+the legacy skill table. Reports the size of both database files and of their
+skill tables and indexes alone, the median
+latency of the GROUP BY counting the users of every skill (what GET /skills
+ran before the popularity counters, and what flask check-counters still runs),
+the median latency of GET /skills, and how long migrating the legacy copy takes.
+Run from the project root:
+
+    python -m benchmarks.bench_skill_storage [skill_rows]
+"""
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+SCRATCH_DIR = tempfile.mkdtemp()
+DATABASE_PATH = os.path.join(SCRATCH_DIR, "bench.db")
+LEGACY_PATH = os.path.join(SCRATCH_DIR, "legacy.db")
+MIGRATED_PATH = os.path.join(SCRATCH_DIR, "migrated.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + DATABASE_PATH
+os.environ["CACHE_BACKEND"] = "none"
+
+from sqlalchemy import create_engine
+
+from api import app, db
+from counters import rebuild_counters
+from models import SkillName
+from scripts import bulk_load_profiles, migrate_skill_names
+from .synthetic import generate_profiles
+
+
+SKILL_ROWS = 1_000_000
+REPEAT = 5
+
+# Average number of skills per synthetic profile
+SKILLS_PER_PROFILE = 3
+
+# Seed SKILL_ROWS // SKILLS_PER_PROFILE profiles in batches of this many
+SEED_BATCH_SIZE = 50_000
+
+GROUP_BY_QUERIES = {
+    "legacy": "SELECT skill, count(*) FROM skill GROUP BY skill",
+    # Counted over the skill_id index, naming only the counted skills
+    "interned": (
+        "SELECT skill_name.name, counts.count FROM "
+        "(SELECT skill_id, count(*) AS count FROM skill GROUP BY skill_id) AS counts "
+        "JOIN skill_name ON skill_name.id = counts.skill_id"
+    ),
+}
+
+LEGACY_LAYOUT = [
+    "CREATE TABLE legacy_skill (id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER, "
+    "skill VARCHAR(100) NOT NULL, rating INTEGER NOT NULL)",
+    "INSERT INTO legacy_skill (user_id, skill, rating) "
+    "SELECT user_id, skill_name.name, rating FROM skill "
+    "JOIN skill_name ON skill_name.id = skill.skill_id ORDER BY user_id",
+    "DROP TABLE skill",
+    "DROP TABLE skill_name",
+    "ALTER TABLE legacy_skill RENAME TO skill",
+    "CREATE INDEX ix_skill_user_id ON skill (user_id)",
+    "CREATE INDEX ix_skill_skill ON skill (skill)",
+]
+
+
+def seed(skill_rows):
+    profile_count = skill_rows // SKILLS_PER_PROFILE
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for start in range(0, profile_count, SEED_BATCH_SIZE):
+            bulk_load_profiles(
+                generate_profiles(
+                    min(SEED_BATCH_SIZE, profile_count - start), start=start
+                )
+            )
+        rebuild_counters()
+        db.session.commit()
+        db.session.remove()
+        db.engine.dispose()
+
+
+def execute_script(path, statements):
+    connection = sqlite3.connect(path, isolation_level=None)
+    try:
+        for statement in statements:
+            connection.execute(statement)
+    finally:
+        connection.close()
+
+
+def median_latency(run):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings)
+
+
+def skill_bytes(path):
+    """Return the size of the skill tables and of their indexes."""
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(
+            "SELECT sum(pgsize) FROM dbstat WHERE name IN (SELECT name FROM "
+            "sqlite_schema WHERE tbl_name IN ('skill', 'skill_name'))"
+        ).fetchone()[0]
+    finally:
+        connection.close()
+
+
+def group_by_latency(path, layout):
+    connection = sqlite3.connect(path)
+    try:
+        return median_latency(
+            lambda: connection.execute(GROUP_BY_QUERIES[layout]).fetchall()
+        )
+    finally:
+        connection.close()
+
+
+def skills_latency(client):
+    def get_skills():
+        response = client.get("/skills")
+        assert response.status_code == 200, response.data
+
+    return median_latency(get_skills)
+
+
+def migrate(path):
+    """Migrate the legacy database at path, returning how long it took."""
+    engine = create_engine("sqlite:///" + path)
+    try:
+        with engine.begin() as connection:
+            SkillName.__table__.create(connection)
+            start = time.perf_counter()
+            migrate_skill_names(connection)
+            return time.perf_counter() - start
+    finally:
+        engine.dispose()
+
+
+def main(skill_rows):
+    seed(skill_rows)
+    execute_script(DATABASE_PATH, ["VACUUM"])
+    shutil.copy(DATABASE_PATH, LEGACY_PATH)
+    execute_script(LEGACY_PATH, [*LEGACY_LAYOUT, "VACUUM"])
+    shutil.copy(LEGACY_PATH, MIGRATED_PATH)
+
+    connection = sqlite3.connect(DATABASE_PATH)
+    row_count = connection.execute("SELECT count(*) FROM skill").fetchone()[0]
+    connection.close()
+
+    print(
+        f"{'layout':<10} {'skill rows':>10} {'db MB':>8} {'skill MB':>9} "
+        f"{'GROUP BY ms':>12}"
+    )
+    for layout, path in [("legacy", LEGACY_PATH), ("interned", DATABASE_PATH)]:
+        print(
+            f"{layout:<10} {row_count:>10} "
+            f"{os.path.getsize(path) / 1024 / 1024:>8.1f} "
+            f"{skill_bytes(path) / 1024 / 1024:>9.1f} "
+            f"{group_by_latency(path, layout) * 1000:>12.1f}"
+        )
+
+    print(f"GET /skills: {skills_latency(app.test_client()) * 1000:.2f} ms")
+    print(f"Migrating the legacy database: {migrate(MIGRATED_PATH):.2f} s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else SKILL_ROWS)
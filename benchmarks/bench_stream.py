@@ -0,0 +1,211 @@
+"""
+Benchmark GET /stream/events: opens many subscribers to the ASGI app under
+uvicorn, sends a burst of scans through POST /users/events/:email, and reports
+how long after the last scan every subscriber had received all of them, how
+many messages the burst was coalesced into, and the number of threads of the
+server. Run from the project root:
+
+    python -m benchmarks.bench_stream [subscribers]
+"""
+import asyncio
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from .load_test import free_port
+
+SCRATCH_DIR = tempfile.mkdtemp()
+
+SUBSCRIBERS = 500
+SCAN_COUNT = 1000
+CONCURRENCY = 16
+
+EVENTS = json.load(open("./mock_data/events_data.json"))
+
+
+def start_server(port):
+    env = {
+        **os.environ,
+        "DATABASE_URL": "sqlite:///" + os.path.join(SCRATCH_DIR, "bench.db"),
+        "SEED_MODE": "reset",
+        "CACHE_BACKEND": "none",
+    }
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "asgi:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            return process, request(port, "GET", "/users?limit=100000")
+        except OSError:
+            time.sleep(0.2)
+
+    process.kill()
+    raise RuntimeError("uvicorn did not start")
+
+
+def request(port, method, url, body=None, connection=None):
+    """Send a request, returning the body of a GET and the status otherwise."""
+    connection = connection or http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"Content-Type": "application/json"}
+    connection.request(method, url, body and json.dumps(body), headers)
+    response = connection.getresponse()
+    data = response.read()
+    if method == "GET":
+        return json.loads(data)
+    return response.status
+
+
+def thread_count(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("Threads:"):
+                return int(line.split()[1])
+
+
+class Subscriber:
+    def __init__(self):
+        self.scan_count = 0
+        self.messages = 0
+        self.ready = asyncio.Event()
+        self.done = asyncio.Event()
+        self.expected = None
+        self.done_at = None
+
+    def check(self):
+        if self.expected is not None and self.scan_count >= self.expected:
+            self.done_at = time.perf_counter()
+            self.done.set()
+
+    async def listen(self, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /stream/events HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        buffer = b""
+        try:
+            while not self.done.is_set():
+                chunk = await reader.read(65536)
+                if not chunk:
+                    return
+                buffer += chunk
+                # Every message is sent as a chunk of its own, so the chunk
+                # framing never splits a line of a message
+                *messages, buffer = buffer.split(b"\n\n")
+                for message in messages:
+                    if b"event: counts" in message:
+                        self.ready.set()
+                    elif b"event: scans" in message:
+                        data = message.split(b"data: ", 1)[1]
+                        self.scan_count += json.loads(data)["scan_count"]
+                        self.messages += 1
+                        self.check()
+        finally:
+            writer.close()
+
+
+def send_scans(port, scans):
+    """Send scans from CONCURRENCY clients, returning the count of each status."""
+    statuses = Counter()
+
+    def client(scans):
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        for scan in scans:
+            body = {"event": scan["event"], "category": scan["category"]}
+            url = f"/users/events/{scan['email']}"
+            try:
+                statuses[request(port, "POST", url, body, connection)] += 1
+            except OSError:
+                # uvicorn closes the connection after a 500
+                statuses["reset"] += 1
+                connection = http.client.HTTPConnection("127.0.0.1", port)
+
+    threads = [
+        threading.Thread(target=client, args=(scans[i::CONCURRENCY],))
+        for i in range(CONCURRENCY)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return statuses
+
+
+async def run(port, server_pid, users, subscriber_count):
+    subscribers = [Subscriber() for _ in range(subscriber_count)]
+    tasks = [asyncio.create_task(subscriber.listen(port)) for subscriber in subscribers]
+    await asyncio.wait_for(
+        asyncio.gather(*(subscriber.ready.wait() for subscriber in subscribers)), 60
+    )
+    # Let the threads of the connections opened for the initial counts exit
+    await asyncio.sleep(1)
+    threads = thread_count(server_pid)
+
+    # Distinct scans, since concurrent duplicates race to the unique constraint
+    rng = random.Random(0)
+    scans = [
+        {"email": user["email"], **event}
+        for user, event in rng.sample(
+            [(user, event) for user in users for event in EVENTS], SCAN_COUNT
+        )
+    ]
+    statuses = await asyncio.get_running_loop().run_in_executor(
+        None, send_scans, port, scans
+    )
+    sent_at = time.perf_counter()
+
+    for subscriber in subscribers:
+        subscriber.expected = statuses[200]
+        subscriber.check()
+    await asyncio.wait_for(
+        asyncio.gather(*(subscriber.done.wait() for subscriber in subscribers)), 60
+    )
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    lags = sorted(max(subscriber.done_at - sent_at, 0) for subscriber in subscribers)
+    print(f"subscribers: {subscriber_count}, server threads: {threads}")
+    print(f"scans sent: {SCAN_COUNT}, responses by status: {dict(statuses)}")
+    print(
+        "messages per subscriber: "
+        f"{statistics.median(subscriber.messages for subscriber in subscribers):.0f}"
+    )
+    print(
+        f"delivered after the last scan: p50 {lags[len(lags) // 2] * 1000:.1f} ms, "
+        f"max {lags[-1] * 1000:.1f} ms"
+    )
+
+
+def main(subscriber_count):
+    port = free_port()
+    process, users = start_server(port)
+    try:
+        asyncio.run(run(port, process.pid, users, subscriber_count))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else SUBSCRIBERS)
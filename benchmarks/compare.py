@@ -0,0 +1,96 @@
+"""
+Compare two result files written by benchmarks.suite, e.g. from the parent
+commit and from the current one, and flag the scenarios that got slower.
+Exits with status 1 when there is a regression, so it can gate CI. Run from
+the project root:
+
+    python -m benchmarks.compare baseline.json current.json [--threshold 0.2]
+"""
+import argparse
+import json
+import sys
+
+
+# Relative slowdown of a scenario flagged as a regression
+THRESHOLD = 0.2
+
+# Slowdowns smaller than this many milliseconds are noise, whatever their
+# relative size
+MIN_DELTA_MS = 0.2
+
+METRICS = ["p50_ms", "p95_ms", "mean_ms"]
+
+
+def compare(baseline, current, threshold=THRESHOLD, metric="p50_ms"):
+    """
+    Return a (scale, scenario, baseline value, current value, relative change,
+    regressed) tuple for every scenario run at the same scale in both results.
+    """
+    rows = []
+    for scale, result in current["scales"].items():
+        baseline_result = baseline["scales"].get(scale)
+        if baseline_result is None:
+            continue
+
+        for scenario, timings in result["scenarios"].items():
+            baseline_timings = baseline_result["scenarios"].get(scenario)
+            if baseline_timings is None:
+                continue
+
+            before, after = baseline_timings[metric], timings[metric]
+            change = (after - before) / before if before else 0
+            regressed = change > threshold and after - before > MIN_DELTA_MS
+            rows.append((scale, scenario, before, after, change, regressed))
+
+    return rows
+
+
+def print_comparison(rows, metric="p50_ms"):
+    print(
+        f"{'scale':>6} {'scenario':<20} {'before ' + metric:>14} "
+        f"{'after ' + metric:>14} {'change':>8}"
+    )
+    for scale, scenario, before, after, change, regressed in rows:
+        print(
+            f"{scale:>6} {scenario:<20} {before:>14.2f} {after:>14.2f} "
+            f"{change:>+8.0%}{'  REGRESSION' if regressed else ''}"
+        )
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline", help="result file to compare against")
+    parser.add_argument("current", help="result file of the run to check")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help="relative slowdown flagged as a regression (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--metric",
+        choices=METRICS,
+        default="p50_ms",
+        help="latency compared (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    print(f"Comparing {baseline.get('commit')} to {current.get('commit')}")
+    rows = compare(baseline, current, args.threshold, args.metric)
+    print_comparison(rows, args.metric)
+
+    regressions = [row for row in rows if row[-1]]
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,147 @@
+"""
+Load test comparing the Flask app (flask run) with the ASGI app (uvicorn):
+requests/sec and p50/p99 latency under concurrent clients, for a mix of the
+read endpoints. Both servers run against the same scratch database, with the
+response cache disabled. Run from the project root:
+
+    python -m benchmarks.load_test [duration_seconds]
+"""
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SCRATCH_DIR = tempfile.mkdtemp()
+
+DURATION = 10
+CONCURRENCY_LEVELS = [1, 16, 64]
+
+SERVERS = {
+    "flask": [sys.executable, "-m", "flask", "--app", "api", "run", "--port", "{port}"],
+    "asgi": [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "asgi:app",
+        "--port",
+        "{port}",
+        "--log-level",
+        "warning",
+    ],
+}
+
+URLS = [
+    "/users/bowmancynthia@example.net",
+    "/skills?min_frequency=20",
+    "/events",
+    "/users?limit=20",
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(name, port):
+    env = {
+        **os.environ,
+        "DATABASE_URL": "sqlite:///" + os.path.join(SCRATCH_DIR, "bench.db"),
+        "CACHE_BACKEND": "none",
+    }
+    command = [arg.format(port=port) for arg in SERVERS[name]]
+    process = subprocess.Popen(
+        command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+
+    process.kill()
+    raise RuntimeError(f"{name} server did not start")
+
+
+def client(port, deadline, latencies, errors):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    i = 0
+    while time.monotonic() < deadline:
+        url = URLS[i % len(URLS)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            connection.request("GET", url)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException):
+            errors.append(None)
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+        # The Flask development server closes connections after each response
+        if response.getheader("Connection", "").lower() == "close":
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+
+    connection.close()
+
+
+def run_load(port, concurrency, duration):
+    latencies = []
+    errors = []
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=client, args=(port, deadline, latencies, errors))
+        for _ in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / duration,
+        "p50": latencies[len(latencies) // 2] if latencies else 0,
+        "p99": latencies[int(len(latencies) * 0.99)] if latencies else 0,
+    }
+
+
+def main(duration):
+    print(
+        f"{'server':<8} {'clients':>8} {'requests':>10} {'errors':>8} "
+        f"{'req/sec':>10} {'p50 ms':>10} {'p99 ms':>10}"
+    )
+    for name in SERVERS:
+        port = free_port()
+        process = start_server(name, port)
+        try:
+            for concurrency in CONCURRENCY_LEVELS:
+                result = run_load(port, concurrency, duration)
+                print(
+                    f"{name:<8} {concurrency:>8} {result['requests']:>10} "
+                    f"{result['errors']:>8} {result['rps']:>10.0f} "
+                    f"{result['p50'] * 1000:>10.1f} {result['p99'] * 1000:>10.1f}"
+                )
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else DURATION)
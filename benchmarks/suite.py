@@ -0,0 +1,313 @@
+"""
+Benchmark suite running one scenario per route of api.py against synthetic
+data at several scales (1k, 10k, 100k and 1m users), with skewed skill and
+event popularity. Writes the latency of every scenario as JSON, tagged with
+the current commit, so runs can be compared with benchmarks.compare. Run from
+the project root:
+
+    python -m benchmarks.suite --scales 1k,10k --output results.json \\
+        [--baseline previous.json]
+
+The response cache is disabled, so every request reaches the database. Set
+BENCH_DATABASE_URL to benchmark another database (every table in it is
+dropped).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = os.environ.get(
+    "BENCH_DATABASE_URL", "sqlite:///" + os.path.join(SCRATCH_DIR, "bench.db")
+)
+os.environ["CACHE_BACKEND"] = "none"
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+
+from api import app, db, event_catalog, repository, Event, User
+from counters import rebuild_counters
+from scripts import bulk_load_profiles
+from .compare import compare, print_comparison
+from .synthetic import generate_profiles, generate_scans, load_events, load_skill_names
+
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_SCALES = ["1k", "10k", "100k"]
+
+# Profiles generated and inserted per transaction while seeding
+SEED_BATCH_SIZE = 50_000
+
+# Zipf exponents of the popularity of skills and events
+SKILL_SKEW = 1.1
+EVENT_SKEW = 0.8
+
+ITERATIONS = 200
+WARMUP = 10
+
+
+def seed(count):
+    """Load count synthetic users with their skills and events."""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        event_catalog.load()
+        event_ids = [entry.id for entry in event_catalog.entries()]
+
+        for start in range(0, count, SEED_BATCH_SIZE):
+            first_id = (db.session.scalar(select(func.max(User.id))) or 0) + 1
+            user_count, _ = bulk_load_profiles(
+                generate_profiles(
+                    min(SEED_BATCH_SIZE, count - start), skew=SKILL_SKEW, start=start
+                )
+            )
+            repository.bulk_insert(
+                Event,
+                generate_scans(
+                    range(first_id, first_id + user_count),
+                    event_ids,
+                    seed=start,
+                    skew=EVENT_SKEW,
+                ),
+            )
+            db.session.commit()
+
+        rebuild_counters()
+        db.session.commit()
+
+
+def sample_users(count, rng):
+    """
+    Return the email and the registered (event, category) pairs of
+    ITERATIONS + WARMUP users picked at random (repeating them at small scales).
+    """
+    user_ids = [rng.randint(1, count) for _ in range(ITERATIONS + WARMUP)]
+    with app.app_context():
+        # A user picked twice shares the same set of events
+        users = {
+            user.id: (
+                user.email,
+                {(event.event, event.category) for event in user.events},
+            )
+            for user in repository.users_by_id(set(user_ids))
+        }
+
+    return [users[user_id] for user_id in user_ids]
+
+
+def build_scenarios(count, rng):
+    """
+    Return the requests of every scenario, as {name: [(method, url, body)]},
+    one request per iteration (warmup included).
+    """
+    users = sample_users(count, rng)
+    skill_names = load_skill_names()
+    events = load_events()
+    categories = sorted({category for _, category in events})
+    # Frequency filters scaled to the number of users, so they keep selecting
+    # a similar share of the skills and events at every scale
+    frequencies = [max(1, count * share // 100) for share in (1, 5, 10, 25)]
+
+    def unregistered_event(registered):
+        # An event the user isn't registered to yet, or None
+        free = [event for event in events if event not in registered]
+        return rng.choice(free) if free else None
+
+    scans = []
+    for email, registered in users:
+        event = unregistered_event(registered)
+        if event is not None:
+            registered.add(event)
+            scans.append(
+                (
+                    "POST",
+                    f"/users/events/{email}",
+                    {"event": event[0], "category": event[1]},
+                )
+            )
+
+    return {
+        "list_users": [
+            ("GET", f"/users?after_id={rng.randint(0, count)}&limit=100", None)
+            for _ in users
+        ],
+        "get_user": [("GET", f"/users/{email}", None) for email, _ in users],
+        "update_skills": [
+            (
+                "PUT",
+                f"/users/{email}",
+                {
+                    "skills": [
+                        {"skill": skill, "rating": rng.randint(1, 5)}
+                        for skill in rng.sample(skill_names, 3)
+                    ]
+                },
+            )
+            for email, _ in users
+        ],
+        "scan_event": scans,
+        "skills_filtered": [
+            (
+                "GET",
+                f"/skills?min_frequency={rng.choice(frequencies)}&limit=50",
+                None,
+            )
+            for _ in users
+        ],
+        "events_filtered": [
+            (
+                "GET",
+                f"/events?category={rng.choice(categories)}"
+                f"&min_frequency={rng.choice(frequencies)}",
+                None,
+            )
+            for _ in users
+        ],
+    }
+
+
+def run_scenario(client, requests):
+    """Send the requests, timing every one of them after the warmup."""
+    timings = []
+    errors = 0
+    for i, (method, url, body) in enumerate(requests):
+        start = time.perf_counter()
+        with client.open(url, method=method, json=body) as response:
+            response.get_data()
+        elapsed = time.perf_counter() - start
+
+        if response.status_code != 200:
+            errors += 1
+        if i >= WARMUP:
+            timings.append(elapsed)
+
+    timings.sort()
+    return {
+        "iterations": len(timings),
+        "errors": errors,
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "p50_ms": timings[len(timings) // 2] * 1000,
+        "p95_ms": timings[int(len(timings) * 0.95)] * 1000,
+        "p99_ms": timings[int(len(timings) * 0.99)] * 1000,
+        "ops_per_sec": len(timings) / sum(timings),
+    }
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return commit + ("-dirty" if dirty else "")
+
+
+def run_suite(scales, scenario_names=None):
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": make_url(os.environ["DATABASE_URL"]).get_backend_name(),
+        "iterations": ITERATIONS,
+        "scales": {},
+    }
+    client = app.test_client()
+
+    for scale in scales:
+        count = SCALES[scale]
+        start = time.perf_counter()
+        seed(count)
+        seed_seconds = time.perf_counter() - start
+
+        scenarios = build_scenarios(count, random.Random(count))
+        results["scales"][scale] = {
+            "users": count,
+            "seed_seconds": seed_seconds,
+            "scenarios": {},
+        }
+        print(f"{scale}: seeded {count} users in {seed_seconds:.1f}s", flush=True)
+
+        for name, requests in scenarios.items():
+            if scenario_names and name not in scenario_names:
+                continue
+
+            result = run_scenario(client, requests)
+            results["scales"][scale]["scenarios"][name] = result
+            print(
+                f"{scale:>6} {name:<20} p50 {result['p50_ms']:>8.2f}ms "
+                f"p95 {result['p95_ms']:>8.2f}ms {result['ops_per_sec']:>8.0f} ops/s"
+                + (f" ({result['errors']} errors)" if result["errors"] else ""),
+                flush=True,
+            )
+
+    return results
+
+
+def parse_scales(value):
+    scales = value.lower().split(",")
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown scale(s) {', '.join(unknown)}, choose from {', '.join(SCALES)}"
+        )
+    return scales
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--scales",
+        type=parse_scales,
+        default=DEFAULT_SCALES,
+        help=f"comma-separated scales among {', '.join(SCALES)} "
+        f"(default: {','.join(DEFAULT_SCALES)})",
+    )
+    parser.add_argument(
+        "--scenarios", help="comma-separated scenarios to run (default: all)"
+    )
+    parser.add_argument("--output", help="file to write the JSON results to")
+    parser.add_argument(
+        "--baseline", help="result file to compare with, exiting 1 on regressions"
+    )
+    args = parser.parse_args(argv)
+
+    results = run_suite(
+        args.scales, args.scenarios.split(",") if args.scenarios else None
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare(json.load(f), results)
+        print_comparison(rows)
+        if any(row[-1] for row in rows):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
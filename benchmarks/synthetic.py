@@ -0,0 +1,110 @@
+import itertools
+import json
+import random
+
+
+SOURCE_DATA_PATH = "./mock_data/HTN_2023_BE_Challenge_Data.json"
+EVENTS_DATA_PATH = "./mock_data/events_data.json"
+
+FIRST_NAMES = ["Adam", "Breanna", "Chen", "Divya", "Elena", "Farah", "Grace", "Hiro"]
+LAST_NAMES = ["Dillon", "Huynh", "Kim", "Lopez", "Nguyen", "Park", "Singh", "Wong"]
+COMPANY_SUFFIXES = ["Ltd", "Inc", "LLC", "Group", "PLC"]
+
+
+def load_skill_names(path=SOURCE_DATA_PATH):
+    """Return the distinct skill names used in the mock profile data."""
+    with open(path) as f:
+        profiles = json.load(f)
+
+    return sorted(
+        {skill.get("skill") for profile in profiles for skill in profile["skills"]}
+    )
+
+
+def zipf_cum_weights(count, skew):
+    """
+    Cumulative weights giving the item of rank r (from 1) a probability
+    proportional to 1 / r ** skew, like the popularity of skills or events.
+    """
+    return list(itertools.accumulate(1 / rank**skew for rank in range(1, count + 1)))
+
+
+def sample(rng, population, k, cum_weights=None):
+    """
+    Pick k distinct items of population, uniformly or following cum_weights.
+    """
+    if cum_weights is None:
+        return rng.sample(population, k)
+
+    chosen = []
+    while len(chosen) < k:
+        [item] = rng.choices(population, cum_weights=cum_weights)
+        if item not in chosen:
+            chosen.append(item)
+
+    return chosen
+
+
+def generate_profiles(count, seed=0, skill_names=None, skew=None, start=0):
+    """
+    Generate count synthetic user profiles shaped like the entries of
+    HTN_2023_BE_Challenge_Data.json. Every email is unique, including across
+    batches generated with different start indexes. Skills are picked
+    uniformly, or with a Zipf popularity skew (e.g. 1.1) so that a few skills
+    are very common and most are rare, like in real registrations.
+    """
+    rng = random.Random(seed + start)
+    if skill_names is None:
+        skill_names = load_skill_names()
+    cum_weights = None
+    if skew is not None:
+        skill_names = sorted(skill_names)
+        random.Random(seed).shuffle(skill_names)
+        cum_weights = zipf_cum_weights(len(skill_names), skew)
+
+    profiles = []
+    for i in range(start, start + count):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        profiles.append(
+            {
+                "name": f"{first_name} {last_name}",
+                "company": f"{rng.choice(LAST_NAMES)} {rng.choice(COMPANY_SUFFIXES)}",
+                "email": f"{first_name.lower()}{i}@example.com",
+                "phone": f"{rng.randint(100, 999)}-{rng.randint(100, 999)}-"
+                f"{rng.randint(1000, 9999)}",
+                "skills": [
+                    {"skill": skill, "rating": rng.randint(1, 5)}
+                    for skill in sample(
+                        rng, skill_names, rng.randint(2, 4), cum_weights
+                    )
+                ],
+            }
+        )
+
+    return profiles
+
+
+def load_events(path=EVENTS_DATA_PATH):
+    """Return the events in events_data.json as (event, category) pairs."""
+    with open(path) as f:
+        return [(event["event"], event["category"]) for event in json.load(f)]
+
+
+def generate_scans(user_ids, event_ids, seed=0, min_scans=1, max_scans=5, skew=None):
+    """
+    Generate event rows (dicts ready for a bulk insert into the event table)
+    scanning each of the given users into between min_scans and max_scans
+    distinct events of the catalog ids event_ids, picked uniformly or with a
+    Zipf popularity skew.
+    """
+    rng = random.Random(seed)
+    cum_weights = zipf_cum_weights(len(event_ids), skew) if skew is not None else None
+
+    rows = []
+    for user_id in user_ids:
+        scan_count = min(rng.randint(min_scans, max_scans), len(event_ids))
+        for event_id in sample(rng, event_ids, scan_count, cum_weights):
+            rows.append({"user_id": user_id, "event_id": event_id})
+
+    return rows
@@ -0,0 +1,259 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, request
+
+
+class LRUBackend:
+    """
+    In-process cache backend evicting the least recently used entries once
+    there are more than max_entries of them (unless None) or they take more
+    than max_bytes, and expiring entries after ttl seconds.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        # Counters are tiny and must never be evicted, so they are kept apart
+        # from the entries
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._pop(key)
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self._pop(key)
+
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.size += len(value)
+
+            while self.size > self.max_bytes or (
+                self.max_entries is not None and len(self.entries) > self.max_entries
+            ):
+                self._pop(next(iter(self.entries)))
+
+    def delete(self, keys):
+        with self.lock:
+            for key in keys:
+                if key in self.entries:
+                    self._pop(key)
+
+    def get_counter(self, key):
+        return self.counters.get(key, 0)
+
+    def incr(self, key):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+            return self.counters[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.counters.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        _, value = self.entries.pop(key)
+        self.size -= len(value)
+
+
+class RedisBackend:
+    """
+    Cache backend shared by every worker process, storing entries in Redis (or
+    anything exposing the same get/set/incr/delete methods) with a ttl.
+    """
+
+    def __init__(self, client, ttl=300, prefix="htn:cache:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def get_counter(self, key):
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+def create_backend(config):
+    """Create the cache backend selected by the CACHE_BACKEND config value."""
+    backend = config["CACHE_BACKEND"]
+    if backend == "none":
+        return None
+
+    if backend == "memory":
+        return LRUBackend(
+            max_entries=config["CACHE_MAX_ENTRIES"],
+            max_bytes=config["CACHE_MAX_BYTES"],
+            ttl=config["CACHE_TTL"],
+        )
+
+    if backend == "redis":
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package")
+
+        return RedisBackend(
+            redis.Redis.from_url(config["CACHE_REDIS_URL"]), ttl=config["CACHE_TTL"]
+        )
+
+    raise ValueError(f"Unknown CACHE_BACKEND '{backend}'")
+
+
+class ResponseCache:
+    """
+    Caches the responses of GET handlers under namespaces, e.g. "skills" or
+    "user:<email>". Invalidating a namespace bumps its generation number, which
+    is part of the key of every entry cached under it, so stale entries are
+    never read again and simply age out of the backend. The "*" generation is
+    part of every key, so bumping it invalidates everything.
+    """
+
+    def __init__(self, backend, make_response, max_entry_bytes=16 * 1024 * 1024):
+        self.backend = backend
+        self.make_response = make_response
+        self.max_entry_bytes = max_entry_bytes
+
+    def invalidate(self, *namespaces):
+        if self.backend is None:
+            return
+
+        for namespace in namespaces:
+            self.backend.incr("generation:" + namespace)
+
+    def invalidate_all(self):
+        self.invalidate("*")
+
+    def key(self, namespace):
+        generation = self.backend.get_counter("generation:" + namespace)
+        global_generation = self.backend.get_counter("generation:*")
+        return f"{namespace}:{generation}:{global_generation}:{request.full_path}"
+
+    def cached(self, namespace):
+        """
+        Decorate a Resource GET method, caching its successful responses under
+        namespace (a string, or a function of the URL arguments returning one).
+        """
+
+        def decorator(method):
+            @functools.wraps(method)
+            def wrapper(resource, *args, **kwargs):
+                if self.backend is None:
+                    return method(resource, *args, **kwargs)
+
+                key = self.key(
+                    namespace(*args, **kwargs) if callable(namespace) else namespace
+                )
+                entry = self.backend.get(key)
+                if entry is not None:
+                    return self.cached_response(*decode_entry(entry))
+
+                result = method(resource, *args, **kwargs)
+                response = (
+                    result
+                    if isinstance(result, Response)
+                    else self.make_response(*result)
+                )
+                if response.status_code != 200:
+                    return response
+
+                if response.is_streamed:
+                    response.response = self.store_stream(
+                        key, response.mimetype, response.response
+                    )
+                    return response
+
+                body = response.get_data()
+                etag = compute_etag(body)
+                if len(body) <= self.max_entry_bytes:
+                    self.backend.set(key, encode_entry(etag, response.mimetype, body))
+
+                return self.cached_response(etag, response.mimetype, body)
+
+            return wrapper
+
+        return decorator
+
+    def cached_response(self, etag, mimetype, body):
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype=mimetype)
+
+        response.set_etag(etag)
+        return response
+
+    def store_stream(self, key, mimetype, chunks):
+        """
+        Pass a streamed body through to the client, and cache it once the
+        stream is complete, unless it grew larger than max_entry_bytes.
+        """
+        body = []
+        size = 0
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode("utf-8")
+                if body is not None:
+                    size += len(chunk)
+                    if size > self.max_entry_bytes:
+                        body = None
+                    else:
+                        body.append(chunk)
+
+                yield chunk
+        finally:
+            # Let the wrapped stream clean up even if the client went away
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+        if body is not None:
+            body = b"".join(body)
+            self.backend.set(key, encode_entry(compute_etag(body), mimetype, body))
+
+
+def compute_etag(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+def encode_entry(etag, mimetype, body):
+    return f"{etag}\n{mimetype}\n".encode("utf-8") + body
+
+
+def decode_entry(entry):
+    etag, mimetype, body = entry.split(b"\n", 2)
+    return etag.decode("utf-8"), mimetype.decode("utf-8"), body
@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import select, tuple_, update
+
+from api import db, repository
+from models import CatalogEvent
+from signals import event_catalog_changed
+
+logger = logging.getLogger(__name__)
+
+# An event of the catalog, as held in memory
+CatalogEntry = namedtuple(
+    "CatalogEntry", ["id", "event", "category", "capacity", "details", "active"]
+)
+
+# Fields of a catalog file entry that aren't kept in its details
+ENTRY_FIELDS = ("event", "category", "capacity")
+
+
+def valid_capacity(capacity):
+    """Check that a capacity is a positive number of seats, or None (unlimited)."""
+    return capacity is None or (
+        isinstance(capacity, int) and not isinstance(capacity, bool) and capacity > 0
+    )
+
+
+def read_catalog_file(path):
+    """
+    Read the {event, category, capacity (optional), ...} entries of a catalog
+    file as (event, category) -> (capacity, details), in file order. Raises
+    ValueError if the file isn't a list of such entries.
+    """
+    with open(path) as f:
+        entries = json.load(f)
+
+    if not isinstance(entries, list) or not all(
+        isinstance(entry, dict)
+        and isinstance(entry.get("event"), str)
+        and isinstance(entry.get("category"), str)
+        and valid_capacity(entry.get("capacity"))
+        for entry in entries
+    ):
+        raise ValueError(f"{path} is not a list of events")
+
+    return {
+        (entry["event"], entry["category"]): (
+            entry.get("capacity"),
+            {key: value for key, value in entry.items() if key not in ENTRY_FIELDS}
+            or None,
+        )
+        for entry in entries
+    }
+
+
+class EventCatalog:
+    """
+    The events users can be scanned into. The catalog file lists them, and the
+    event_catalog table mirrors it, giving every (event, category) the id that
+    registrations reference. Lookups by (event, category) or by id are dict
+    lookups over the entries held in memory.
+
+    The file is checked for changes at most every check_interval seconds, and
+    reloaded once it changed, without a restart. Events removed from the file
+    stay in the table as inactive entries, which can't be scanned into anymore.
+    While the file can't be read (e.g. it is being replaced, or has a typo), the
+    last catalog loaded keeps being served.
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.by_key = {}
+        self.by_id = {}
+        # (mtime, size) of the file when it was last loaded
+        self.file_version = None
+        self.checked_at = None
+
+    def stat_file(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self):
+        """
+        Sync the event_catalog table with the catalog file, and read it back
+        into memory. Requires an app context.
+        """
+        with self.lock:
+            file_version = self.stat_file()
+            rows = [
+                {
+                    "event": event,
+                    "category": category,
+                    "capacity": capacity,
+                    "details": details,
+                    "active": True,
+                }
+                for (event, category), (capacity, details) in read_catalog_file(
+                    self.path
+                ).items()
+            ]
+
+            # On a connection of its own, so reloading in the middle of a request
+            # never commits the request's session
+            with db.engine.begin() as connection:
+                if rows:
+                    statement = repository.insert(CatalogEvent)
+                    connection.execute(
+                        statement.on_conflict_do_update(
+                            index_elements=[CatalogEvent.event, CatalogEvent.category],
+                            set_={
+                                "capacity": statement.excluded.capacity,
+                                "details": statement.excluded.details,
+                                "active": True,
+                            },
+                        ),
+                        rows,
+                    )
+                connection.execute(
+                    update(CatalogEvent)
+                    .where(
+                        tuple_(CatalogEvent.event, CatalogEvent.category).not_in(
+                            [(row["event"], row["category"]) for row in rows]
+                        )
+                    )
+                    .values(active=False)
+                )
+
+                by_id = {
+                    row.id: CatalogEntry(*row)
+                    for row in connection.execute(
+                        select(
+                            CatalogEvent.id,
+                            CatalogEvent.event,
+                            CatalogEvent.category,
+                            CatalogEvent.capacity,
+                            CatalogEvent.details,
+                            CatalogEvent.active,
+                        )
+                    )
+                }
+            # Swap both dicts at once for the readers not holding the lock
+            self.by_key, self.by_id = (
+                {(entry.event, entry.category): entry for entry in by_id.values()},
+                by_id,
+            )
+            self.file_version = file_version
+            self.checked_at = time.monotonic()
+
+        event_catalog_changed.send()
+
+    def refresh(self):
+        """Reload the catalog if its file changed since it was last checked."""
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < self.check_interval:
+            return
+
+        self.checked_at = now
+        try:
+            if self.stat_file() != self.file_version:
+                self.load()
+        except (OSError, ValueError):
+            # Retried every check_interval until the file is fixed
+            logger.exception("Reloading the event catalog %s failed", self.path)
+
+    def lookup(self, event, category):
+        """Return the active entry of (event, category), or None."""
+        self.refresh()
+        entry = self.by_key.get((event, category))
+        return entry if entry is not None and entry.active else None
+
+    def find(self, name, category=None):
+        """Return the active entries named name, in the given category if any."""
+        self.refresh()
+        return [
+            entry
+            for entry in self.by_key.values()
+            if entry.active
+            and entry.event == name
+            and (category is None or entry.category == category)
+        ]
+
+    def get(self, event_id):
+        """Return the entry with id event_id, active or not."""
+        return self.by_id[event_id]
+
+    def entries(self):
+        """Return the active entries, in id order."""
+        self.refresh()
+        return [entry for entry in self.by_id.values() if entry.active]
@@ -0,0 +1,187 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import selectinload
+
+from api import db, repository
+from models import CatalogEvent, ChangeSequence, DeletedUser, Event, Skill, User
+from repository import IN_CLAUSE_CHUNK_SIZE, chunked
+
+
+def utc_now():
+    # Times are stored as naive UTC datetimes
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def sequence_statement(count):
+    """
+    Return the statement advancing the change sequence by count versions,
+    returning the last of them. Writers queue on the sequence row until they
+    commit, so versions are committed in the order they were given out, and a
+    client that saw a version never misses an earlier one.
+    """
+    statement = repository.insert(ChangeSequence).values(id=1, value=count)
+    return statement.on_conflict_do_update(
+        index_elements=[ChangeSequence.id],
+        set_={"value": ChangeSequence.value + statement.excluded.value},
+    ).returning(ChangeSequence.value)
+
+
+def stamp_statements(user_ids, first_version, now):
+    """
+    Yield the (statement, parameters) pairs giving the users with the given
+    (sorted, distinct) ids successive versions from first_version, and the
+    skill and event rows written for them since their last version the new
+    version of their user.
+    """
+    yield update(User), [
+        {"id": user_id, "version": version, "updated_at": now}
+        for version, user_id in enumerate(user_ids, start=first_version)
+    ]
+
+    for user_ids_chunk in chunked(user_ids, IN_CLAUSE_CHUNK_SIZE):
+        for table in (Skill.__table__, Event.__table__):
+            yield table.update().where(
+                table.c.user_id.in_(user_ids_chunk), table.c.version.is_(None)
+            ).values(
+                version=select(User.version)
+                .where(User.id == table.c.user_id)
+                .scalar_subquery()
+            ), None
+
+
+def deletion_rows(users, first_version, now):
+    """
+    Return the deleted_user rows recording the deletion of (user_id, email)
+    users, with successive versions from first_version.
+    """
+    return [
+        {"version": version, "user_id": user_id, "email": email, "deleted_at": now}
+        for version, (user_id, email) in enumerate(users, start=first_version)
+    ]
+
+
+def reserve_versions(count):
+    """
+    Take count versions of the change sequence, without committing. Returns
+    the first of them.
+    """
+    return db.session.execute(sequence_statement(count)).scalar_one() - count + 1
+
+
+def record_user_changes(user_ids):
+    """
+    Record that the users with the given ids, or their skills or events, were
+    written, without committing. Call it last before committing, since other
+    writers wait for the commit from then on.
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+
+    for statement, parameters in stamp_statements(
+        user_ids, reserve_versions(len(user_ids)), utc_now()
+    ):
+        db.session.execute(statement, parameters)
+
+
+def record_user_deletions(users):
+    """
+    Record the deletion of (user_id, email) users, without committing. Call it
+    last before committing, like record_user_changes.
+    """
+    if not users:
+        return
+
+    repository.bulk_insert(
+        DeletedUser, deletion_rows(users, reserve_versions(len(users)), utc_now())
+    )
+
+
+def current_version():
+    """Return the last version given out, 0 before the first write."""
+    return db.session.scalar(select(ChangeSequence.value)) or 0
+
+
+def users_changed_since(since):
+    """
+    Return the emails of the users written after version since, and the
+    (user_id, email) pairs of the users deleted after it.
+    """
+    emails = db.session.scalars(select(User.email).where(User.version > since)).all()
+    deletions = db.session.execute(
+        select(DeletedUser.user_id, DeletedUser.email).where(
+            DeletedUser.version > since
+        )
+    ).all()
+    return emails, [tuple(deletion) for deletion in deletions]
+
+
+def select_scans(since, head):
+    """
+    Return the statement selecting the (email, event, category) scans written
+    after version since up to version head, in the order they were written.
+    """
+    return (
+        select(User.email, CatalogEvent.event, CatalogEvent.category)
+        .join(Event, Event.user_id == User.id)
+        .join(CatalogEvent, CatalogEvent.id == Event.event_id)
+        .where(Event.version > since, Event.version <= head)
+        .order_by(Event.version, Event.id)
+    )
+
+
+def select_scan_counts(since, head):
+    """
+    Return the statement counting the scans into each (event, category)
+    written after version since up to version head.
+    """
+    return (
+        select(CatalogEvent.event, CatalogEvent.category, func.count())
+        .join(Event, Event.event_id == CatalogEvent.id)
+        .where(Event.version > since, Event.version <= head)
+        .group_by(CatalogEvent.event, CatalogEvent.category)
+    )
+
+
+def scan_batch(head, scans, scan_counts):
+    """
+    Return the (head, scans, scan_count, keys) batch of the scans and the
+    (event, category, count) counts written up to version head.
+    """
+    return (
+        head,
+        [tuple(scan) for scan in scans],
+        sum(count for _, _, count in scan_counts),
+        {(event, category) for event, category, _ in scan_counts},
+    )
+
+
+def changes_since(since, limit):
+    """
+    Return the first limit changes after version since, in version order, as
+    (version, user) pairs for the users written since (at their current
+    version, so a user written several times appears once) and
+    (version, DeletedUser) pairs for the users deleted since, along with
+    whether more changes follow.
+    """
+    users = db.session.scalars(
+        select(User)
+        .options(selectinload(User.skills), selectinload(User.events))
+        .where(User.version > since)
+        .order_by(User.version)
+        .limit(limit + 1)
+    ).all()
+    deletions = db.session.scalars(
+        select(DeletedUser)
+        .where(DeletedUser.version > since)
+        .order_by(DeletedUser.version)
+        .limit(limit + 1)
+    ).all()
+
+    changes = sorted(
+        [(user.version, user) for user in users]
+        + [(deletion.version, deletion) for deletion in deletions],
+        key=lambda change: change[0],
+    )
+    return changes[:limit], len(changes) > limit
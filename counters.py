@@ -0,0 +1,316 @@
+from collections import Counter
+
+import click
+from sqlalchemy import func, select
+
+from api import app, db, repository
+from models import (
+    CatalogEvent,
+    Event,
+    EventCount,
+    EventTimeline,
+    Skill,
+    SkillCount,
+    SkillName,
+)
+from signals import data_reloaded
+
+
+def skill_count_statements(skill_names, delta):
+    """
+    Yield the statements adding delta to the popularity count of each skill in
+    skill_names (once per occurrence). Like all the statements below, they come
+    in a fixed order, so concurrent writers lock the rows in the same order.
+    """
+    for skill, occurrences in sorted(Counter(skill_names).items()):
+        statement = repository.insert(SkillCount).values(
+            skill=skill, count=delta * occurrences
+        )
+        yield statement.on_conflict_do_update(
+            index_elements=[SkillCount.skill],
+            set_={"count": SkillCount.count + statement.excluded.count},
+        )
+
+
+def event_count_statements(events, delta):
+    """
+    Yield the statements adding delta to the attendance count of each
+    (event, category) pair in events (once per occurrence).
+    """
+    for (event, category), occurrences in sorted(Counter(events).items()):
+        statement = repository.insert(EventCount).values(
+            event=event, category=category, count=delta * occurrences
+        )
+        yield statement.on_conflict_do_update(
+            index_elements=[EventCount.event, EventCount.category],
+            set_={"count": EventCount.count + statement.excluded.count},
+        )
+
+
+def scan_minute(scanned_at):
+    """Truncate the time of a scan to the start of its minute."""
+    return scanned_at.replace(second=0, microsecond=0)
+
+
+def timeline_statements(scans, delta):
+    """
+    Yield the statements adding delta to the per-minute check-in count of each
+    (event, category, scanned_at) scan in scans.
+    """
+    minutes = Counter(
+        (event, category, scan_minute(scanned_at))
+        for event, category, scanned_at in scans
+    )
+    for (event, category, minute), occurrences in sorted(minutes.items()):
+        statement = repository.insert(EventTimeline).values(
+            event=event, category=category, minute=minute, count=delta * occurrences
+        )
+        yield statement.on_conflict_do_update(
+            index_elements=[
+                EventTimeline.event,
+                EventTimeline.category,
+                EventTimeline.minute,
+            ],
+            set_={"count": EventTimeline.count + statement.excluded.count},
+        )
+
+
+def event_seats_statement(event, category, seats, capacity):
+    """
+    Return the statement adding seats to the attendance count of an event
+    limited to capacity, only if the count stays within it, and returning a row
+    when it does. seats must not exceed capacity, since a counter that doesn't
+    exist yet is created without checking it. Concurrent scans queue on the
+    counter row, so the count never exceeds capacity.
+    """
+    statement = repository.insert(EventCount).values(
+        event=event, category=category, count=seats
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[EventCount.event, EventCount.category],
+        set_={"count": EventCount.count + statement.excluded.count},
+        where=EventCount.count + statement.excluded.count <= capacity,
+    ).returning(EventCount.count)
+
+
+def adjust_skill_counts(skill_names, delta):
+    """Adjust the popularity counts of skill_names by delta, without committing."""
+    for statement in skill_count_statements(skill_names, delta):
+        db.session.execute(statement)
+
+
+def adjust_event_counts(events, delta):
+    """Adjust the attendance counts of events by delta, without committing."""
+    for statement in event_count_statements(events, delta):
+        db.session.execute(statement)
+
+
+def adjust_event_timeline(scans, delta):
+    """
+    Adjust the per-minute check-in counts of (event, category, scanned_at)
+    scans by delta, without committing.
+    """
+    for statement in timeline_statements(scans, delta):
+        db.session.execute(statement)
+
+
+def reserve_event_seats(event, category, seats, capacity):
+    """
+    Add up to seats to the attendance count of an event limited to capacity,
+    without committing. Returns the number of seats that fit.
+    """
+    seats = min(seats, capacity)
+    while seats > 0:
+        if db.session.execute(
+            event_seats_statement(event, category, seats, capacity)
+        ).first():
+            return seats
+
+        # The statement that didn't fit keeps the counter row locked until the
+        # transaction ends, so the seats left can't be taken concurrently
+        count = db.session.scalar(
+            select(EventCount.count).where(
+                EventCount.event == event, EventCount.category == category
+            )
+        )
+        seats = min(seats, capacity - count)
+
+    return 0
+
+
+def count_from_scratch():
+    """
+    Aggregate the skill and event tables into {skill: count} and
+    {(event, category): count} dictionaries.
+    """
+    # Counted by skill_id over its index, naming only the counted skills
+    counts = (
+        select(Skill.skill_id, func.count().label("count"))
+        .group_by(Skill.skill_id)
+        .subquery()
+    )
+    skill_counts = dict(
+        db.session.execute(
+            select(SkillName.name, counts.c.count).join(
+                counts, SkillName.id == counts.c.skill_id
+            )
+        ).all()
+    )
+    event_counts = {
+        (event, category): count
+        for event, category, count in db.session.execute(
+            select(CatalogEvent.event, CatalogEvent.category, func.count(Event.id))
+            .join(Event.catalog_event)
+            .group_by(CatalogEvent.event, CatalogEvent.category)
+        )
+    }
+
+    return skill_counts, event_counts
+
+
+def timeline_from_scratch():
+    """
+    Bucket the scan times of the event table into
+    {(event, category, minute): count}.
+    """
+    return Counter(
+        (event, category, scan_minute(scanned_at))
+        for event, category, scanned_at in db.session.execute(
+            select(CatalogEvent.event, CatalogEvent.category, Event.scanned_at)
+            .join(Event.catalog_event)
+            .where(Event.scanned_at.is_not(None))
+        )
+    )
+
+
+def live_timeline():
+    """Read the maintained per-minute counts, ignoring the ones back to zero."""
+    return {
+        (event, category, minute): count
+        for event, category, minute, count in db.session.execute(
+            select(
+                EventTimeline.event,
+                EventTimeline.category,
+                EventTimeline.minute,
+                EventTimeline.count,
+            ).where(EventTimeline.count != 0)
+        )
+    }
+
+
+def live_counts():
+    """Read the maintained counters, ignoring the ones that dropped to zero."""
+    skill_counts = dict(
+        db.session.query(SkillCount.skill, SkillCount.count).filter(
+            SkillCount.count != 0
+        )
+    )
+    event_counts = {
+        (event, category): count
+        for event, category, count in db.session.query(
+            EventCount.event, EventCount.category, EventCount.count
+        ).filter(EventCount.count != 0)
+    }
+
+    return skill_counts, event_counts
+
+
+def rebuild_counters():
+    """
+    Replace the maintained counters with counts aggregated from scratch,
+    without committing.
+    """
+    skill_counts, event_counts = count_from_scratch()
+    timeline = timeline_from_scratch()
+
+    db.session.execute(SkillCount.__table__.delete())
+    db.session.execute(EventCount.__table__.delete())
+    db.session.execute(EventTimeline.__table__.delete())
+    repository.bulk_insert(
+        SkillCount,
+        [{"skill": skill, "count": count} for skill, count in skill_counts.items()],
+    )
+    repository.bulk_insert(
+        EventCount,
+        [
+            {"event": event, "category": category, "count": count}
+            for (event, category), count in event_counts.items()
+        ],
+    )
+    repository.bulk_insert(
+        EventTimeline,
+        [
+            {"event": event, "category": category, "minute": minute, "count": count}
+            for (event, category, minute), count in timeline.items()
+        ],
+    )
+
+
+def diff_counts(expected, actual):
+    """Return {key: (expected, actual)} for every key whose counts differ."""
+    return {
+        key: (expected.get(key, 0), actual.get(key, 0))
+        for key in expected.keys() | actual.keys()
+        if expected.get(key, 0) != actual.get(key, 0)
+    }
+
+
+def counters_missing():
+    """Check whether there are skills or events that were never counted."""
+    return (
+        (
+            db.session.query(SkillCount).first() is None
+            and db.session.query(Skill).first() is not None
+        )
+        or (
+            db.session.query(EventCount).first() is None
+            and db.session.query(Event).first() is not None
+        )
+        or (
+            db.session.query(EventTimeline).first() is None
+            and db.session.query(Event).filter(Event.scanned_at.is_not(None)).first()
+            is not None
+        )
+    )
+
+
+@app.cli.command("check-counters")
+@click.option(
+    "--repair", is_flag=True, help="Replace the live counters with the rebuilt ones."
+)
+def check_counters(repair):
+    """
+    Rebuild the skill and event popularity counters and the per-minute event
+    check-in counts from scratch and diff them against the live ones.
+    """
+    expected_skills, expected_events = count_from_scratch()
+    actual_skills, actual_events = live_counts()
+
+    skill_diff = diff_counts(expected_skills, actual_skills)
+    event_diff = diff_counts(expected_events, actual_events)
+    timeline_diff = diff_counts(timeline_from_scratch(), live_timeline())
+
+    for skill, (expected, actual) in sorted(skill_diff.items()):
+        click.echo(f"skill '{skill}': expected {expected}, counted {actual}")
+    for (event, category), (expected, actual) in sorted(event_diff.items()):
+        click.echo(
+            f"event '{event}' ({category}): expected {expected}, counted {actual}"
+        )
+
+    for (event, category, minute), (expected, actual) in sorted(timeline_diff.items()):
+        click.echo(
+            f"event '{event}' ({category}) at {minute:%Y-%m-%d %H:%M}: "
+            f"expected {expected} check-ins, counted {actual}"
+        )
+
+    if not (skill_diff or event_diff or timeline_diff):
+        click.echo("Counters are consistent")
+        return
+
+    if repair:
+        rebuild_counters()
+        db.session.commit()
+        data_reloaded.send()
+        click.echo("Counters were rebuilt")
+    else:
+        raise SystemExit(1)
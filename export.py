@@ -0,0 +1,91 @@
+import csv
+import io
+import json
+import zlib
+
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "users.ndjson"),
+    "csv": ("text/csv", "users.csv"),
+}
+
+CSV_HEADER = ["id", "name", "company", "email", "phone", "skills", "events"]
+
+
+def export_record(user, skills, events):
+    """Build the exported dict of a user row with its skill and event rows."""
+    user_id, name, company, email, phone = user
+    return {
+        "id": user_id,
+        "name": name,
+        "company": company,
+        "email": email,
+        "phone": phone,
+        "skills": [{"skill": skill, "rating": rating} for skill, rating in skills],
+        "events": [
+            {"event": event, "category": category} for event, category in events
+        ],
+    }
+
+
+def generate_ndjson(profiles, rows_per_chunk):
+    """Yield the profiles as newline-delimited JSON, rows_per_chunk per chunk."""
+    lines = []
+    for profile in profiles:
+        lines.append(json.dumps(export_record(*profile)) + "\n")
+        if len(lines) == rows_per_chunk:
+            yield "".join(lines)
+            lines = []
+
+    if lines:
+        yield "".join(lines)
+
+
+def generate_csv(profiles, rows_per_chunk):
+    """
+    Yield the profiles as CSV, rows_per_chunk per chunk after the header. The
+    skills and events columns hold JSON arrays, so skill and event names never
+    clash with the delimiters.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow(CSV_HEADER)
+    yield flush()
+
+    rows = 0
+    for profile in profiles:
+        record = export_record(*profile)
+        writer.writerow(
+            [
+                *(record[column] for column in CSV_HEADER[:5]),
+                json.dumps(record["skills"]),
+                json.dumps(record["events"]),
+            ]
+        )
+        rows += 1
+        if rows == rows_per_chunk:
+            yield flush()
+            rows = 0
+
+    if rows:
+        yield flush()
+
+
+def gzip_chunks(chunks, level=6):
+    """
+    Compress a stream of text chunks into a single gzip stream. Every chunk is
+    flushed through the compressor as it arrives, so the client receives data
+    as soon as it is exported instead of once the whole export is done.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    yield compressor.flush()
@@ -0,0 +1,61 @@
+"""
+Production server configuration. Serve the Flask app with
+
+    gunicorn -c gunicorn.conf.py api:app
+
+or the ASGI app with
+
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+
+# One worker process per core by default
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# The memory cache is private to each worker and only invalidated by the writes
+# of its own worker, so with several workers responses are cached in redis when
+# CACHE_REDIS_URL is set, and not cached otherwise
+if workers > 1 and "CACHE_BACKEND" not in os.environ:
+    os.environ["CACHE_BACKEND"] = (
+        "redis" if os.environ.get("CACHE_REDIS_URL") else "none"
+    )
+
+# Import the app (and so seed the database) once in the master process, before
+# the workers are forked, instead of once per worker
+preload_app = True
+
+
+def when_ready(server):
+    # Build the read model (if enabled) once in the master process, so the
+    # forked workers share it instead of each reading every profile
+    from api import app, read_model
+
+    if server.cfg.workers > 1 and app.config["CACHE_BACKEND"] == "memory":
+        raise RuntimeError(
+            "CACHE_BACKEND=memory would serve stale responses with several "
+            "workers, use redis or none"
+        )
+
+    if read_model is not None:
+        with app.app_context():
+            read_model.warm_up()
+
+
+def post_fork(server, worker):
+    # Connections opened by the master while seeding must not be shared with
+    # the forked workers, so each worker starts with an empty pool
+    from api import app, db
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+    # Each worker takes a scan log of its own (if the scan queue is enabled),
+    # and first writes the scans left queued before a restart
+    from api import scan_queue
+
+    if scan_queue is not None:
+        scan_queue.start()
@@ -0,0 +1,328 @@
+import codecs
+import itertools
+import json
+import os
+import re
+import time
+from collections import Counter
+
+import click
+from sqlalchemy.exc import IntegrityError
+
+from api import app, db
+from models import ImportJob
+from scripts import load_profiles, validate_new_users
+from signals import users_changed
+
+
+# Default and maximum number of profiles inserted per transaction
+IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_BATCH_SIZE = 10000
+
+# Number of bytes read from the source at a time
+READ_SIZE = 64 * 1024
+
+# Maximum number of rejected profiles listed one by one in an import report
+MAX_REPORTED_REJECTIONS = 100
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# Stands in for the NDJSON lines that aren't valid JSON
+INVALID_JSON = object()
+
+
+def read_chunks(stream, size=READ_SIZE):
+    """Yield the bytes of a binary stream size bytes at a time."""
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def skip_bytes(stream, count):
+    """Move a binary stream count bytes forward, reading them if it can't seek."""
+    if stream.seekable():
+        stream.seek(count, os.SEEK_CUR)
+        return
+
+    while count > 0:
+        chunk = stream.read(min(count, READ_SIZE))
+        if not chunk:
+            return
+        count -= len(chunk)
+
+
+def detect_format(chunk):
+    """Tell a JSON array ("json") from NDJSON ("ndjson") by its first byte."""
+    return "json" if chunk.lstrip().startswith(b"[") else "ndjson"
+
+
+def parse_ndjson(chunks, offset, size=None):
+    """
+    Yield (profile, end offset) for every non-blank line of an NDJSON stream
+    read from byte offset onwards, one line at a time. Lines that aren't valid
+    JSON are yielded as INVALID_JSON. A last line without a newline is only
+    taken as complete when the stream is known to end there, at byte size, and
+    otherwise raises ValueError since the stream may have been cut short.
+    """
+
+    def decode(line):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return INVALID_JSON
+
+    buffer = b""
+    for chunk in chunks:
+        lines = (buffer + chunk).split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            offset += len(line) + 1
+            if line.strip():
+                yield decode(line), offset
+
+    if buffer.strip():
+        if offset + len(buffer) != size:
+            raise ValueError(
+                f"The line at byte {offset} doesn't end with a newline, "
+                "resume the import with the rest of the data"
+            )
+        yield decode(buffer), offset + len(buffer)
+
+
+def parse_json_array(chunks, offset):
+    """
+    Yield (profile, end offset) for every element of a JSON array, decoding
+    one element at a time so the array is never held in memory. Reading starts
+    at the beginning of the array when offset is 0, and otherwise right after
+    the element ending at byte offset (as previously yielded). Raises
+    ValueError when the source isn't a well-formed JSON array.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    text = ""
+    pos = 0
+    eof = False
+
+    def read():
+        # Append the next chunk, dropping the text already parsed
+        nonlocal text, pos, eof
+        chunk = next(chunks, None)
+        eof = chunk is None
+        text = text[pos:] + utf8.decode(chunk or b"", final=eof)
+        pos = 0
+        return not eof
+
+    # What comes next: "[", an element or "]", an element, or "," or "]"
+    expecting = "start" if offset == 0 else "separator"
+    while True:
+        start = pos
+        pos = WHITESPACE.match(text, pos).end()
+        offset += pos - start
+        if pos == len(text):
+            if read():
+                continue
+            raise ValueError("Unexpected end of the JSON array")
+
+        if expecting == "start":
+            if text[pos] != "[":
+                raise ValueError("Expected a JSON array of profiles")
+            pos += 1
+            offset += 1
+            expecting = "first"
+        elif expecting in ("first", "separator") and text[pos] == "]":
+            return
+        elif expecting == "separator":
+            if text[pos] != ",":
+                raise ValueError(f"Expected ',' or ']' at byte {offset}")
+            pos += 1
+            offset += 1
+            expecting = "element"
+        else:
+            try:
+                profile, end = decoder.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                if read():
+                    continue
+                raise ValueError(f"Invalid JSON at byte {offset}")
+
+            # A number at the end of the text may continue in the next chunk
+            if end == len(text) and not eof and read():
+                continue
+
+            offset += len(text[pos:end].encode("utf-8"))
+            pos = end
+            expecting = "separator"
+            yield profile, offset
+
+
+def new_job(job_id, format):
+    return ImportJob(
+        id=job_id,
+        format=format,
+        offset=0,
+        processed=0,
+        imported=0,
+        rejected="{}",
+        completed=False,
+    )
+
+
+def import_batch(job, profiles, offset, rejected_rows):
+    """
+    Register the valid profiles of a batch and move the checkpoint of job past
+    it in a single transaction, listing the rejected profiles in rejected_rows.
+    """
+    errors = [
+        "invalid_json" if profile is INVALID_JSON else error
+        for profile, error in zip(profiles, validate_new_users(profiles))
+    ]
+    valid_profiles = [
+        profile for profile, error in zip(profiles, errors) if error is None
+    ]
+    load_profiles(valid_profiles)
+
+    rejections = Counter(json.loads(job.rejected))
+    for index, (profile, error) in enumerate(zip(profiles, errors), job.processed):
+        if error is None:
+            continue
+
+        rejections[error] += 1
+        if len(rejected_rows) < MAX_REPORTED_REJECTIONS:
+            email = profile.get("email") if isinstance(profile, dict) else None
+            rejected_rows.append({"index": index, "email": email, "error": error})
+
+    job.offset = offset
+    job.processed += len(profiles)
+    job.imported += len(valid_profiles)
+    job.rejected = json.dumps(rejections)
+    db.session.add(job)
+    db.session.commit()
+
+    users_changed.send(emails=[profile["email"] for profile in valid_profiles])
+
+
+def import_profiles(stream, job_id, batch_size=IMPORT_BATCH_SIZE, size=None):
+    """
+    Register the profiles of a binary stream holding either a JSON array or
+    NDJSON, parsed incrementally and inserted batch_size profiles per
+    transaction, so memory use doesn't depend on the size of the stream. Each
+    transaction also checkpoints the progress of job_id, and importing a
+    stream under a job_id that was interrupted resumes right after its last
+    committed batch. Profiles that can't be registered are skipped and
+    reported, for the same reasons as POST /users/bulk (plus invalid_json for
+    NDJSON lines that aren't JSON). size is the number of bytes of the whole
+    stream, when known, without which the last NDJSON line must end with a
+    newline.
+    Returns the report of the import.
+    """
+    start = time.perf_counter()
+    job = db.session.get(ImportJob, job_id)
+    processed = job.processed if job else 0
+    rejected_rows = []
+    error = None
+
+    if job is None:
+        chunks = read_chunks(stream)
+        first_chunk = next(chunks, b"")
+        job = new_job(job_id, detect_format(first_chunk))
+        chunks = itertools.chain([first_chunk], chunks)
+    else:
+        skip_bytes(stream, job.offset)
+        chunks = read_chunks(stream)
+
+    if not job.completed:
+        profiles = (
+            parse_json_array(chunks, job.offset)
+            if job.format == "json"
+            else parse_ndjson(chunks, job.offset, size)
+        )
+        try:
+            batch = []
+            for profile, offset in profiles:
+                batch.append(profile)
+                if len(batch) == batch_size:
+                    import_batch(job, batch, offset, rejected_rows)
+                    batch = []
+
+            if batch:
+                import_batch(job, batch, offset, rejected_rows)
+
+            job.completed = True
+            db.session.add(job)
+            db.session.commit()
+        except ValueError as e:
+            error = str(e)
+        except IntegrityError:
+            error = "An email was registered concurrently, resume the import"
+
+        if error:
+            db.session.rollback()
+            job = db.session.get(ImportJob, job_id) or new_job(job_id, job.format)
+
+    elapsed = time.perf_counter() - start
+    report = {
+        "job": job.id,
+        "completed": job.completed,
+        "processed": job.processed,
+        "imported": job.imported,
+        "rejected": json.loads(job.rejected),
+        "rejected_rows": rejected_rows,
+        "seconds": round(elapsed, 3),
+        "profiles_per_second": round((job.processed - processed) / elapsed)
+        if elapsed
+        else 0,
+    }
+    if error:
+        report["error"] = error
+
+    return report
+
+
+@app.cli.command("import-profiles")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--job", help="Name of the import to resume (the absolute path by default)."
+)
+@click.option(
+    "--batch-size",
+    default=IMPORT_BATCH_SIZE,
+    type=click.IntRange(1, MAX_IMPORT_BATCH_SIZE),
+    help="Number of profiles inserted per transaction.",
+)
+@click.option(
+    "--restart", is_flag=True, help="Discard the progress of a previous import."
+)
+def import_profiles_command(path, job, batch_size, restart):
+    """
+    Register the profiles of a JSON array or NDJSON file, resuming a previous
+    interrupted import of the same file.
+    """
+    job_id = job or os.path.abspath(path)
+    if restart:
+        db.session.execute(ImportJob.__table__.delete().where(ImportJob.id == job_id))
+        db.session.commit()
+    elif getattr(db.session.get(ImportJob, job_id), "completed", False):
+        click.echo(
+            f"'{job_id}' was already imported, pass --restart to import it again"
+        )
+        return
+
+    with open(path, "rb") as f:
+        report = import_profiles(f, job_id, batch_size, os.path.getsize(path))
+
+    for row in report["rejected_rows"]:
+        click.echo(f"profile {row['index']} ({row['email']}): {row['error']}")
+    click.echo(
+        f"Imported {report['imported']} profiles and rejected "
+        f"{sum(report['rejected'].values())} of {report['processed']} "
+        f"({report['profiles_per_second']} profiles/sec)"
+    )
+    for reason, count in sorted(report["rejected"].items()):
+        click.echo(f"  {reason}: {count}")
+
+    if report.get("error"):
+        click.echo(f"Import interrupted: {report['error']}")
+        raise SystemExit(1)
@@ -0,0 +1,325 @@
+import bisect
+import cProfile
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+from flask_restful import Resource
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from serialization import output_json
+
+
+# Upper bounds of the buckets of the duration histograms, in seconds
+DURATION_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+# Upper bounds of the buckets of the queries per request histogram
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250, 1000)
+
+# Minimum number of seconds between two snapshots written to METRICS_DIR
+SNAPSHOT_INTERVAL = 1
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """
+    Prometheus histogram, counting the observed values of every combination of
+    label values into buckets.
+    """
+
+    def __init__(self, name, description, labels, buckets):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        # label values: [count of each bucket (not cumulative), +Inf, sum]
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 2)
+
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {values: list(series) for values, series in self.series.items()}
+
+    def render(self, series):
+        """Render the given series in the Prometheus text format."""
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for values, counts in sorted(series.items()):
+            labels = ",".join(
+                f'{label}="{escape_label(value)}"'
+                for label, value in zip(self.labels, values)
+            )
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(
+                    f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f"{self.name}_sum{{{labels}}} {counts[-1]}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+
+        return lines
+
+
+REQUEST_LABELS = ("method", "route")
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time to handle a request, until the last byte of its response is sent.",
+    REQUEST_LABELS + ("status",),
+    DURATION_BUCKETS,
+)
+request_queries = Histogram(
+    "http_request_db_queries",
+    "Number of SQL statements executed per request.",
+    REQUEST_LABELS,
+    QUERY_COUNT_BUCKETS,
+)
+request_query_duration = Histogram(
+    "http_request_db_query_duration_seconds",
+    "Total time spent executing SQL statements per request.",
+    REQUEST_LABELS,
+    DURATION_BUCKETS,
+)
+request_serialization_duration = Histogram(
+    "http_request_serialization_duration_seconds",
+    "Total time spent serializing response bodies to JSON per request.",
+    REQUEST_LABELS,
+    DURATION_BUCKETS,
+)
+
+HISTOGRAMS = [
+    request_duration,
+    request_queries,
+    request_query_duration,
+    request_serialization_duration,
+]
+
+
+class RequestMetrics:
+    """What a single request spent its time on."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.serialization_seconds = 0.0
+        self.profiler = None
+
+
+def current_metrics():
+    if has_request_context():
+        return g.get("request_metrics")
+    return None
+
+
+def record_serialization(seconds):
+    """Count seconds spent serializing the response of the current request."""
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.serialization_seconds += seconds
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context.query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.queries += 1
+        metrics.query_seconds += time.perf_counter() - context.query_start
+
+
+def route_name():
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def profile_path(directory, method, route):
+    slug = re.sub(r"\W+", "_", route).strip("_") or "root"
+    return os.path.join(directory, f"{time.time_ns()}-{method}-{slug}.prof")
+
+
+def merge_series(into, series):
+    for values, counts in series.items():
+        if values in into:
+            into[values] = [a + b for a, b in zip(into[values], counts)]
+        else:
+            into[values] = list(counts)
+
+
+class MetricsStore:
+    """
+    Collects the metrics of the requests handled by this process. With a
+    metrics_dir, every process also writes a snapshot of its metrics there,
+    and the metrics of every process (including ones that exited) are summed
+    when rendered, so any worker of a pre-forked server can be scraped.
+    """
+
+    def __init__(self, metrics_dir=None):
+        self.metrics_dir = metrics_dir
+        self.snapshot_at = 0
+        self.lock = threading.Lock()
+
+    def snapshot_path(self):
+        return os.path.join(self.metrics_dir, f"{os.getpid()}.json")
+
+    def write_snapshot(self):
+        """Write the metrics of this process, at most every SNAPSHOT_INTERVAL."""
+        now = time.monotonic()
+        with self.lock:
+            if now - self.snapshot_at < SNAPSHOT_INTERVAL:
+                return
+            self.snapshot_at = now
+
+        snapshot = {
+            histogram.name: [
+                [list(values), counts]
+                for values, counts in histogram.snapshot().items()
+            ]
+            for histogram in HISTOGRAMS
+        }
+        # Written under another name then renamed, so readers never see a
+        # partial snapshot
+        temporary_path = f"{self.snapshot_path()}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(temporary_path, self.snapshot_path())
+
+    def render(self):
+        """Render every histogram in the Prometheus text format."""
+        series = {histogram.name: histogram.snapshot() for histogram in HISTOGRAMS}
+
+        if self.metrics_dir:
+            for path in glob.glob(os.path.join(self.metrics_dir, "*.json")):
+                if path == self.snapshot_path():
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshot = json.load(f)
+                except (OSError, ValueError):
+                    continue
+
+                for name, entries in snapshot.items():
+                    if name in series:
+                        merge_series(
+                            series[name],
+                            {tuple(values): counts for values, counts in entries},
+                        )
+
+        lines = []
+        for histogram in HISTOGRAMS:
+            lines.extend(histogram.render(series[histogram.name]))
+
+        return "\n".join(lines) + "\n"
+
+
+def instrument(app, api):
+    """
+    Record the duration, SQL statements and JSON serialization time of every
+    request handled by app, and profile a PROFILE_SAMPLE_RATE fraction of them
+    with cProfile into PROFILE_DIR. Returns the MetricsStore of the process.
+    """
+    store = MetricsStore(app.config.get("METRICS_DIR"))
+    if store.metrics_dir:
+        os.makedirs(store.metrics_dir, exist_ok=True)
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_metrics = metrics = RequestMetrics()
+        if random.random() < app.config["PROFILE_SAMPLE_RATE"]:
+            metrics.profiler = cProfile.Profile()
+            metrics.profiler.enable()
+
+    @app.after_request
+    def record_request_metrics(response):
+        metrics = current_metrics()
+        if metrics is None:
+            return response
+
+        method, route, status = request.method, route_name(), response.status_code
+        profile_dir = app.config["PROFILE_DIR"]
+
+        # Streamed responses are still being generated at this point, so the
+        # metrics are recorded once the response is closed
+        def finish():
+            labels = (method, route)
+            request_duration.observe(
+                (*labels, str(status)), time.perf_counter() - metrics.start
+            )
+            request_queries.observe(labels, metrics.queries)
+            request_query_duration.observe(labels, metrics.query_seconds)
+            request_serialization_duration.observe(
+                labels, metrics.serialization_seconds
+            )
+
+            if metrics.profiler is not None:
+                metrics.profiler.disable()
+                os.makedirs(profile_dir, exist_ok=True)
+                metrics.profiler.dump_stats(profile_path(profile_dir, method, route))
+
+            if store.metrics_dir:
+                store.write_snapshot()
+
+        response.call_on_close(finish)
+        return response
+
+    @api.representation("application/json")
+    def timed_output_json(data, code, headers=None):
+        start = time.perf_counter()
+        response = output_json(data, code, headers)
+        record_serialization(time.perf_counter() - start)
+        return response
+
+    return store
+
+
+class MetricsResource(Resource):
+    """Serves the metrics of a MetricsStore."""
+
+    def __init__(self, store):
+        self.store = store
+
+    # GET /metrics
+    def get(self):
+        return Response(
+            self.store.render(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
@@ -10,36 +10,219 @@ class User(db.Model):
     company = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(80), unique=True, nullable=False)
     phone = db.Column(db.String(80), nullable=False)
-    skills = db.relationship("Skill", backref="user", cascade="all,delete")
-    events = db.relationship("Event", backref="user", cascade="all,delete")
+    # Position of the last write to the user (or to its skills or events) in
+    # the change sequence, and its UTC time
+    version = db.Column(db.BigInteger, nullable=True, index=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    skills = db.relationship(
+        "Skill", backref="user", cascade="all,delete", order_by="Skill.skill_id"
+    )
+    events = db.relationship(
+        "Event", backref="user", cascade="all,delete", order_by="Event.id"
+    )
 
     def __repr__(self):
         return f"User('{self.id}', '{self.name}', '{self.company}', '{self.email}', '{self.phone}', '{self.skills}, '{self.events}')"
 
 
+class SkillName(db.Model):
+    __tablename__ = "skill_name"
+
+    # Database fields
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f"SkillName('{self.id}', '{self.name}')"
+
+
 class Skill(db.Model):
     __tablename__ = "skill"
+    # On SQLite, rows are stored in the primary key's b-tree instead of a rowid
+    # table duplicated by the index of the primary key
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    # Database fields
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
+    )
+    # A user has each skill at most once
+    skill_id = db.Column(
+        db.Integer, db.ForeignKey("skill_name.id"), primary_key=True, index=True
+    )
+    rating = db.Column(db.SmallInteger, nullable=False)
+    # Version of the user when the skill was written
+    version = db.Column(db.BigInteger, nullable=True)
+    skill_name = db.relationship("SkillName", lazy="joined", innerjoin=True)
+
+    @property
+    def skill(self):
+        return self.skill_name.name
+
+    def __repr__(self):
+        return f"Skill('{self.user_id}', '{self.skill_id}', '{self.rating}')"
+
+
+class CatalogEvent(db.Model):
+    __tablename__ = "event_catalog"
+    __table_args__ = (
+        db.Index("ix_event_catalog_event_category", "event", "category", unique=True),
+    )
 
     # Database fields
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"))
-    skill = db.Column(db.String(100), nullable=False)
-    rating = db.Column(db.Integer, nullable=False)
+    event = db.Column(db.String(100), nullable=False)
+    category = db.Column(db.String(100), nullable=False)
+    # Maximum attendance, if the event is limited
+    capacity = db.Column(db.Integer, nullable=True)
+    # Any other fields of the catalog file entry (e.g. room, start time)
+    details = db.Column(db.JSON, nullable=True)
+    # Events removed from the catalog file are kept inactive, since existing
+    # registrations still reference them, and can't be scanned into
+    active = db.Column(db.Boolean, nullable=False, default=True)
 
     def __repr__(self):
-        return f"Skill('{self.id}', '{self.user_id}', '{self.skill}', '{self.rating}')"
+        return f"CatalogEvent('{self.id}', '{self.event}', '{self.category}', '{self.capacity}', '{self.active}')"
 
 
 class Event(db.Model):
     __tablename__ = "event"
+    __table_args__ = (
+        # A user is registered to each event at most once, which the scan
+        # endpoints rely on to skip duplicates with ON CONFLICT DO NOTHING
+        db.Index("ix_event_user_event", "user_id", "event_id", unique=True),
+    )
 
     # Database fields
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"))
-    event = db.Column(db.String(100), nullable=False)
-    category = db.Column(db.String(100), nullable=False)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), index=True
+    )
+    event_id = db.Column(
+        db.Integer, db.ForeignKey("event_catalog.id"), nullable=False, index=True
+    )
+    # UTC time the user was scanned into the event (unknown for registrations
+    # loaded in bulk)
+    scanned_at = db.Column(db.DateTime, nullable=True)
+    # Version of the user when the registration was written, which the event
+    # streams poll for the scans written since they last looked
+    version = db.Column(db.BigInteger, nullable=True, index=True)
+    catalog_event = db.relationship("CatalogEvent", lazy="joined", innerjoin=True)
+
+    @property
+    def event(self):
+        return self.catalog_event.event
+
+    @property
+    def category(self):
+        return self.catalog_event.category
+
+    def __repr__(self):
+        return f"Event('{self.id}', '{self.user_id}', '{self.event_id}')"
+
+
+class ChangeSequence(db.Model):
+    __tablename__ = "change_sequence"
+
+    # Database fields
+    # A single row, holding the last version given out
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f"ChangeSequence('{self.id}', '{self.value}')"
+
+
+class DeletedUser(db.Model):
+    __tablename__ = "deleted_user"
+
+    # Database fields
+    # Version of the deletion in the change sequence
+    version = db.Column(db.BigInteger, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    email = db.Column(db.String(80), nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"DeletedUser('{self.version}', '{self.user_id}', '{self.email}')"
+
+
+class SeedSource(db.Model):
+    __tablename__ = "seed_source"
+
+    # Database fields
+    path = db.Column(db.String(255), primary_key=True)
+    digest = db.Column(db.String(64), nullable=False)
+
+    def __repr__(self):
+        return f"SeedSource('{self.path}', '{self.digest}')"
+
+
+class SeedProfile(db.Model):
+    __tablename__ = "seed_profile"
+
+    # Database fields
+    email = db.Column(db.String(80), primary_key=True)
+    digest = db.Column(db.String(64), nullable=False)
+
+    def __repr__(self):
+        return f"SeedProfile('{self.email}', '{self.digest}')"
+
+
+class ImportJob(db.Model):
+    __tablename__ = "import_job"
+
+    # Database fields
+    id = db.Column(db.String(255), primary_key=True)
+    # "json" (a JSON array of profiles) or "ndjson" (one profile per line)
+    format = db.Column(db.String(10), nullable=False)
+    # Byte offset in the source just past the last profile processed, along
+    # with the number of profiles processed, imported and rejected so far.
+    # Committed in the same transaction as each batch, so an interrupted
+    # import resumes right after the last committed batch
+    offset = db.Column(db.BigInteger, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    imported = db.Column(db.Integer, nullable=False, default=0)
+    # JSON object counting the rejected profiles by reason
+    rejected = db.Column(db.Text, nullable=False, default="{}")
+    completed = db.Column(db.Boolean, nullable=False, default=False)
+
+    def __repr__(self):
+        return f"ImportJob('{self.id}', '{self.format}', '{self.offset}', '{self.processed}', '{self.completed}')"
+
+
+class SkillCount(db.Model):
+    __tablename__ = "skill_count"
+
+    # Database fields
+    skill = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"SkillCount('{self.skill}', '{self.count}')"
+
+
+class EventCount(db.Model):
+    __tablename__ = "event_count"
+
+    # Database fields
+    event = db.Column(db.String(100), primary_key=True)
+    category = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"EventCount('{self.event}', '{self.category}', '{self.count}')"
+
+
+class EventTimeline(db.Model):
+    __tablename__ = "event_timeline"
+
+    # Database fields
+    event = db.Column(db.String(100), primary_key=True)
+    category = db.Column(db.String(100), primary_key=True)
+    # Start of the minute (UTC) the scans were counted in
+    minute = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
 
     def __repr__(self):
-        return (
-            f"Skill('{self.id}', '{self.user_id}', '{self.event}', '{self.category}')"
-        )
+        return f"EventTimeline('{self.event}', '{self.category}', '{self.minute}', '{self.count}')"
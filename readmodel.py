@@ -0,0 +1,549 @@
+import bisect
+import hashlib
+import io
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from collections import Counter
+
+from sqlalchemy import select
+
+from api import db, repository
+from models import Event, Skill, User
+from repository import keyset_chunks
+from search import ProfileIndex, select_event_rows, select_skill_rows
+
+
+PROFILE_COLUMNS = [
+    User.__table__.c[column] for column in ("id", "name", "company", "email", "phone")
+]
+
+# Number of rows fetched per round trip while building a snapshot
+SNAPSHOT_CHUNK_SIZE = 1000
+
+# Identifies snapshot files, along with the version of their layout
+SNAPSHOT_MAGIC = b"HTNRM002"
+
+# Arrays are written in the native byte order, which a snapshot records
+BYTE_ORDER = sys.byteorder.encode().ljust(6, b"\0")
+
+# Arrays of a snapshot, in file order, with the typecode of their items
+SNAPSHOT_SECTIONS = [
+    # UTF-8 bytes of the skill, event and category names, and the offset of
+    # each name in them (followed by the end offset)
+    ("name_bytes", "B"),
+    ("name_offsets", "Q"),
+    # Same for the name, company, email and phone of the users
+    ("string_bytes", "B"),
+    ("string_offsets", "Q"),
+    # Id of every user, in ascending order, and the strings of each of them
+    ("user_ids", "q"),
+    ("user_strings", "I"),
+    # Skills of the users: the first skill of each user (followed by the
+    # total), and the name and rating of every skill
+    ("skill_offsets", "I"),
+    ("skill_names", "I"),
+    ("skill_ratings", "i"),
+    # Events of the users, as indexes into event_pairs, the event and category
+    # names of every distinct (event, category) pair
+    ("event_offsets", "I"),
+    ("event_keys", "I"),
+    ("event_pairs", "I"),
+    # Rows of the users sorted by email, for lookups by binary search
+    ("email_order", "I"),
+    # (skill name, count) and (event pair, count) pairs
+    ("skill_counts", "q"),
+    ("event_counts", "q"),
+]
+
+# Magic, byte order, build time, version of the change sequence it was built
+# at, digest of the database URL, then the (offset, size in bytes) of every
+# section
+SNAPSHOT_HEADER = struct.Struct("<8s6sdq32s" + "QQ" * len(SNAPSHOT_SECTIONS))
+
+# Sections start at multiples of this many bytes, so every array is aligned
+SECTION_ALIGNMENT = 8
+
+
+class UserRecord:
+    """
+    A user profile, with its skills as (skill, rating) pairs and its events as
+    (event, category) pairs.
+    """
+
+    __slots__ = ("id", "name", "company", "email", "phone", "skills", "events")
+
+    def __init__(self, id, name, company, email, phone, skills, events):
+        self.id = id
+        self.name = name
+        self.company = company
+        self.email = email
+        self.phone = phone
+        self.skills = skills
+        self.events = events
+
+
+def serialize_record(user):
+    return {
+        "id": user.id,
+        "name": user.name,
+        "company": user.company,
+        "email": user.email,
+        "phone": user.phone,
+        "skills": [{"skill": skill, "rating": rating} for skill, rating in user.skills],
+        "events": [
+            {"event": event, "category": category} for event, category in user.events
+        ],
+    }
+
+
+def database_digest(database_url):
+    return hashlib.sha256(database_url.encode()).digest()
+
+
+def write_snapshot(f, profiles, built_at, version, database):
+    """
+    Write a snapshot of the (user, skills, events) profiles yielded in id order
+    by Repository.export_profiles, as of the given version, to the binary file
+    f.
+    """
+    names = {}
+    pairs = {}
+    sections = {name: array(typecode) for name, typecode in SNAPSHOT_SECTIONS}
+    sections["string_offsets"].append(0)
+    sections["skill_offsets"].append(0)
+    sections["event_offsets"].append(0)
+
+    def name_id(name):
+        if name not in names:
+            names[name] = len(names)
+        return names[name]
+
+    emails = []
+    string_bytes = bytearray()
+    for (user_id, *strings), skills, events in profiles:
+        sections["user_ids"].append(user_id)
+        for value in strings:
+            sections["user_strings"].append(len(sections["string_offsets"]) - 1)
+            string_bytes += value.encode()
+            sections["string_offsets"].append(len(string_bytes))
+        emails.append(strings[2].encode())
+
+        for skill, rating in skills:
+            sections["skill_names"].append(name_id(skill))
+            sections["skill_ratings"].append(rating)
+        sections["skill_offsets"].append(len(sections["skill_names"]))
+
+        for event, category in events:
+            if (event, category) not in pairs:
+                pairs[(event, category)] = len(pairs)
+                sections["event_pairs"].extend([name_id(event), name_id(category)])
+            sections["event_keys"].append(pairs[(event, category)])
+        sections["event_offsets"].append(len(sections["event_keys"]))
+
+    sections["string_bytes"] = string_bytes
+    sections["email_order"].extend(sorted(range(len(emails)), key=emails.__getitem__))
+
+    name_bytes = bytearray()
+    sections["name_offsets"].append(0)
+    for name in names:
+        name_bytes += name.encode()
+        sections["name_offsets"].append(len(name_bytes))
+    sections["name_bytes"] = name_bytes
+
+    for name, count in Counter(sections["skill_names"]).items():
+        sections["skill_counts"].extend([name, count])
+    for pair, count in Counter(sections["event_keys"]).items():
+        sections["event_counts"].extend([pair, count])
+
+    # Lay the sections out after the header, then write everything
+    bounds = []
+    offset = SNAPSHOT_HEADER.size
+    for name, _ in SNAPSHOT_SECTIONS:
+        offset += -offset % SECTION_ALIGNMENT
+        size = memoryview(sections[name]).nbytes
+        bounds.extend([offset, size])
+        offset += size
+
+    f.write(
+        SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, BYTE_ORDER, built_at, version, database, *bounds
+        )
+    )
+    position = SNAPSHOT_HEADER.size
+    for (name, _), offset, size in zip(SNAPSHOT_SECTIONS, bounds[::2], bounds[1::2]):
+        f.write(b"\0" * (offset - position))
+        f.write(sections[name])
+        position = offset + size
+
+
+class Snapshot:
+    """
+    Read-only view of the profiles in a snapshot, reading its arrays in place
+    from the given buffer (e.g. a memory-mapped snapshot file). Only the skill,
+    event and category names are decoded upfront, so opening a snapshot takes
+    the same time however many users it holds.
+    """
+
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        if len(view) < SNAPSHOT_HEADER.size:
+            raise ValueError("Not a snapshot")
+
+        (
+            magic,
+            byte_order,
+            self.built_at,
+            self.version,
+            self.database,
+            *bounds,
+        ) = SNAPSHOT_HEADER.unpack_from(view)
+        if magic != SNAPSHOT_MAGIC or byte_order != BYTE_ORDER:
+            raise ValueError("Not a snapshot of this version and byte order")
+
+        for (name, typecode), offset, size in zip(
+            SNAPSHOT_SECTIONS, bounds[::2], bounds[1::2]
+        ):
+            if offset + size > len(view):
+                raise ValueError("Truncated snapshot")
+            setattr(self, name, view[offset : offset + size].cast(typecode))
+
+        # Interned, so every user record shares the same string objects
+        self.names = [
+            sys.intern(str(self.name_bytes[start:end], "utf-8"))
+            for start, end in zip(self.name_offsets, self.name_offsets[1:])
+        ]
+        self.pairs = [
+            (self.names[event], self.names[category])
+            for event, category in zip(self.event_pairs[::2], self.event_pairs[1::2])
+        ]
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def string_range(self, index):
+        return slice(self.string_offsets[index], self.string_offsets[index + 1])
+
+    def string(self, index):
+        return str(self.string_bytes[self.string_range(index)], "utf-8")
+
+    def record(self, row):
+        """Return the user on the given row."""
+        skills = range(self.skill_offsets[row], self.skill_offsets[row + 1])
+        events = range(self.event_offsets[row], self.event_offsets[row + 1])
+        return UserRecord(
+            self.user_ids[row],
+            *(self.string(index) for index in self.user_strings[4 * row : 4 * row + 4]),
+            tuple(
+                (self.names[self.skill_names[i]], self.skill_ratings[i]) for i in skills
+            ),
+            tuple(self.pairs[self.event_keys[i]] for i in events),
+        )
+
+    def row_of_id(self, user_id):
+        row = bisect.bisect_left(self.user_ids, user_id)
+        if row < len(self.user_ids) and self.user_ids[row] == user_id:
+            return row
+        return None
+
+    def email_bytes(self, row):
+        return bytes(self.string_bytes[self.string_range(4 * row + 2)])
+
+    def row_of_email(self, email):
+        # Binary search of the rows in email order (bisect only takes a key
+        # from Python 3.10)
+        email = email.encode()
+        low, high = 0, len(self.email_order)
+        while low < high:
+            middle = (low + high) // 2
+            if self.email_bytes(self.email_order[middle]) < email:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.email_order):
+            row = self.email_order[low]
+            if self.email_bytes(row) == email:
+                return row
+        return None
+
+    def skill_counter(self):
+        return Counter(
+            {
+                self.names[name]: count
+                for name, count in zip(self.skill_counts[::2], self.skill_counts[1::2])
+            }
+        )
+
+    def event_counter(self):
+        return Counter(
+            {
+                self.pairs[pair]: count
+                for pair, count in zip(self.event_counts[::2], self.event_counts[1::2])
+            }
+        )
+
+
+def empty_snapshot():
+    f = io.BytesIO()
+    write_snapshot(f, [], 0, 0, b"")
+    return Snapshot(f.getbuffer())
+
+
+def map_file(f):
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ReadModel(ProfileIndex):
+    """
+    In-memory copy of every user profile, answering GET /users,
+    GET /users/:email, GET /skills and GET /events without loading ORM objects.
+
+    The profiles are held in a Snapshot: flat arrays of ids, string offsets and
+    interned name ids read in place from a buffer, which takes a few bytes per
+    user beyond the strings themselves. Users written since the snapshot was
+    built are reloaded into an overlay of UserRecord objects (None for deleted
+    users) taking precedence over it, and the skill and event counts are
+    adjusted along with them.
+
+    With a snapshot_path, every build from the database also writes the
+    snapshot to that file, and a process (e.g. a new worker) building its read
+    model memory-maps the file instead of reading the database, as long as it
+    is younger than max_age and was built after the last bulk reload this
+    process saw. The users written since the version of the snapshot are then
+    reloaded like any other change.
+    """
+
+    def __init__(self, database_url, max_age=None, snapshot_path=None):
+        self.database = database_digest(database_url)
+        self.snapshot_path = snapshot_path
+        # Wall clock time of the last bulk reload seen by this process
+        self.written_at = 0
+        super().__init__(max_age)
+
+    def clear(self):
+        self.snapshot = empty_snapshot()
+        # user_id: UserRecord, or None for deleted users
+        self.overlay = {}
+        self.overlay_ids_by_email = {}
+        # Sorted ids of the users in the overlay but not in the snapshot
+        self.added_ids = []
+        self.skill_counts = Counter()
+        self.event_counts = Counter()
+
+    def invalidate(self):
+        self.written_at = time.time()
+        super().invalidate()
+
+    def warm_up(self):
+        """Build the read model now rather than on the first read."""
+        with self.lock:
+            self.refresh()
+
+    def use(self, snapshot):
+        self.snapshot = snapshot
+        self.skill_counts = snapshot.skill_counter()
+        self.event_counts = snapshot.event_counter()
+
+    def load_snapshot(self):
+        """Use the snapshot file if it is recent enough, returning whether it is."""
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                snapshot = Snapshot(map_file(f))
+        except (OSError, ValueError):
+            return False
+
+        # Without a max_age, nothing would bound how old the snapshot is
+        age = time.time() - snapshot.built_at
+        if (
+            self.max_age is None
+            or age > self.max_age
+            or snapshot.database != self.database
+            or snapshot.built_at <= self.written_at
+        ):
+            return False
+
+        self.use(snapshot)
+        # The snapshot ages from the time it was built
+        self.built_at -= age
+        self.version = snapshot.version
+        return True
+
+    def build(self):
+        if self.snapshot_path and self.load_snapshot():
+            return
+
+        built_at = time.time()
+        profiles = repository.export_profiles(SNAPSHOT_CHUNK_SIZE)
+        if not self.snapshot_path:
+            f = io.BytesIO()
+            write_snapshot(f, profiles, built_at, self.version, self.database)
+            self.use(Snapshot(f.getbuffer()))
+            return
+
+        # Written under another name then renamed, so other processes never
+        # map a partial snapshot
+        temporary_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w+b") as f:
+            write_snapshot(f, profiles, built_at, self.version, self.database)
+            f.flush()
+            self.use(Snapshot(map_file(f)))
+        os.replace(temporary_path, self.snapshot_path)
+
+    def reload(self, emails):
+        # Drop the users holding these emails, and load the current version of
+        # whichever of them still exist (possibly under a new email)
+        users = db.session.execute(
+            select(*PROFILE_COLUMNS).where(User.email.in_(emails))
+        ).all()
+        user_ids = [user.id for user in users]
+        skills = {}
+        for user_id, skill, rating in db.session.execute(
+            select_skill_rows()
+            .where(Skill.user_id.in_(user_ids))
+            .order_by(Skill.user_id, Skill.skill_id)
+        ):
+            skills.setdefault(user_id, []).append((sys.intern(skill), rating))
+        events = {}
+        for user_id, event, category in db.session.execute(
+            select_event_rows()
+            .where(Event.user_id.in_(user_ids))
+            .order_by(Event.user_id, Event.id)
+        ):
+            events.setdefault(user_id, []).append(
+                (sys.intern(event), sys.intern(category))
+            )
+
+        for email in emails:
+            user = self.lookup(email)
+            if user is not None:
+                self.put(user.id, None)
+
+        for user in users:
+            self.put(
+                user.id,
+                UserRecord(
+                    *user,
+                    tuple(skills.get(user.id, ())),
+                    tuple(events.get(user.id, ())),
+                ),
+            )
+
+    def email_of(self, user_id):
+        user = self.lookup_id(user_id)
+        return None if user is None else user.email
+
+    def lookup_id(self, user_id):
+        if user_id in self.overlay:
+            return self.overlay[user_id]
+
+        row = self.snapshot.row_of_id(user_id)
+        return None if row is None else self.snapshot.record(row)
+
+    def lookup(self, email):
+        if email in self.overlay_ids_by_email:
+            return self.overlay[self.overlay_ids_by_email[email]]
+
+        row = self.snapshot.row_of_email(email)
+        # Users in the overlay were changed or deleted since the snapshot
+        if row is None or self.snapshot.user_ids[row] in self.overlay:
+            return None
+
+        return self.snapshot.record(row)
+
+    def count(self, user, delta):
+        for skill, _ in user.skills:
+            self.skill_counts[skill] += delta
+        for event in user.events:
+            self.event_counts[event] += delta
+
+    def put(self, user_id, user):
+        """Replace the user with this id by the given UserRecord, or None."""
+        previous = self.lookup_id(user_id)
+        if previous is not None:
+            self.count(previous, -1)
+            if self.overlay_ids_by_email.get(previous.email) == user_id:
+                del self.overlay_ids_by_email[previous.email]
+
+        self.overlay[user_id] = user
+        if user is not None:
+            self.count(user, 1)
+            self.overlay_ids_by_email[user.email] = user_id
+
+        if self.snapshot.row_of_id(user_id) is None:
+            position = bisect.bisect_left(self.added_ids, user_id)
+            added = (
+                position < len(self.added_ids) and self.added_ids[position] == user_id
+            )
+            if user is None and added:
+                del self.added_ids[position]
+            elif user is not None and not added:
+                self.added_ids.insert(position, user_id)
+
+    def find_user(self, email):
+        """Return the UserRecord of the user with this email, or None."""
+        with self.lock:
+            self.refresh()
+            return self.lookup(email)
+
+    def users_after(self, after_id, size):
+        """Return at most size UserRecords with an id greater than after_id."""
+        with self.lock:
+            self.refresh()
+
+            # Merge the users of the snapshot with the ones added since
+            snapshot, added_ids = self.snapshot, self.added_ids
+            row = bisect.bisect_right(snapshot.user_ids, after_id)
+            position = bisect.bisect_right(added_ids, after_id)
+            users = []
+            while len(users) < size:
+                snapshot_id = snapshot.user_ids[row] if row < len(snapshot) else None
+                added_id = added_ids[position] if position < len(added_ids) else None
+                if snapshot_id is None and added_id is None:
+                    break
+
+                if added_id is None or (
+                    snapshot_id is not None and snapshot_id < added_id
+                ):
+                    if snapshot_id in self.overlay:
+                        user = self.overlay[snapshot_id]
+                    else:
+                        user = snapshot.record(row)
+                    row += 1
+                else:
+                    user = self.overlay[added_id]
+                    position += 1
+
+                if user is not None:
+                    users.append(user)
+
+            return users
+
+    def user_chunks(self, after_id, limit, chunk_size):
+        """
+        Yield the users with an id greater than after_id (at most limit of
+        them) in lists of at most chunk_size UserRecords, like
+        Repository.user_chunks.
+        """
+        return keyset_chunks(self.users_after, after_id, limit, chunk_size)
+
+    def skills(self):
+        """Return the (skill, count) pairs, most common first."""
+        with self.lock:
+            self.refresh()
+            counts = [(skill, count) for skill, count in self.skill_counts.items()]
+
+        return sorted(counts, key=lambda item: (-item[1], item[0]))
+
+    def events(self):
+        """Return the (event, category, count) tuples, most attended first."""
+        with self.lock:
+            self.refresh()
+            counts = [
+                (event, category, count)
+                for (event, category), count in self.event_counts.items()
+            ]
+
+        return sorted(counts, key=lambda item: (-item[2], item[0], item[1]))
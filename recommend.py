@@ -0,0 +1,221 @@
+import numpy as np
+from sqlalchemy import select
+
+from api import db
+from models import Skill, User
+from search import ProfileIndex, select_skill_rows
+
+
+def top_k(scores, candidates, user_ids, k):
+    """
+    Return the (user_id, score) pairs of the k best scoring candidate rows,
+    best first and by user id among equal scores, without sorting every
+    candidate.
+    """
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+
+    order = np.lexsort((user_ids[candidates], -scores[candidates]))
+    return [(int(user_ids[row]), float(scores[row])) for row in candidates[order]]
+
+
+class SkillMatrix(ProfileIndex):
+    """
+    Dense user x skill matrix of ratings (0 when the user doesn't have the
+    skill), with one row per user and one column per distinct skill name
+    (compared case-insensitively). Ratings are stored as uint8, so 100k users
+    with 300 skills take 30MB, and every query only reads the columns of the
+    skills it involves.
+    """
+
+    def clear(self):
+        self.ratings = np.zeros((0, 0), dtype=np.uint8)
+        # Euclidean norm of each row, for cosine similarities
+        self.norms = np.zeros(0, dtype=np.float32)
+        # Id of the user on each row, 0 for free rows
+        self.user_ids = np.zeros(0, dtype=np.int64)
+        self.rows = {}
+        self.ids_by_email = {}
+        self.emails = {}
+        # Rows in use are all below size, free_rows lists the ones that aren't
+        self.size = 0
+        self.free_rows = []
+        # lowercased skill: column, and the original skill name of each column
+        self.columns = {}
+        self.skill_names = []
+
+    def reserve(self, rows, columns):
+        """Grow the arrays (doubling them) to hold at least rows x columns."""
+        capacity, column_capacity = self.ratings.shape
+        if rows <= capacity and columns <= column_capacity:
+            return
+
+        if rows > capacity:
+            capacity = max(rows, capacity * 2)
+        if columns > column_capacity:
+            column_capacity = max(columns, column_capacity * 2)
+        ratings = np.zeros((capacity, column_capacity), dtype=np.uint8)
+        ratings[: len(self.ratings), : self.ratings.shape[1]] = self.ratings
+        self.ratings = ratings
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[: len(self.norms)] = self.norms
+        self.norms = norms
+        user_ids = np.zeros(capacity, dtype=np.int64)
+        user_ids[: len(self.user_ids)] = self.user_ids
+        self.user_ids = user_ids
+
+    def column(self, skill):
+        """Return the column of skill, adding one for new skills."""
+        key = skill.lower()
+        if key not in self.columns:
+            self.columns[key] = len(self.skill_names)
+            self.skill_names.append(skill)
+            self.reserve(len(self.user_ids), len(self.skill_names))
+
+        return self.columns[key]
+
+    def load(self, user_rows, skill_rows):
+        """Add (id, email) users along with their (user_id, skill, rating) rows."""
+        user_rows = [
+            (user_id, email) for user_id, email in user_rows if user_id not in self.rows
+        ]
+        for user_id, email in user_rows:
+            row = self.free_rows.pop() if self.free_rows else None
+            if row is None:
+                row = self.size
+                self.size += 1
+            self.rows[user_id] = row
+            self.ids_by_email[email] = user_id
+            self.emails[user_id] = email
+
+        self.reserve(self.size, len(self.skill_names))
+        new_rows = np.array([self.rows[user_id] for user_id, _ in user_rows], dtype=int)
+        self.user_ids[new_rows] = [user_id for user_id, _ in user_rows]
+
+        skill_rows = [row for row in skill_rows if row[0] in self.rows]
+        if not skill_rows:
+            return
+
+        rows = np.array([self.rows[user_id] for user_id, _, _ in skill_rows])
+        columns = np.array([self.column(skill) for _, skill, _ in skill_rows])
+        ratings = np.clip([rating for _, _, rating in skill_rows], 0, 255)
+        self.ratings[rows, columns] = ratings
+
+        # Converting a few thousand rows at a time bounds the float copy
+        affected = np.unique(rows)
+        for chunk in np.array_split(affected, len(affected) // 4096 + 1):
+            self.norms[chunk] = np.linalg.norm(
+                self.ratings[chunk].astype(np.float32), axis=1
+            )
+
+    def remove(self, user_id):
+        row = self.rows.pop(user_id)
+        del self.ids_by_email[self.emails.pop(user_id)]
+        self.ratings[row] = 0
+        self.norms[row] = 0
+        self.user_ids[row] = 0
+        self.free_rows.append(row)
+
+    def build(self):
+        connection = db.session.connection()
+        self.load(
+            connection.execute(
+                select(User.__table__.c.id, User.__table__.c.email)
+            ).all(),
+            connection.execute(select_skill_rows()).all(),
+        )
+
+    def reload(self, emails):
+        # Drop the users, and load the current version of whichever of them
+        # still exist (possibly under a new email)
+        for email in emails:
+            if email in self.ids_by_email:
+                self.remove(self.ids_by_email[email])
+
+        users = db.session.execute(
+            select(User.id, User.email).where(User.email.in_(emails))
+        ).all()
+        for user_id, _ in users:
+            if user_id in self.rows:
+                self.remove(user_id)
+
+        self.load(
+            users,
+            db.session.execute(
+                select_skill_rows().where(
+                    Skill.user_id.in_([user_id for user_id, _ in users])
+                )
+            ).all(),
+        )
+
+    def email_of(self, user_id):
+        return self.emails.get(user_id)
+
+    def match(self, requirements, require_all=True, limit=10):
+        """
+        Rank the users against (skill, min_rating, weight) requirements. A
+        requirement is met when the user rates the skill at least min_rating,
+        and a user's score is the weighted sum of the ratings of the
+        requirements they meet. With require_all, only the users meeting every
+        requirement are ranked, otherwise the ones meeting at least one are.
+        Returns the (user_id, score) pairs of the limit best users.
+        """
+        with self.lock:
+            self.refresh()
+
+            columns = [self.columns.get(skill.lower()) for skill, _, _ in requirements]
+            if require_all and None in columns:
+                return []
+
+            requirements = [
+                (column, min_rating, weight)
+                for column, (_, min_rating, weight) in zip(columns, requirements)
+                if column is not None
+            ]
+            if not requirements:
+                return []
+
+            ratings = self.ratings[
+                : self.size, [column for column, _, _ in requirements]
+            ].astype(np.float32)
+            met = ratings >= np.array(
+                [min_rating for _, min_rating, _ in requirements], dtype=np.float32
+            )
+            scores = (ratings * met) @ np.array(
+                [weight for _, _, weight in requirements], dtype=np.float32
+            )
+            candidates = np.flatnonzero(
+                met.all(axis=1) if require_all else met.any(axis=1)
+            )
+
+            return top_k(scores, candidates, self.user_ids, limit)
+
+    def similar(self, user_id, limit=10):
+        """
+        Return the (user_id, similarity) pairs of the limit users whose ratings
+        have the highest cosine similarity with the ratings of user_id.
+        """
+        with self.lock:
+            self.refresh()
+
+            if user_id not in self.rows:
+                return []
+
+            row = self.rows[user_id]
+            columns = np.flatnonzero(self.ratings[row])
+            if not len(columns):
+                return []
+
+            # Only the columns of the user's own skills contribute to the dot
+            # products
+            ratings = self.ratings[: self.size, columns].astype(np.float32)
+            dots = ratings @ ratings[row]
+            norms = self.norms[: self.size] * self.norms[row]
+            similarities = np.divide(
+                dots, norms, out=np.zeros_like(dots), where=norms > 0
+            )
+            similarities[row] = 0
+
+            return top_k(
+                similarities, np.flatnonzero(similarities > 0), self.user_ids, limit
+            )
@@ -0,0 +1,408 @@
+import abc
+import io
+import itertools
+
+from sqlalchemy import delete, select, text, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import selectinload
+
+from models import CatalogEvent, Event, Skill, SkillName, User
+
+
+# Maximum number of values bound into a single IN (...) clause
+IN_CLAUSE_CHUNK_SIZE = 500
+
+
+def chunked(values, size):
+    """Yield successive lists of at most size items from values."""
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
+
+
+def select_users_chunk(after_id, chunk_size):
+    """Select the chunk_size users following after_id, with skills and events."""
+    return (
+        select(User)
+        .options(selectinload(User.skills), selectinload(User.events))
+        .where(User.id > after_id)
+        .order_by(User.id)
+        .limit(chunk_size)
+    )
+
+
+def keyset_pages(after_id, limit, chunk_size):
+    """
+    Plan the keyset pagination of the users with an id greater than after_id
+    (at most limit of them) in chunks of at most chunk_size users: yield the
+    (after_id, size) of each chunk to fetch, and expect the users fetched to be
+    sent back. Drivers that fetch synchronously or asynchronously share it.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        users = yield after_id, size
+        if len(users) < size:
+            return
+
+        after_id = users[-1].id
+        if remaining is not None:
+            remaining -= len(users)
+
+
+def keyset_chunks(fetch_chunk, after_id, limit, chunk_size):
+    """
+    Yield the users with an id greater than after_id (at most limit of them) in
+    lists of at most chunk_size users, each fetched by calling
+    fetch_chunk(after_id, size) with the id of the last user yielded so far.
+    """
+    pages = keyset_pages(after_id, limit, chunk_size)
+    page = next(pages, None)
+    while page is not None:
+        users = fetch_chunk(*page)
+        if users:
+            yield users
+        page = next_page(pages, users)
+
+
+def next_page(pages, users):
+    """Send the users of a chunk to keyset_pages, returning the next page or None."""
+    try:
+        return pages.send(users)
+    except StopIteration:
+        return None
+
+
+def group_by_user(rows):
+    """
+    Group rows ordered by user id (their first column) into (user_id, [rest of
+    each row]) pairs.
+    """
+    for user_id, group in itertools.groupby(rows, key=lambda row: row[0]):
+        yield user_id, [tuple(row[1:]) for row in group]
+
+
+class Repository(abc.ABC):
+    """
+    Data access shared by every storage backend, written with portable
+    SQLAlchemy statements. The backend subclasses provide the dialect-specific
+    INSERT construct and override the operations that have a faster native
+    path. Nothing is committed, the caller owns the transaction.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    @abc.abstractmethod
+    def insert(self, model):
+        """
+        Return a Core INSERT into the table of model supporting
+        on_conflict_do_* clauses (skipped rows make ORM bulk inserts fail).
+        """
+
+    def find_user(self, email):
+        return self.session.scalar(select(User).where(User.email == email))
+
+    def find_user_ids(self, emails):
+        """Map each of the given emails that is registered to its user id."""
+        user_ids = {}
+        for emails_chunk in chunked(set(emails), IN_CLAUSE_CHUNK_SIZE):
+            user_ids.update(
+                self.session.execute(
+                    select(User.email, User.id).where(User.email.in_(emails_chunk))
+                ).all()
+            )
+
+        return user_ids
+
+    def users_by_id(self, user_ids):
+        """Load the given users with their skills and events, in id order."""
+        if not user_ids:
+            return []
+
+        return self.session.scalars(
+            select(User)
+            .options(selectinload(User.skills), selectinload(User.events))
+            .where(User.id.in_(user_ids))
+            .order_by(User.id)
+        ).all()
+
+    def skill_ids(self, names):
+        """
+        Map each of the given skill names to its skill_name id, adding the names
+        that don't have one yet.
+        """
+        names = set(names)
+        skill_ids = {}
+        for names_chunk in chunked(names, IN_CLAUSE_CHUNK_SIZE):
+            skill_ids.update(
+                self.session.execute(
+                    select(SkillName.name, SkillName.id).where(
+                        SkillName.name.in_(names_chunk)
+                    )
+                ).all()
+            )
+
+        missing = [{"name": name} for name in sorted(names) if name not in skill_ids]
+        if missing:
+            statement = (
+                self.insert(SkillName)
+                .on_conflict_do_nothing(index_elements=[SkillName.name])
+                .returning(SkillName.name, SkillName.id)
+            )
+            skill_ids.update(
+                tuple(row) for row in self.session.execute(statement, missing)
+            )
+
+        # Names added concurrently were skipped by the insert
+        if len(skill_ids) < len(names):
+            skill_ids.update(
+                self.session.execute(
+                    select(SkillName.name, SkillName.id).where(
+                        SkillName.name.in_(
+                            [name for name in names if name not in skill_ids]
+                        )
+                    )
+                ).all()
+            )
+
+        return skill_ids
+
+    def bulk_insert(self, model, rows):
+        """Insert a list of row dicts into the table of model."""
+        if rows:
+            self.session.execute(model.__table__.insert(), rows)
+
+    def insert_users(self, rows):
+        """
+        Insert the given user rows, leaving their ids to the database so
+        concurrent inserts never pick the same ones. Returns the id given to
+        each user, by email.
+        """
+        if not rows:
+            return {}
+
+        statement = self.insert(User).returning(User.email, User.id)
+        return dict(self.session.execute(statement, rows).all())
+
+    def insert_new_events(self, rows):
+        """
+        Insert the given {user_id, event_id, scanned_at} registrations, skipping
+        the ones that already exist (including ones committed concurrently).
+        Returns the set of (user_id, event_id) keys actually inserted.
+        """
+        if not rows:
+            return set()
+
+        return {
+            tuple(row)
+            for row in self.session.execute(self.new_events_statement(), rows)
+        }
+
+    def new_events_statement(self):
+        """
+        Return the statement of insert_new_events, for the async handlers to
+        execute on their own sessions.
+        """
+        return (
+            self.insert(Event)
+            .on_conflict_do_nothing(index_elements=[Event.user_id, Event.event_id])
+            .returning(Event.user_id, Event.event_id)
+        )
+
+    def delete_events(self, keys):
+        """Delete the registrations with the given (user_id, event_id) keys."""
+        for keys_chunk in chunked(keys, IN_CLAUSE_CHUNK_SIZE):
+            self.session.execute(
+                delete(Event).where(
+                    tuple_(Event.user_id, Event.event_id).in_(keys_chunk)
+                )
+            )
+
+    def user_chunks(self, after_id, limit, chunk_size):
+        """
+        Yield the users with an id greater than after_id (at most limit of
+        them), with their skills and events, in lists of at most chunk_size
+        users. Each chunk is fetched with a fixed number of keyset-paginated
+        queries, so only one chunk is held in memory.
+        """
+        return keyset_chunks(
+            lambda after_id, size: self.session.scalars(
+                select_users_chunk(after_id, size)
+            ).all(),
+            after_id,
+            limit,
+            chunk_size,
+        )
+
+    def export_profiles(self, chunk_size):
+        """
+        Yield a ((id, name, company, email, phone), [(skill, rating)],
+        [(event, category)]) tuple for every user, in id order. Users, skills
+        and events are read through three cursors ordered by user id, streamed
+        chunk_size rows at a time and merged in a single pass, so memory stays
+        constant however many users there are.
+        """
+        # Core rows through the connection skip the ORM result processing
+        connection = self.session.connection()
+        users = connection.execute(
+            select(User.id, User.name, User.company, User.email, User.phone)
+            .order_by(User.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        skills = group_by_user(
+            connection.execute(
+                select(Skill.user_id, SkillName.name, Skill.rating)
+                .join(Skill.skill_name)
+                .order_by(Skill.user_id, Skill.skill_id)
+                .execution_options(yield_per=chunk_size)
+            )
+        )
+        events = group_by_user(
+            connection.execute(
+                select(Event.user_id, CatalogEvent.event, CatalogEvent.category)
+                .join(Event.catalog_event)
+                .where(Event.user_id.is_not(None))
+                .order_by(Event.user_id, Event.id)
+                .execution_options(yield_per=chunk_size)
+            )
+        )
+
+        next_skills = next(skills, None)
+        next_events = next(events, None)
+        for user in users:
+            user_skills = []
+            while next_skills is not None and next_skills[0] <= user.id:
+                if next_skills[0] == user.id:
+                    user_skills = next_skills[1]
+                next_skills = next(skills, None)
+
+            user_events = []
+            while next_events is not None and next_events[0] <= user.id:
+                if next_events[0] == user.id:
+                    user_events = next_events[1]
+                next_events = next(events, None)
+
+            yield tuple(user), user_skills, user_events
+
+
+class SQLiteRepository(Repository):
+    def insert(self, model):
+        return sqlite.insert(model.__table__)
+
+
+def copy_field(value):
+    """
+    Encode value as a field of COPY's csv format: None as an unquoted empty
+    field, which COPY reads as NULL, and anything else quoted, which COPY reads
+    as a value even when it is an empty string.
+    """
+    if value is None:
+        return ""
+
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class PostgresRepository(Repository):
+    def insert(self, model):
+        return postgresql.insert(model.__table__)
+
+    def bulk_insert(self, model, rows):
+        """
+        Stream the rows into the table of model with COPY, which skips the
+        per-row statement overhead of INSERT entirely.
+        """
+        if not rows:
+            return
+
+        self.copy_rows(model, rows)
+
+        # COPY bypasses the id sequence, so move it past the ids given explicitly
+        if "id" in rows[0]:
+            table = self.preparer().format_table(model.__table__)
+            self.session.execute(
+                text(
+                    "SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+                    f"(SELECT max(id) FROM {table}))"
+                ),
+                {"table": table},
+            )
+
+    def insert_users(self, rows):
+        """
+        Insert the given user rows with COPY, under ids taken from the id
+        sequence so concurrent inserts never pick the same ones. Returns the id
+        given to each user, by email.
+        """
+        if not rows:
+            return {}
+
+        user_ids = self.session.scalars(
+            text(
+                "SELECT nextval(pg_get_serial_sequence(:table, 'id')) "
+                "FROM generate_series(1, :count)"
+            ),
+            {"table": self.preparer().format_table(User.__table__), "count": len(rows)},
+        ).all()
+        rows = [{**row, "id": user_id} for row, user_id in zip(rows, user_ids)]
+        self.copy_rows(User, rows)
+
+        return {row["email"]: row["id"] for row in rows}
+
+    def preparer(self):
+        return self.session.get_bind().dialect.identifier_preparer
+
+    def copy_rows(self, model, rows):
+        """Stream the rows into the table of model with COPY."""
+        table = model.__table__
+        columns = list(rows[0])
+        preparer = self.preparer()
+
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(",".join(copy_field(row[column]) for column in columns))
+            buffer.write("\n")
+        buffer.seek(0)
+
+        cursor = self.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {preparer.format_table(table)} "
+                f"({', '.join(preparer.quote(column) for column in columns)}) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        finally:
+            cursor.close()
+
+    def user_chunks(self, after_id, limit, chunk_size):
+        """
+        Yield the users with an id greater than after_id (at most limit of
+        them) in lists of at most chunk_size users, read through a single
+        server-side cursor instead of one query per chunk.
+        """
+        statement = (
+            select(User)
+            .options(selectinload(User.skills), selectinload(User.events))
+            .where(User.id > after_id)
+            .order_by(User.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        if limit is not None:
+            statement = statement.limit(limit)
+
+        for users in self.session.scalars(statement).partitions():
+            yield list(users)
+
+
+REPOSITORIES = {"sqlite": SQLiteRepository, "postgresql": PostgresRepository}
+
+
+def create_repository(session, database_url):
+    """Create the repository matching the backend of the database URL."""
+    backend = make_url(database_url).get_backend_name()
+    if backend not in REPOSITORIES:
+        raise ValueError(f"Unsupported database backend '{backend}'")
+
+    return REPOSITORIES[backend](session)
@@ -0,0 +1,289 @@
+import fcntl
+import glob
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Logs are truncated once they grow past this many bytes and every scan in them
+# was written to the database
+MAX_LOG_BYTES = 16 * 1024 * 1024
+
+# Seconds to wait before retrying a batch the database rejected
+RETRY_DELAY = 1.0
+
+
+class ScanQueueFull(Exception):
+    """Raised when appending to a scan queue would exceed its max_depth."""
+
+
+class ScanLog:
+    """
+    Append-only file of scans waiting to be written to the database, one JSON
+    object per line, along with a checkpoint file holding the offset up to which
+    they were written. Only the process holding the lock of a log uses it.
+    """
+
+    def __init__(self, path, sync=True):
+        self.path = path
+        self.checkpoint_path = path + ".checkpoint"
+        self.sync = sync
+        self.file = None
+        # Offset up to which the log is known to be on disk
+        self.synced = 0
+        self.sync_lock = threading.Lock()
+
+    def lock(self):
+        """Open the log and lock it, unless another process holds it."""
+        file = open(self.path, "a+b")
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            return False
+
+        self.file = file
+        return True
+
+    def close(self):
+        # Closing the file releases the lock
+        self.file.close()
+
+    def read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, offset):
+        temporary_path = self.checkpoint_path + ".tmp"
+        with open(temporary_path, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            if self.sync:
+                os.fsync(f.fileno())
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def pending(self):
+        """
+        Return (scan, end offset) for every scan after the checkpoint. A torn
+        last line, left by a crash in the middle of an append, is cut off.
+        """
+        size = os.fstat(self.file.fileno()).st_size
+        offset = self.read_checkpoint()
+        # The log was truncated, but the checkpoint wasn't reset yet
+        if offset > size:
+            offset = 0
+
+        self.file.seek(offset)
+        scans = []
+        for line in self.file.read().split(b"\n")[:-1]:
+            offset += len(line) + 1
+            try:
+                scans.append((json.loads(line), offset))
+            except ValueError:
+                continue
+
+        if offset < size:
+            self.file.truncate(offset)
+        self.synced = offset
+        return scans
+
+    def append(self, scans):
+        """
+        Append scans to the log, returning the offset the log ends at after
+        each. They are only durable once sync_to() covered these offsets.
+        """
+        lines = [
+            json.dumps(scan, separators=(",", ":")).encode() + b"\n" for scan in scans
+        ]
+        end = self.file.seek(0, os.SEEK_END)
+        self.file.write(b"".join(lines))
+        self.file.flush()
+
+        offsets = []
+        for line in lines:
+            end += len(line)
+            offsets.append(end)
+        return offsets
+
+    def sync_to(self, offset):
+        """
+        Make the log durable up to offset. Callers waiting while another one
+        syncs are usually covered by its fsync, and skip their own.
+        """
+        if not self.sync:
+            return
+
+        with self.sync_lock:
+            if offset <= self.synced:
+                return
+            size = os.fstat(self.file.fileno()).st_size
+            os.fsync(self.file.fileno())
+            self.synced = size
+
+    def size(self):
+        return os.fstat(self.file.fileno()).st_size
+
+    def truncate(self):
+        """Empty the log, once every scan in it was written to the database."""
+        with self.sync_lock:
+            self.file.truncate(0)
+            self.synced = 0
+        self.write_checkpoint(0)
+
+
+class ScanQueue:
+    """
+    Write-behind queue of event scans. append() records scans in the log of
+    this process, synced to disk before it returns, and a background thread
+    writes them to the database with apply(scans), in batches of at most
+    batch_size scans each committed in a single transaction. Scans arriving
+    within interval seconds of each other share a batch.
+
+    append() raises ScanQueueFull rather than let more than max_depth scans wait
+    to be written. Every process takes a log of its own in directory (the first
+    one no other process holds), and first writes the scans left in its log or
+    in the logs no process holds, e.g. by processes that crashed. apply must be
+    idempotent, since a crash between a commit and the next checkpoint writes
+    the batch again on restart.
+    """
+
+    def __init__(self, directory, apply, max_depth, batch_size, interval, sync=True):
+        self.directory = directory
+        self.apply = apply
+        self.max_depth = max_depth
+        self.batch_size = batch_size
+        self.interval = interval
+        self.sync = sync
+        # Process the queue was started in
+        self.pid = None
+        self.starting = threading.Lock()
+
+    def start(self):
+        """Take a log and start the writer thread, once per process."""
+        if self.pid == os.getpid():
+            return
+
+        with self.starting:
+            if self.pid == os.getpid():
+                return
+
+            # Threads don't survive a fork, so forked processes start their own
+            self.condition = threading.Condition()
+            self.writing = threading.Lock()
+            self.stopping = False
+
+            os.makedirs(self.directory, exist_ok=True)
+            for slot in itertools.count():
+                self.log = ScanLog(
+                    os.path.join(self.directory, f"scans-{slot}.log"), self.sync
+                )
+                if self.log.lock():
+                    break
+            # Unwritten (scan, end offset) pairs, in the order of the log
+            self.pending = deque(self.log.pending())
+
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+            self.pid = os.getpid()
+
+    def append(self, scans):
+        self.start()
+        with self.condition:
+            if len(self.pending) + len(scans) > self.max_depth:
+                raise ScanQueueFull()
+
+            offsets = self.log.append(scans)
+            self.pending.extend(zip(scans, offsets))
+            self.condition.notify()
+
+        self.log.sync_to(offsets[-1])
+
+    def run(self):
+        self.replay_orphans()
+        while True:
+            with self.condition:
+                while not (self.pending or self.stopping):
+                    self.condition.wait()
+                if self.stopping:
+                    return
+                full = len(self.pending) >= self.batch_size
+
+            if not full:
+                time.sleep(self.interval)
+            if not self.write_batch():
+                time.sleep(RETRY_DELAY)
+
+    def write_batch(self):
+        """
+        Write the next batch of pending scans to the database. Returns whether
+        it was written.
+        """
+        with self.writing:
+            with self.condition:
+                batch = list(itertools.islice(self.pending, self.batch_size))
+            if not batch:
+                return True
+
+            try:
+                self.apply([scan for scan, _ in batch])
+            except Exception:
+                logger.exception("Writing %d queued scans failed", len(batch))
+                return False
+
+            self.log.write_checkpoint(batch[-1][1])
+            with self.condition:
+                for _ in batch:
+                    self.pending.popleft()
+                if not self.pending and self.log.size() > MAX_LOG_BYTES:
+                    self.log.truncate()
+
+        return True
+
+    def drain(self):
+        """Write every pending scan to the database before returning."""
+        if self.pid != os.getpid():
+            return
+
+        while self.pending:
+            if not self.write_batch():
+                raise RuntimeError("Queued scans could not be written")
+
+    def stop(self):
+        """Stop the writer thread, write the scans it left and release the log."""
+        if self.pid != os.getpid():
+            return
+
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.thread.join()
+        self.drain()
+        self.log.close()
+        self.pid = None
+
+    def replay_orphans(self):
+        """Write and empty the logs left by processes that stopped."""
+        for path in sorted(glob.glob(os.path.join(self.directory, "scans-*.log"))):
+            log = ScanLog(path, self.sync)
+            if path == self.log.path or not log.lock():
+                continue
+
+            try:
+                scans = log.pending()
+                for start in range(0, len(scans), self.batch_size):
+                    batch = scans[start : start + self.batch_size]
+                    self.apply([scan for scan, _ in batch])
+                    log.write_checkpoint(batch[-1][1])
+                log.truncate()
+            except Exception:
+                logger.exception("Replaying the queued scans of %s failed", path)
+            finally:
+                log.close()
@@ -1,47 +1,532 @@
+import hashlib
 import json
+import logging
+import time
 
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import (
+    Integer,
+    MetaData,
+    Table,
+    cast,
+    func,
+    inspect,
+    select,
+    text,
+    update,
+)
 
-from api import app, db, User, Skill
+from api import app, db, repository, User, Skill
+from models import CatalogEvent, Event, SeedProfile, SeedSource, SkillName
+from repository import IN_CLAUSE_CHUNK_SIZE, chunked
+from counters import adjust_skill_counts, counters_missing, rebuild_counters
+from changes import record_user_changes, reserve_versions, utc_now
+from signals import data_reloaded
+
+
+logger = logging.getLogger(__name__)
+
+SEED_DATA_PATH = "./mock_data/HTN_2023_BE_Challenge_Data.json"
+
+USER_COLUMNS = ["name", "company", "email", "phone"]
+
+
+def dedupe_profiles(profiles):
+    """
+    Drop every profile whose email was already used by an earlier profile,
+    keeping the first occurrence (mirrors the unique email constraint).
+    """
+    seen_emails = set()
+    unique_profiles = []
+    for profile in profiles:
+        email = str(profile.get("email"))
+        if email in seen_emails:
+            continue
+
+        seen_emails.add(email)
+        unique_profiles.append(profile)
+
+    return unique_profiles
+
+
+def profile_digest(profile):
+    """Fingerprint a single profile so changes to it can be detected."""
+    encoded = json.dumps(profile, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def user_row(profile):
+    return {column: str(profile.get(column)) for column in USER_COLUMNS}
+
+
+def profile_skills(profile):
+    """
+    Map the name of each skill of a profile to its rating. A user has each skill
+    at most once, so a skill listed again keeps its first rating.
+    """
+    skills = {}
+    for skill in profile.get("skills") or []:
+        skills.setdefault(str(skill.get("skill")), int(skill.get("rating")))
+
+    return skills
+
+
+def skill_ids(profiles):
+    """Map the name of every skill of the given profiles to its skill_name id."""
+    return repository.skill_ids(
+        name for profile in profiles for name in profile_skills(profile)
+    )
+
+
+def skill_rows(user_id, profile, skill_ids):
+    return [
+        {"user_id": user_id, "skill_id": skill_ids[name], "rating": rating}
+        for name, rating in profile_skills(profile).items()
+    ]
+
+
+def valid_rating(rating):
+    """
+    Check a skill rating: a non-zero int, or a string holding one (which the
+    API always accepted, and profile_skills converts). Booleans aren't ratings.
+    """
+    if isinstance(rating, str):
+        try:
+            rating = int(rating)
+        except ValueError:
+            return False
+
+    return isinstance(rating, int) and not isinstance(rating, bool) and rating != 0
+
+
+def valid_skills(skills):
+    return isinstance(skills, list) and all(
+        isinstance(skill, dict)
+        and skill.get("skill")
+        and valid_rating(skill.get("rating"))
+        for skill in skills
+    )
+
+
+def validate_new_users(rows):
+    """
+    Validate a batch of users to register, checking email uniqueness against
+    the database with a single round of queries.
+    Returns the result of each row: None when the row is valid, an error
+    otherwise.
+    """
+    errors = []
+    seen_emails = set()
+    existing_emails = repository.find_user_ids(
+        row.get("email")
+        for row in rows
+        if isinstance(row, dict) and isinstance(row.get("email"), str)
+    )
+    for row in rows:
+        if not isinstance(row, dict) or not all(
+            row.get(column) for column in USER_COLUMNS
+        ):
+            errors.append("missing_fields")
+        elif not all(isinstance(row[column], str) for column in USER_COLUMNS):
+            errors.append("invalid_fields")
+        elif row.get("skills") is not None and not valid_skills(row.get("skills")):
+            errors.append("invalid_skill")
+        elif row.get("email") in seen_emails:
+            errors.append("duplicate_email")
+        elif row.get("email") in existing_emails:
+            errors.append("already_exists")
+        else:
+            errors.append(None)
+
+        if isinstance(row, dict) and isinstance(row.get("email"), str):
+            seen_emails.add(row.get("email"))
+
+    return errors
+
+
+def insert_profiles(profiles, profile_skill_ids=None):
+    """
+    Insert the given (already deduped) user profiles and their skills with the
+    bulk insert of the storage backend, without committing.
+    Returns the number of user and skill rows inserted.
+    """
+    if profile_skill_ids is None:
+        profile_skill_ids = skill_ids(profiles)
+    # The rows are inserted with their version rather than stamped afterwards
+    first_version = reserve_versions(len(profiles)) if profiles else None
+    now = utc_now()
+
+    new_user_rows = [
+        {**user_row(profile), "version": first_version + offset, "updated_at": now}
+        for offset, profile in enumerate(profiles)
+    ]
+    # The database picks the ids, and returns them for the skill rows to
+    # reference
+    user_ids = repository.insert_users(new_user_rows)
+
+    new_skill_rows = [
+        {**row, "version": new_user_row["version"]}
+        for profile, new_user_row in zip(profiles, new_user_rows)
+        for row in skill_rows(
+            user_ids[new_user_row["email"]], profile, profile_skill_ids
+        )
+    ]
+    repository.bulk_insert(Skill, new_skill_rows)
+
+    return len(new_user_rows), len(new_skill_rows)
+
+
+def load_profiles(profiles):
+    """
+    Insert the given (already deduped) user profiles and their skills, and
+    count their skills, without committing.
+    Returns the number of user and skill rows inserted.
+    """
+    # Take the locks in the order of POST /users: skill names, skill counts,
+    # then the versions, so concurrent registrations can't deadlock
+    profile_skill_ids = skill_ids(profiles)
+    adjust_skill_counts(
+        [name for profile in profiles for name in profile_skills(profile)], 1
+    )
+
+    return insert_profiles(profiles, profile_skill_ids)
+
+
+def bulk_load_profiles(profiles):
+    """
+    Insert the given user profiles and their skills with the bulk insert of the
+    storage backend in a single transaction. Must be called inside an app context.
+    Returns the number of user and skill rows inserted.
+    """
+    profiles = dedupe_profiles(profiles)
+    try:
+        counts = load_profiles(profiles)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return counts
+
+
+def upsert_profiles(profiles):
+    """
+    Insert the (already deduped) profiles whose email is not registered yet,
+    and overwrite the fields and skills of the users whose email is, without
+    committing. Returns the number of user and skill rows written.
+    """
+    profiles_by_email = {str(profile.get("email")): profile for profile in profiles}
+
+    existing_ids = repository.find_user_ids(profiles_by_email)
+
+    profile_skill_ids = skill_ids(profiles_by_email[email] for email in existing_ids)
+
+    updated_user_rows = []
+    updated_skill_rows = []
+    for email, user_id in existing_ids.items():
+        profile = profiles_by_email[email]
+        updated_user_rows.append({"id": user_id, **user_row(profile)})
+        updated_skill_rows.extend(skill_rows(user_id, profile, profile_skill_ids))
+
+    if updated_user_rows:
+        db.session.execute(update(User), updated_user_rows)
+        for user_ids in chunked(existing_ids.values(), IN_CLAUSE_CHUNK_SIZE):
+            db.session.execute(
+                Skill.__table__.delete().where(Skill.user_id.in_(user_ids))
+            )
+        repository.bulk_insert(Skill, updated_skill_rows)
+        record_user_changes(existing_ids.values())
+
+    user_count, skill_count = insert_profiles(
+        [
+            profile
+            for email, profile in profiles_by_email.items()
+            if email not in existing_ids
+        ]
+    )
+
+    return user_count + len(updated_user_rows), skill_count + len(updated_skill_rows)
+
+
+def record_seed(digest, profile_digests):
+    """
+    Store the fingerprint of the seed file, and of each profile loaded from it,
+    without committing.
+    """
+    db.session.merge(SeedSource(path=SEED_DATA_PATH, digest=digest))
+
+    for emails in chunked(profile_digests, IN_CLAUSE_CHUNK_SIZE):
+        db.session.execute(
+            SeedProfile.__table__.delete().where(SeedProfile.email.in_(emails))
+        )
+    repository.bulk_insert(
+        SeedProfile,
+        [
+            {"email": email, "digest": profile_digest_}
+            for email, profile_digest_ in profile_digests.items()
+        ],
+    )
+
+
+def create_missing_columns():
+    """
+    Add the columns declared on the models that don't exist yet. create_all
+    skips existing tables, so databases created before a column was declared
+    would otherwise never get it. Such columns must be nullable.
+    """
+    with db.engine.begin() as connection:
+        inspector = inspect(connection)
+        preparer = connection.dialect.identifier_preparer
+        for table in db.metadata.sorted_tables:
+            existing_columns = {
+                column["name"] for column in inspector.get_columns(table.name)
+            }
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    connection.execute(
+                        text(
+                            f"ALTER TABLE {preparer.format_table(table)} "
+                            f"ADD COLUMN {preparer.format_column(column)} "
+                            f"{column.type.compile(connection.dialect)}"
+                        )
+                    )
+
+
+def migrate_event_references(connection):
+    """
+    Point the registrations of databases created before the event catalog,
+    which held the event and category names in every row, to their
+    event_catalog entries, then drop the name columns. Events missing from the
+    catalog are added to it as inactive entries. Runs after
+    create_missing_columns added the event_id column.
+    """
+    inspector = inspect(connection)
+    if "event" not in {column["name"] for column in inspector.get_columns("event")}:
+        return
+
+    legacy = Table("event", MetaData(), autoload_with=connection)
+    catalog = CatalogEvent.__table__
+    known = set(connection.execute(select(catalog.c.event, catalog.c.category)))
+    pairs = connection.execute(
+        select(legacy.c.event, legacy.c.category).distinct()
+    ).all()
+    missing = [
+        {"event": event, "category": category, "active": False}
+        for event, category in pairs
+        if (event, category) not in known
+    ]
+    if missing:
+        connection.execute(catalog.insert(), missing)
+
+    connection.execute(
+        update(legacy).values(
+            event_id=select(catalog.c.id)
+            .where(
+                catalog.c.event == legacy.c.event,
+                catalog.c.category == legacy.c.category,
+            )
+            .scalar_subquery()
+        )
+    )
+
+    # The indexes over the name columns go first, since SQLite can't drop
+    # indexed columns
+    preparer = connection.dialect.identifier_preparer
+    table = preparer.format_table(Event.__table__)
+    for index in inspector.get_indexes("event"):
+        if {"event", "category"} & set(index["column_names"]):
+            connection.execute(text(f"DROP INDEX {preparer.quote(index['name'])}"))
+    for column in ["event", "category"]:
+        connection.execute(
+            text(f"ALTER TABLE {table} DROP COLUMN {preparer.quote(column)}")
+        )
+
+    # SQLite can't add constraints to an existing column
+    if connection.dialect.name == "postgresql":
+        connection.execute(
+            text(
+                f"ALTER TABLE {table} ALTER COLUMN event_id SET NOT NULL, "
+                "ADD FOREIGN KEY (event_id) REFERENCES event_catalog (id)"
+            )
+        )
+
+
+def migrate_skill_names(connection):
+    """
+    Rebuild the skill table of databases created before skill names were
+    interned, which held the name of the skill in every row under an id of its
+    own, as (user_id, skill_id, rating) rows referencing skill_name. A skill
+    listed twice for a user keeps its first rating. Returns whether the table
+    was rebuilt.
+    """
+    inspector = inspect(connection)
+    if "skill" not in {column["name"] for column in inspector.get_columns("skill")}:
+        return False
+
+    legacy = Table("skill", MetaData(), autoload_with=connection)
+    names = SkillName.__table__
+    known = set(connection.scalars(select(names.c.name)))
+    missing = [
+        {"name": name}
+        for name in connection.scalars(select(legacy.c.skill).distinct())
+        if name not in known
+    ]
+    if missing:
+        connection.execute(names.insert(), missing)
+
+    # The rows are copied aside, since the new table can't be created while
+    # the legacy one holds its name (and on PostgreSQL, its constraint names)
+    first_ids = (
+        select(func.min(legacy.c.id))
+        .group_by(legacy.c.user_id, legacy.c.skill)
+        .scalar_subquery()
+    )
+    rows = (
+        select(
+            legacy.c.user_id,
+            names.c.id.label("skill_id"),
+            cast(legacy.c.rating, Integer).label("rating"),
+        )
+        .join(names, names.c.name == legacy.c.skill)
+        .where(legacy.c.user_id.is_not(None), legacy.c.id.in_(first_ids))
+    )
+    connection.execute(
+        text(
+            "CREATE TABLE skill_migration AS "
+            f"{rows.compile(connection, compile_kwargs={'literal_binds': True})}"
+        )
+    )
+    legacy.drop(connection)
+    Skill.__table__.create(connection)
+    connection.execute(
+        text(
+            "INSERT INTO skill (user_id, skill_id, rating) "
+            "SELECT user_id, skill_id, rating FROM skill_migration"
+        )
+    )
+    connection.execute(text("DROP TABLE skill_migration"))
+
+    return True
+
+
+def create_missing_indexes():
+    """
+    Create the indexes declared on the models that don't exist yet. create_all
+    only creates indexes along with their table, so databases created before an
+    index was declared would otherwise never get it.
+    """
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+def reset_load(profiles, digest):
+    """Drop every table and load all the profiles from scratch."""
+    db.drop_all()
+    db.create_all()
+
+    counts = insert_profiles(profiles)
+    record_seed(
+        digest,
+        {str(profile.get("email")): profile_digest(profile) for profile in profiles},
+    )
+
+    return counts
+
+
+def incremental_load(profiles, digest):
+    """
+    Only upsert the profiles that changed or are new since the previous load.
+    Existing data, including users registered through the API, is kept.
+    """
+    seeded_digests = dict(db.session.query(SeedProfile.email, SeedProfile.digest))
+
+    changed_profiles = []
+    changed_digests = {}
+    for profile in profiles:
+        email = str(profile.get("email"))
+        profile_digest_ = profile_digest(profile)
+        if seeded_digests.get(email) != profile_digest_:
+            changed_profiles.append(profile)
+            changed_digests[email] = profile_digest_
+
+    counts = upsert_profiles(changed_profiles)
+    record_seed(digest, changed_digests)
+
+    return counts
 
 
 def init_db():
+    """
+    Populate the database with the profiles in the seed data file, according to
+    the SEED_MODE config value:
+
+    - "reset": drop every table and reload the whole file
+    - "incremental": keep the existing data, skip loading entirely when the
+      file matches the fingerprint of the previous load, and otherwise upsert
+      only the changed or new profiles
+    """
+    seed_mode = app.config["SEED_MODE"]
+    if seed_mode not in ("reset", "incremental"):
+        raise ValueError(f"Unknown SEED_MODE '{seed_mode}'")
+
     with app.app_context():
-        # Clear the database tables if they already exist
-        db.drop_all()
+        start = time.perf_counter()
 
-        # Create all database tables
-        db.create_all()
+        with open(SEED_DATA_PATH, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
 
-        # Populate database with JSON fake user profile data
+        if seed_mode == "incremental":
+            db.create_all()
+            create_missing_columns()
+            with db.engine.begin() as connection:
+                migrate_event_references(connection)
+                skills_migrated = migrate_skill_names(connection)
+            create_missing_indexes()
+
+            # Users written before the change sequence existed are given a
+            # version once, so syncing from version 0 returns them
+            unversioned = db.session.scalars(
+                select(User.id).where(User.version.is_(None))
+            ).all()
+            if unversioned:
+                record_user_changes(unversioned)
+                db.session.commit()
 
-        users_json = json.load(open("./mock_data/HTN_2023_BE_Challenge_Data.json"))
+            source = db.session.get(SeedSource, SEED_DATA_PATH)
+            if source and source.digest == digest:
+                # Databases created before the popularity counters existed
+                # still need them to be counted once, and the skills of users
+                # that listed a skill twice were only counted once migrated
+                if skills_migrated or counters_missing():
+                    rebuild_counters()
+                    db.session.commit()
 
-        user_columns = ["name", "company", "email", "phone"]
-        skill_columns = ["skill", "rating"]
-        for user in users_json:
-            # Add the user record to the database
-            user_values = {}
-            for column in user_columns:
-                user_values[column] = str(dict(user).get(column))
+                logger.info("Seed data is unchanged, skipped loading")
+                return
 
-            new_user = User(**user_values)
-            db.session.add(new_user)
+        # Populate database with JSON fake user profile data
+        profiles = dedupe_profiles(json.loads(data))
+        try:
+            if seed_mode == "reset":
+                user_count, skill_count = reset_load(profiles, digest)
+            else:
+                user_count, skill_count = incremental_load(profiles, digest)
+            rebuild_counters()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
 
-            # If a user does not satisfy the unique email constraint, skip
-            try:
-                db.session.commit()
-            except IntegrityError:
-                db.session.rollback()
-                continue
-
-            # Add the user's skill records to the database
-            for skill in dict(user).get("skills"):
-                skill_values = {}
-                for column in skill_columns:
-                    skill_values[column] = str(skill.get(column))
-
-                skill_values["user_id"] = new_user.id
-                new_skill = Skill(**skill_values)
-                db.session.add(new_skill)
-                db.session.commit()
+        elapsed = time.perf_counter() - start
+        rows = user_count + skill_count
+        logger.info(
+            "Seeded %d users and %d skills in %.3fs (%.0f rows/sec)",
+            user_count,
+            skill_count,
+            elapsed,
+            rows / elapsed if elapsed else 0,
+        )
+
+    data_reloaded.send()
@@ -0,0 +1,387 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import select
+
+from api import db
+from changes import current_version, users_changed_since
+from models import CatalogEvent, Event, Skill, SkillName, User
+from repository import IN_CLAUSE_CHUNK_SIZE, chunked
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Core columns, so loading the whole index skips the ORM row processing
+USER_COLUMNS = [
+    User.__table__.c[column] for column in ("id", "name", "company", "email")
+]
+SKILL_COLUMNS = [
+    Skill.__table__.c.user_id,
+    SkillName.__table__.c.name,
+    Skill.__table__.c.rating,
+]
+EVENT_COLUMNS = [
+    Event.__table__.c.user_id,
+    CatalogEvent.__table__.c.event,
+    CatalogEvent.__table__.c.category,
+]
+
+
+def select_skill_rows():
+    """Select (user_id, skill, rating) rows, naming skills from skill_name."""
+    return select(*SKILL_COLUMNS).join_from(Skill.__table__, SkillName.__table__)
+
+
+def select_event_rows():
+    """Select (user_id, event, category) rows, naming events from the catalog."""
+    return select(*EVENT_COLUMNS).join_from(Event.__table__, CatalogEvent.__table__)
+
+
+def tokenize(text):
+    """Split a name or company into lowercase word tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def deletions(token):
+    """
+    Return token along with every variant of it missing one character. Two
+    tokens within one insertion, deletion or substitution of each other always
+    share one of these variants.
+    """
+    return {token} | {token[:i] + token[i + 1 :] for i in range(len(token))}
+
+
+class ProfileIndex:
+    """
+    Base of the in-memory indexes over the user profiles. Writes only mark the
+    affected emails as stale, and the next read reloads just those users before
+    answering, so an index is built from scratch only on the first read, after
+    a bulk reload, and once it is older than max_age seconds (if set).
+
+    An index also records the version of the change sequence it was built at,
+    and every read reloads the users written or deleted since by any process
+    (e.g. another gunicorn worker), so it never answers from profiles older
+    than the last write committed before the read.
+
+    Subclasses implement clear(), build(), reload(emails) and email_of(user_id),
+    and call refresh() while holding the lock before reading. A build() that
+    loads older data than the database (e.g. a snapshot) sets version to the
+    version of that data.
+    """
+
+    # Number of stale users beyond which the index is rebuilt from scratch
+    MAX_STALE_EMAILS = 50 * IN_CLAUSE_CHUNK_SIZE
+
+    def __init__(self, max_age=None):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.built = False
+        self.built_at = None
+        self.version = 0
+        self.stale_emails = set()
+        self.clear()
+
+    def invalidate(self):
+        """Rebuild the whole index on the next read."""
+        with self.lock:
+            self.built = False
+
+    def mark_stale(self, emails):
+        """Reload the users with these emails (if any) on the next read."""
+        with self.lock:
+            # An index that isn't built yet will load them anyway, and once
+            # this many users are stale, rebuilding is cheaper than reloading
+            # them (and bounds the memory held by a long burst of writes)
+            if not self.built:
+                return
+
+            self.stale_emails.update(emails)
+            if len(self.stale_emails) > self.MAX_STALE_EMAILS:
+                self.built = False
+                self.stale_emails.clear()
+
+    def refresh(self):
+        """Apply the pending invalidations, reading from the database."""
+        # Read first, so the writes committed meanwhile are reloaded next time
+        version = current_version()
+        if not self.built or (
+            self.max_age is not None and time.monotonic() - self.built_at > self.max_age
+        ):
+            self.clear()
+            self.stale_emails.clear()
+            self.built_at = time.monotonic()
+            self.version = version
+            self.build()
+            self.built = True
+
+        if version > self.version:
+            emails, deletions = users_changed_since(self.version)
+            self.stale_emails.update(emails)
+            for user_id, email in deletions:
+                # A user renamed then deleted is still indexed under its old email
+                self.stale_emails.add(email)
+                self.stale_emails.add(self.email_of(user_id))
+            self.stale_emails.discard(None)
+            self.version = version
+
+        for emails in chunked(self.stale_emails, IN_CLAUSE_CHUNK_SIZE):
+            self.reload(emails)
+
+        self.stale_emails.clear()
+
+
+class SearchIndex(ProfileIndex):
+    """
+    In-memory inverted index over the user profiles, answering prefix/fuzzy
+    text queries on name and company, skill and event filters, and facet counts
+    without touching the database.
+    """
+
+    # Tokens shorter than this are only ever matched by prefix
+    MIN_FUZZY_LENGTH = 4
+
+    def clear(self):
+        # user_id: (email, company, tokens, {skill_key: rating}, [(event, category)])
+        self.users = {}
+        self.ids_by_email = {}
+        # token: set of user ids whose name or company contains it
+        self.postings = {}
+        # Every token in postings, sorted for prefix lookups
+        self.vocabulary = []
+        # deletion variant: set of tokens it was derived from, for fuzzy lookups
+        self.variants = {}
+        # lowercased skill: {user_id: rating}, and the original skill name
+        self.skills = {}
+        self.skill_names = {}
+        # (event, category): set of user ids, and category: set of user ids
+        self.events = {}
+        self.categories = {}
+        # company: number of users, for the facets of unfiltered searches
+        self.company_counts = Counter()
+
+    def add(self, user_id, name, company, email, skills, events):
+        tokens = set(tokenize(f"{name} {company}"))
+        skill_ratings = {}
+        for skill, rating in skills:
+            skill_ratings[skill.lower()] = rating
+            self.skill_names.setdefault(skill.lower(), skill)
+
+        self.users[user_id] = (email, company, tokens, skill_ratings, events)
+        self.ids_by_email[email] = user_id
+        self.company_counts[company] += 1
+
+        for token in tokens:
+            if token not in self.postings:
+                self.postings[token] = set()
+                bisect.insort(self.vocabulary, token)
+                for variant in deletions(token):
+                    self.variants.setdefault(variant, set()).add(token)
+            self.postings[token].add(user_id)
+
+        for skill, rating in skill_ratings.items():
+            self.skills.setdefault(skill, {})[user_id] = rating
+
+        for event, category in events:
+            self.events.setdefault((event, category), set()).add(user_id)
+            self.categories.setdefault(category, set()).add(user_id)
+
+    def remove(self, user_id):
+        email, company, tokens, skill_ratings, events = self.users.pop(user_id)
+        del self.ids_by_email[email]
+        self.company_counts[company] -= 1
+        if not self.company_counts[company]:
+            del self.company_counts[company]
+
+        for token in tokens:
+            self.postings[token].discard(user_id)
+            if not self.postings[token]:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+                for variant in deletions(token):
+                    self.variants[variant].discard(token)
+                    if not self.variants[variant]:
+                        del self.variants[variant]
+
+        for skill in skill_ratings:
+            del self.skills[skill][user_id]
+            if not self.skills[skill]:
+                del self.skills[skill]
+                del self.skill_names[skill]
+
+        for event, category in events:
+            self.events[(event, category)].discard(user_id)
+            if not self.events[(event, category)]:
+                del self.events[(event, category)]
+
+        # A user may attend several events of the same category
+        for category in {category for _, category in events}:
+            self.categories[category].discard(user_id)
+            if not self.categories[category]:
+                del self.categories[category]
+
+    def load(self, user_rows, skill_rows, event_rows):
+        """Add (id, name, company, email) users with their skill and event rows."""
+        skills = {}
+        for user_id, skill, rating in skill_rows:
+            skills.setdefault(user_id, []).append((skill, rating))
+        events = {}
+        for user_id, event, category in event_rows:
+            events.setdefault(user_id, []).append((event, category))
+
+        for user_id, name, company, email in user_rows:
+            self.add(
+                user_id,
+                name,
+                company,
+                email,
+                skills.get(user_id, []),
+                events.get(user_id, []),
+            )
+
+    def build(self):
+        connection = db.session.connection()
+        self.load(
+            connection.execute(select(*USER_COLUMNS)).all(),
+            connection.execute(select_skill_rows()).all(),
+            connection.execute(select_event_rows()).all(),
+        )
+
+    def reload(self, emails):
+        # Drop the indexed users, and load the current version of whichever of
+        # them still exist (possibly under a new email)
+        for email in emails:
+            if email in self.ids_by_email:
+                self.remove(self.ids_by_email[email])
+
+        users = db.session.execute(
+            select(*USER_COLUMNS).where(User.email.in_(emails))
+        ).all()
+        for user_id, *_ in users:
+            if user_id in self.users:
+                self.remove(user_id)
+
+        user_ids = [user_id for user_id, *_ in users]
+        self.load(
+            users,
+            db.session.execute(select_skill_rows().where(Skill.user_id.in_(user_ids))),
+            db.session.execute(select_event_rows().where(Event.user_id.in_(user_ids))),
+        )
+
+    def email_of(self, user_id):
+        if user_id in self.users:
+            return self.users[user_id][0]
+        return None
+
+    def match_token(self, token):
+        """
+        Return the ids of the users with a name or company token starting with
+        token, or failing that, within one typo of it.
+        """
+        matches = set()
+        # Every token starting with token sorts between these two bounds
+        start = bisect.bisect_left(self.vocabulary, token)
+        end = bisect.bisect_left(self.vocabulary, token + "\U0010ffff")
+        for candidate in self.vocabulary[start:end]:
+            matches |= self.postings[candidate]
+
+        if not matches and len(token) >= self.MIN_FUZZY_LENGTH:
+            for variant in deletions(token):
+                for candidate in self.variants.get(variant, ()):
+                    matches |= self.postings[candidate]
+
+        return matches
+
+    def search(self, q=None, skill=None, min_rating=None, event=None, category=None):
+        """
+        Return the sorted ids of the users matching every given criterion, and
+        the facet counts over all of them.
+        """
+        with self.lock:
+            self.refresh()
+
+            # Intersect the smallest candidate sets first
+            candidates = []
+            for token in tokenize(q or ""):
+                candidates.append(self.match_token(token))
+            if skill is not None:
+                ratings = self.skills.get(skill.lower(), {})
+                candidates.append(
+                    {
+                        user_id
+                        for user_id, rating in ratings.items()
+                        if min_rating is None or rating >= min_rating
+                    }
+                )
+            if event is not None:
+                candidates.append(
+                    set().union(
+                        *(
+                            user_ids
+                            for (event_, category_), user_ids in self.events.items()
+                            if event_ == event
+                            and (category is None or category_ == category)
+                        )
+                    )
+                )
+            elif category is not None:
+                candidates.append(self.categories.get(category, set()))
+
+            if not candidates:
+                return sorted(self.users), self.facets(None)
+
+            candidates.sort(key=len)
+            matches = candidates[0].intersection(*candidates[1:])
+
+            return sorted(matches), self.facets(matches)
+
+    def facets(self, matches, limit=10):
+        """
+        Count the most common skills, companies, events and categories among
+        the matching user ids (None matches every user).
+        """
+
+        def count(user_ids):
+            if matches is None:
+                return len(user_ids)
+            return len(matches.intersection(user_ids))
+
+        def top(counts, key):
+            ranked = heapq.nsmallest(
+                limit,
+                ((value, count) for value, count in counts if count),
+                key=lambda item: (-item[1], item[0]),
+            )
+            return [{**key(value), "count": count} for value, count in ranked]
+
+        if matches is None:
+            company_counts = self.company_counts
+        else:
+            company_counts = Counter(self.users[user_id][1] for user_id in matches)
+
+        return {
+            "skills": top(
+                (
+                    (self.skill_names[skill], count(ratings))
+                    for skill, ratings in self.skills.items()
+                ),
+                lambda skill: {"skill": skill},
+            ),
+            "companies": top(
+                company_counts.items(), lambda company: {"company": company}
+            ),
+            "events": top(
+                ((event, count(user_ids)) for event, user_ids in self.events.items()),
+                lambda event: {"event": event[0], "category": event[1]},
+            ),
+            "categories": top(
+                (
+                    (category, count(user_ids))
+                    for category, user_ids in self.categories.items()
+                ),
+                lambda category: {"category": category},
+            ),
+        }
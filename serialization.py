@@ -0,0 +1,64 @@
+import json
+
+from flask import make_response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(value):
+    """
+    Encode value as compact UTF-8 JSON bytes, with orjson when it is installed
+    (several times faster than the json module on nested dicts and lists), and
+    with the json module producing the same bytes otherwise.
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def output_json(data, code, headers=None):
+    """Flask-RESTful representation of data as JSON, encoded by dumps."""
+    response = make_response(dumps(data), code)
+    response.headers.extend(headers or {})
+    return response
+
+
+class UserFragments:
+    """
+    Caches the encoded JSON of each user under its email, so responses listing
+    users are assembled by joining the fragments of their users instead of
+    encoding every user again. The write handlers drop the fragments of the
+    users they change, and a fragment is only reused for the version of the
+    user it was encoded from, since other processes write users too. With no
+    backend, users, and users without a version, are encoded every time.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def encode(self, user, serialize):
+        """Return the JSON of user as serialized by serialize(user)."""
+        version = getattr(user, "version", None)
+        if self.backend is None or version is None:
+            return dumps(serialize(user))
+
+        prefix = f"{version}\n".encode("utf-8")
+        entry = self.backend.get(user.email)
+        if entry is not None and entry.startswith(prefix):
+            return entry[len(prefix) :]
+
+        fragment = dumps(serialize(user))
+        self.backend.set(user.email, prefix + fragment)
+        return fragment
+
+    def invalidate(self, emails):
+        if self.backend is not None:
+            self.backend.delete(emails)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
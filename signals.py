@@ -0,0 +1,37 @@
+class Signal:
+    """
+    A minimal synchronous signal. The write handlers send one after committing,
+    and every connected receiver is called with the same keyword arguments.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.receivers = []
+
+    def connect(self, receiver):
+        self.receivers.append(receiver)
+        return receiver
+
+    def send(self, **kwargs):
+        for receiver in self.receivers:
+            receiver(**kwargs)
+
+    def __repr__(self):
+        return f"Signal('{self.name}')"
+
+
+# Users were registered or updated. Sent with the emails the users had before
+# and after the write
+users_changed = Signal("users_changed")
+
+# Users were deleted. Sent with their emails
+users_deleted = Signal("users_deleted")
+
+# Users were scanned into events. Sent with (email, event, category) tuples
+events_scanned = Signal("events_scanned")
+
+# Data was (re)loaded in bulk outside the write handlers, e.g. by seeding
+data_reloaded = Signal("data_reloaded")
+
+# The event catalog was (re)loaded, e.g. after its file changed
+event_catalog_changed = Signal("event_catalog_changed")
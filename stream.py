@@ -0,0 +1,133 @@
+import asyncio
+import logging
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Most scans listed in a single message. The scans of a larger burst are only
+# counted, and reflected in the event counts
+MAX_MESSAGE_SCANS = 500
+
+
+def format_event(name, data):
+    """Encode data as a server-sent event named name."""
+    return b"event: " + name.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+def scans_message(scans, scan_count, counts):
+    """
+    Encode the scans event listing the (email, event, category) scans, the
+    number of scans they are the first of, and the new counts of the events
+    scanned into.
+    """
+    return format_event(
+        "scans",
+        {
+            "scans": [
+                {"email": email, "event": event, "category": category}
+                for email, event, category in scans
+            ],
+            "scan_count": scan_count,
+            "counts": counts,
+        },
+    )
+
+
+class EventStream:
+    """
+    Fan-out of the scans to the clients of GET /stream/events on the ASGI app.
+
+    Scans are written by every process serving the API, so they are read back
+    from the database: while there are subscribers, a single task on the event
+    loop polls read_scans(since) every interval seconds for the scans written
+    since the last version it saw, reads the counts of the events scanned
+    into once for the whole batch through read_counts(keys), and puts the same
+    encoded message in the queue of every subscriber, so a burst of scans
+    costs the same few queries and one message whatever the number of
+    subscribers. A subscriber whose queue is full (a client that stopped
+    reading) is dropped instead of holding up the others.
+
+    read_scans(since) returns a (version, scans, scan_count, keys) batch, like
+    asgi.read_scans, and only the version when since is None.
+    """
+
+    def __init__(self, read_scans, read_counts, interval=0.25, queue_size=64):
+        self.read_scans = read_scans
+        self.read_counts = read_counts
+        self.interval = interval
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.since = None
+        self.task = None
+
+    async def start(self):
+        """Start publishing, on the running event loop."""
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stop publishing, and end the stream of every subscriber."""
+        subscribers, self.subscribers = self.subscribers, set()
+
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        for queue in subscribers:
+            self.close(queue)
+
+    async def subscribe(self):
+        """
+        Return a queue receiving every message from now on, and None once the
+        subscriber was dropped. Call on the event loop of the stream.
+        """
+        if not self.subscribers:
+            # Nothing was polled without subscribers, so start from now
+            self.since, *_ = await self.read_scans(None)
+
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def close(self, queue):
+        # Make room for the None ending the stream
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.subscribers:
+                continue
+
+            try:
+                since, scans, scan_count, keys = await self.read_scans(self.since)
+            except Exception:
+                logger.exception(
+                    "Reading the scans since version %s failed", self.since
+                )
+                continue
+            self.since = since
+
+            if not scan_count:
+                continue
+            try:
+                counts = await self.read_counts(keys)
+            except Exception:
+                # Still tell the subscribers about the scans
+                logger.exception("Reading the counts of %d events failed", len(keys))
+                counts = []
+            self.broadcast(scans_message(scans, scan_count, counts))
+
+    def broadcast(self, message):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.unsubscribe(queue)
+                self.close(queue)
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+# Every test session starts from a freshly seeded database
+os.environ.setdefault("SEED_MODE", "reset")
+
+# Run the suite against another database, e.g. a local PostgreSQL server with
+# TEST_DATABASE_URL=postgresql://postgres@localhost/htn_test
+if "TEST_DATABASE_URL" in os.environ:
+    os.environ["DATABASE_URL"] = os.environ["TEST_DATABASE_URL"]
+
+
+@pytest.fixture
+def catalog_file(tmp_path, monkeypatch):
+    """Point the event catalog at a copy of its file, for the test to edit."""
+    import api
+
+    path = tmp_path / "events_data.json"
+    with open(api.event_catalog.path) as f:
+        path.write_text(f.read())
+    monkeypatch.setattr(api.event_catalog, "path", str(path))
+    yield path
+
+    monkeypatch.undo()
+    with api.app.app_context():
+        api.event_catalog.load()
@@ -26,3 +26,11 @@ EXISTING_USER_EMAIL_3 = "mitchellalyssa@example.org"
 NON_EXISTING_USER_EMAIL = "doesnotexist@gmail.com"
 
 INVALID_EVENT = {"event": "Not a real event", "category": "Workshop"}
+
+
+def sorted_skills(user):
+    """
+    Return a copy of user with its skills sorted by name, since users list their
+    skills in skill id order rather than in the order they were given.
+    """
+    return {**user, "skills": sorted(user["skills"], key=lambda skill: skill["skill"])}
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import httpx
+import pytest
+from starlette.testclient import TestClient
+
+from api import app as flask_app
+from asgi import app, event_stream
+from stream import EventStream
+from .constants import NEW_USER_DATA, NON_EXISTING_USER_EMAIL, sorted_skills
+
+EVENTS = json.load(open("./mock_data/events_data.json"))
+
+ASGI_USER_EMAIL = "asgi@example.com"
+ASGI_USER_DATA = {**NEW_USER_DATA, "email": ASGI_USER_EMAIL}
+
+STREAM_USER_EMAILS = ["stream1@example.com", "stream2@example.com"]
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def test_asgi_matches_flask(client):
+    # The read endpoints return the same data in both serving modes
+    for url in ["/users?limit=20", "/skills?min_frequency=20", "/events"]:
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.json() == json.loads(flask_app.test_client().get(url).data)
+
+    response = client.get("/skills?min_frequency=many")
+    assert response.status_code == 400
+    assert response.json() == "Invalid request arguments"
+
+
+def test_asgi_user_lifecycle(client):
+    # POST /users
+    response = client.post("/users", json=ASGI_USER_DATA)
+    assert response.status_code == 200
+    assert response.json() == f"User '{ASGI_USER_EMAIL}' was successfully registered"
+
+    response = client.post("/users", json=ASGI_USER_DATA)
+    assert response.status_code == 400
+    assert response.json() == f"User '{ASGI_USER_EMAIL}' already exists"
+
+    # GET /users/:email
+    response = client.get(f"/users/{ASGI_USER_EMAIL}")
+    res = response.json()
+    assert response.status_code == 200
+    res.pop("id")
+    res.pop("events")
+    assert sorted_skills(res) == sorted_skills(ASGI_USER_DATA)
+
+    # PUT /users/:email
+    new_skills = [{"skill": "Trio", "rating": 2}]
+    response = client.put(f"/users/{ASGI_USER_EMAIL}", json={"skills": new_skills})
+    assert response.status_code == 200
+    response = client.get(f"/users/{ASGI_USER_EMAIL}")
+    assert response.json().get("skills") == new_skills
+
+    # The Flask app sees the writes made through the ASGI app
+    response = flask_app.test_client().get(f"/users/{ASGI_USER_EMAIL}")
+    assert json.loads(response.data).get("skills") == new_skills
+
+    # POST /users/events/:email
+    response = client.post(f"/users/events/{ASGI_USER_EMAIL}", json=EVENTS[5])
+    assert response.status_code == 200
+    response = client.post(f"/users/events/{ASGI_USER_EMAIL}", json=EVENTS[5])
+    assert response.status_code == 400
+    assert response.json() == f"User '{ASGI_USER_EMAIL}' is already registered to event"
+    response = client.post(
+        f"/users/events/{ASGI_USER_EMAIL}", json={**EVENTS[5], "event": {"x": 1}}
+    )
+    assert response.status_code == 400
+    assert response.json() == "Invalid event data in body"
+
+    # GET /users/events/:email
+    response = client.get(f"/users/events/{ASGI_USER_EMAIL}")
+    assert response.json() == [EVENTS[5]]
+
+    # DELETE /users/:email
+    response = client.delete(f"/users/{ASGI_USER_EMAIL}")
+    assert response.status_code == 200
+    assert response.json() == f"User '{ASGI_USER_EMAIL}' was successfully deleted"
+
+    response = client.get(f"/users/{ASGI_USER_EMAIL}")
+    assert response.status_code == 400
+    assert response.json() == f"User '{ASGI_USER_EMAIL}' does not exist"
+
+    response = client.delete(f"/users/{NON_EXISTING_USER_EMAIL}")
+    assert response.status_code == 400
+
+    # The popularity counters were kept consistent
+    result = flask_app.test_cli_runner().invoke(args=["check-counters"])
+    assert result.exit_code == 0
+
+
+def test_asgi_concurrent_duplicate_scans():
+    client = flask_app.test_client()
+    response = client.post("/users", json=ASGI_USER_DATA)
+    assert response.status_code == 200
+
+    async def scan_concurrently():
+        # httpx doesn't run the startup and shutdown handlers of the app
+        await app.router.startup()
+        try:
+            async with httpx.AsyncClient(
+                app=app, base_url="http://testserver"
+            ) as client:
+                responses = await asyncio.gather(
+                    *(
+                        client.post(f"/users/events/{ASGI_USER_EMAIL}", json=EVENTS[5])
+                        for _ in range(6)
+                    )
+                )
+        finally:
+            await app.router.shutdown()
+        return [response.status_code for response in responses]
+
+    # POST /users/events/:email
+    # Concurrent duplicate scans register the user once, and are rejected
+    # rather than failing on the unique index
+    statuses = asyncio.run(scan_concurrently())
+    assert sorted(statuses) == [200, 400, 400, 400, 400, 400]
+    response = client.get(f"/users/events/{ASGI_USER_EMAIL}")
+    assert json.loads(response.data) == [EVENTS[5]]
+
+    assert client.delete(f"/users/{ASGI_USER_EMAIL}").status_code == 200
+    result = flask_app.test_cli_runner().invoke(args=["check-counters"])
+    assert result.exit_code == 0
+
+
+def parse_events(body):
+    """Return the (name, data) server-sent events of body, skipping comments."""
+    events = []
+    for block in body.decode().split("\n\n"):
+        fields = dict(
+            line.split(": ", 1) for line in block.splitlines() if ": " in line
+        )
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+async def open_stream():
+    """
+    Call GET /stream/events on the ASGI app, returning the task serving it, a
+    queue of the chunks it sends and the event disconnecting the client.
+    """
+    chunks = asyncio.Queue()
+    disconnected = asyncio.Event()
+
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        await chunks.put(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/stream/events",
+        "raw_path": b"/stream/events",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [],
+        "client": ("127.0.0.1", 12345),
+        "server": ("testserver", 80),
+    }
+    return asyncio.create_task(app(scope, receive, send)), chunks, disconnected
+
+
+def test_event_stream():
+    client = flask_app.test_client()
+    for email in STREAM_USER_EMAILS:
+        response = client.post("/users", json={**ASGI_USER_DATA, "email": email})
+        assert response.status_code == 200
+
+    async def run():
+        # Starts the event stream, and stops it and disposes of the engine
+        # (whose connections belong to this event loop) on shutdown
+        await app.router.startup()
+        interval, event_stream.interval = event_stream.interval, 0.05
+        try:
+            task, chunks, disconnected = await open_stream()
+            start = await chunks.get()
+            assert start["status"] == 200
+            assert (b"content-type", b"text/event-stream; charset=utf-8") in start[
+                "headers"
+            ]
+
+            # GET /stream/events
+            # The stream starts with the count of every event
+            body = (await chunks.get())["body"]
+            assert body.startswith(b"retry: ")
+            [(name, data)] = parse_events(body)
+            assert name == "counts"
+            assert data["counts"] == json.loads(client.get("/events").data)
+
+            # A burst of scans is sent as a single message, with the new counts
+            # of the events scanned into
+            for email in STREAM_USER_EMAILS:
+                response = client.post(f"/users/events/{email}", json=EVENTS[3])
+                assert response.status_code == 200
+            [(name, data)] = parse_events(
+                (await asyncio.wait_for(chunks.get(), 5))["body"]
+            )
+            assert name == "scans"
+            assert data["scans"] == [
+                {"email": email, **EVENTS[3]} for email in STREAM_USER_EMAILS
+            ]
+            assert data["scan_count"] == 2
+            assert data["counts"] == [
+                count
+                for count in json.loads(client.get("/events").data)
+                if {"event": count["event"], "category": count["category"]} == EVENTS[3]
+            ]
+
+            # Disconnecting unsubscribes the client
+            disconnected.set()
+            await asyncio.wait_for(task, 5)
+            assert not event_stream.subscribers
+        finally:
+            event_stream.interval = interval
+            await app.router.shutdown()
+
+    asyncio.run(run())
+
+    for email in STREAM_USER_EMAILS:
+        assert client.delete(f"/users/{email}").status_code == 200
+
+
+def test_event_stream_drops_slow_subscribers():
+    # Scans written to the database, by version
+    written = []
+    read_keys = []
+
+    async def read_scans(since):
+        if since is None:
+            return len(written), [], 0, set()
+        scans = written[since:]
+        return len(written), scans, len(scans), {scan[1:] for scan in scans}
+
+    async def read_counts(keys):
+        read_keys.append(keys)
+        return []
+
+    async def run():
+        stream = EventStream(read_scans, read_counts, interval=0.01, queue_size=1)
+        await stream.start()
+        try:
+            # Scans written before subscribing are not sent
+            written.append(("a@example.com", "Event", "Workshop"))
+            queue = await stream.subscribe()
+            await asyncio.sleep(0.1)
+            assert queue.empty()
+
+            # Scans written between two polls are sent together
+            written.append(("b@example.com", "Event", "Workshop"))
+            written.append(("c@example.com", "Event", "Workshop"))
+            await asyncio.sleep(0.1)
+            assert queue.qsize() == 1
+            assert read_keys == [{("Event", "Workshop")}]
+
+            # A subscriber not reading its messages is dropped once its queue
+            # is full, and its stream ends
+            written.append(("d@example.com", "Event", "Workshop"))
+            await asyncio.sleep(0.1)
+            assert await queue.get() is None
+            assert not stream.subscribers
+
+            # Nothing is polled without subscribers
+            written.append(("e@example.com", "Event", "Workshop"))
+            await asyncio.sleep(0.1)
+            assert len(read_keys) == 2
+        finally:
+            await stream.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,132 @@
+import json
+import time
+import pytest
+
+from api import app, db, response_cache
+from cache import LRUBackend, RedisBackend
+from models import SkillCount
+from .constants import EXISTING_USER_EMAIL_2
+
+
+class FakeRedis:
+    # Local stand-in for a Redis client, implementing the commands used by
+    # RedisBackend
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def scan_iter(self, pattern):
+        return [key for key in list(self.data) if key.startswith(pattern[:-1])]
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request, monkeypatch):
+    if request.param == "memory":
+        backend = LRUBackend()
+    else:
+        backend = RedisBackend(FakeRedis())
+    monkeypatch.setattr(response_cache, "backend", backend)
+    yield backend
+
+    # Writes made during the test only invalidated the test backend
+    monkeypatch.undo()
+    response_cache.invalidate_all()
+
+
+def test_etag(backend):
+    # GET /skills
+    # Responses carry an ETag
+    response = app.test_client().get("/skills")
+    assert response.status_code == 200
+    etag = response.headers.get("ETag")
+    assert etag
+
+    # GET /skills
+    # Unchanged responses are not sent again
+    response = app.test_client().get("/skills", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    # GET /skills
+    # Changed responses are sent in full
+    app.test_client().put(
+        f"/users/{EXISTING_USER_EMAIL_2}",
+        json={
+            "skills": [{"skill": f"Caching with {type(backend).__name__}", "rating": 3}]
+        },
+    )
+    response = app.test_client().get("/skills", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers.get("ETag") != etag
+
+
+def test_cached_until_invalidated(backend):
+    response = app.test_client().get("/skills?limit=1")
+    first = json.loads(response.data.decode("utf-8"))
+
+    # Bump a counter behind the write handlers' back: the cached response is
+    # still served
+    with app.app_context():
+        skill_count = db.session.get(SkillCount, first[0]["skill"])
+        skill_count.count += 1000
+        db.session.commit()
+
+    response = app.test_client().get("/skills?limit=1")
+    assert json.loads(response.data.decode("utf-8")) == first
+
+    response_cache.invalidate("skills")
+    response = app.test_client().get("/skills?limit=1")
+    res = json.loads(response.data.decode("utf-8"))
+    assert res[0]["count"] == first[0]["count"] + 1000
+
+    with app.app_context():
+        skill_count = db.session.get(SkillCount, first[0]["skill"])
+        skill_count.count -= 1000
+        db.session.commit()
+    response_cache.invalidate("skills")
+
+
+def test_streamed_response_cached(backend):
+    response = app.test_client().get("/users?limit=3")
+    assert response.headers.get("ETag") is None
+    first = json.loads(response.data.decode("utf-8"))
+
+    # The streamed response was cached once complete
+    response = app.test_client().get("/users?limit=3")
+    assert response.headers.get("ETag")
+    assert json.loads(response.data.decode("utf-8")) == first
+
+
+def test_lru_backend_eviction():
+    backend = LRUBackend(max_entries=2, max_bytes=10, ttl=300)
+    backend.set("a", b"1")
+    backend.set("b", b"2")
+    backend.get("a")
+    backend.set("c", b"3")
+    # The least recently used entry is evicted
+    assert backend.get("b") is None
+    assert backend.get("a") == b"1"
+    assert backend.get("c") == b"3"
+
+    # Entries are evicted to stay under max_bytes
+    backend.set("d", b"123456789")
+    assert backend.get("a") is None
+    assert backend.get("d") == b"123456789"
+
+    backend = LRUBackend(ttl=0)
+    backend.set("a", b"1")
+    time.sleep(0.01)
+    # Expired entries are evicted
+    assert backend.get("a") is None
@@ -0,0 +1,167 @@
+import json
+import pytest
+from sqlalchemy import create_engine, select, text
+
+from api import app, db, event_catalog
+from catalog import read_catalog_file
+from models import CatalogEvent, User
+from scripts import migrate_event_references
+
+EVENTS = json.load(open("./mock_data/events_data.json"))
+
+
+def test_event_catalog_lookups():
+    with app.app_context():
+        entry = event_catalog.lookup(EVENTS[0]["event"], EVENTS[0]["category"])
+        assert (entry.event, entry.category, entry.active) == (
+            EVENTS[0]["event"],
+            EVENTS[0]["category"],
+            True,
+        )
+        assert event_catalog.get(entry.id) is entry
+        assert event_catalog.find(EVENTS[0]["event"]) == [entry]
+
+        # Extra keys sent along with an event don't matter anymore
+        assert event_catalog.lookup(EVENTS[0]["event"], "Food") is None
+        assert len(event_catalog.entries()) == len(EVENTS)
+
+
+def test_event_catalog_hot_reload(catalog_file, monkeypatch):
+    monkeypatch.setattr(event_catalog, "check_interval", 0)
+    client = app.test_client()
+    response = client.get("/users?after_id=600&limit=2")
+    emails = [user["email"] for user in json.loads(response.data.decode("utf-8"))]
+    client.post(f"/users/events/{emails[0]}", json=EVENTS[0])
+
+    # Edit the catalog file: drop the first event and add a new one
+    new_event = {"event": "Hardware lab", "category": "Workshop"}
+    catalog_file.write_text(
+        json.dumps([*EVENTS[1:], {**new_event, "room": "E7 2nd floor"}])
+    )
+
+    # POST /users/events/:email
+    # The new event can be scanned into without a restart...
+    response = client.post(f"/users/events/{emails[1]}", json={**new_event, "extra": 1})
+    assert response.status_code == 200
+    with app.app_context():
+        entry = event_catalog.lookup(**new_event)
+        row = db.session.get(CatalogEvent, entry.id)
+        assert row.details == {"room": "E7 2nd floor"}
+
+    # ...while the removed one can't anymore, though the users registered to it
+    # stay registered
+    response = client.post(f"/users/events/{emails[1]}", json=EVENTS[0])
+    assert response.status_code == 400
+    response = client.get(f"/users/events/{emails[0]}")
+    assert EVENTS[0] in json.loads(response.data.decode("utf-8"))
+
+
+def test_event_catalog_invalid_file(catalog_file, monkeypatch):
+    monkeypatch.setattr(event_catalog, "check_interval", 0)
+    client = app.test_client()
+    response = client.get("/users?after_id=650&limit=3")
+    emails = [user["email"] for user in json.loads(response.data.decode("utf-8"))]
+
+    # A half-written file, a file that isn't a list of events and a missing
+    # file all leave the last catalog loaded in place
+    for contents in ['[{"event": "Lunch", "cat', '{"event": "Lunch"}', None]:
+        if contents is None:
+            catalog_file.unlink()
+        else:
+            catalog_file.write_text(contents)
+
+        with app.app_context():
+            entry = event_catalog.lookup(EVENTS[0]["event"], EVENTS[0]["category"])
+            assert entry is not None
+            assert len(event_catalog.entries()) == len(EVENTS)
+
+    # POST /users/events/:email
+    response = client.post(f"/users/events/{emails[0]}", json=EVENTS[1])
+    assert response.status_code == 200
+
+    # Once the file is fixed, it is reloaded
+    catalog_file.write_text(json.dumps(EVENTS[1:]))
+    response = client.post(f"/users/events/{emails[1]}", json=EVENTS[0])
+    assert response.status_code == 400
+
+
+def test_read_catalog_file_capacities(tmp_path):
+    path = tmp_path / "events_data.json"
+    event = {"event": "Lunch", "category": "Food"}
+    path.write_text(json.dumps([{**event, "capacity": 20}, {**EVENTS[0]}]))
+    catalog = read_catalog_file(str(path))
+    assert catalog[("Lunch", "Food")] == (20, None)
+
+    # Capacities are positive numbers of seats
+    for capacity in [0, -1, True, 2.5, "20"]:
+        path.write_text(json.dumps([{**event, "capacity": capacity}]))
+        with pytest.raises(ValueError):
+            read_catalog_file(str(path))
+
+
+def test_migrate_event_references(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        # An event table from before the catalog, once create_missing_columns
+        # added event_id
+        db.metadata.create_all(
+            connection, tables=[User.__table__, CatalogEvent.__table__]
+        )
+        connection.execute(
+            text(
+                "CREATE TABLE event (id INTEGER PRIMARY KEY, user_id INTEGER, "
+                "event VARCHAR(100) NOT NULL, category VARCHAR(100) NOT NULL, "
+                "scanned_at DATETIME, event_id INTEGER)"
+            )
+        )
+        connection.execute(
+            text(
+                "CREATE UNIQUE INDEX ix_event_user_event_category "
+                "ON event (user_id, event, category)"
+            )
+        )
+        connection.execute(
+            CatalogEvent.__table__.insert(), [{**EVENTS[0], "active": True}]
+        )
+        connection.execute(
+            text(
+                "INSERT INTO event (id, user_id, event, category) "
+                "VALUES (1, 1, :event, :category), (2, 1, 'Retired talk', 'Workshop')"
+            ),
+            EVENTS[0],
+        )
+
+        migrate_event_references(connection)
+
+        catalog = {
+            (event, category): (event_id, active)
+            for event_id, event, category, active in connection.execute(
+                select(
+                    CatalogEvent.id,
+                    CatalogEvent.event,
+                    CatalogEvent.category,
+                    CatalogEvent.active,
+                )
+            )
+        }
+        # Events missing from the catalog are added as inactive entries
+        assert catalog[("Retired talk", "Workshop")][1] is False
+        assert connection.execute(
+            text("SELECT * FROM event ORDER BY id")
+        ).mappings().all() == [
+            {
+                "id": 1,
+                "user_id": 1,
+                "scanned_at": None,
+                "event_id": catalog[(EVENTS[0]["event"], EVENTS[0]["category"])][0],
+            },
+            {
+                "id": 2,
+                "user_id": 1,
+                "scanned_at": None,
+                "event_id": catalog[("Retired talk", "Workshop")][0],
+            },
+        ]
+
+        # Migrating again changes nothing
+        migrate_event_references(connection)
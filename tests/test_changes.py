@@ -0,0 +1,115 @@
+import json
+
+from api import app, db
+from models import Event, Skill, User
+
+EVENTS = json.load(open("./mock_data/events_data.json"))
+
+CHANGES_USER_EMAIL = "syncing@example.com"
+CHANGES_USER_DATA = {
+    "name": "Sync Client",
+    "company": "Delta Co",
+    "email": CHANGES_USER_EMAIL,
+    "phone": "555-555-5555",
+    "skills": [{"skill": "Syncing", "rating": 3}],
+}
+
+
+def get(url):
+    response = app.test_client().get(url)
+    return response.status_code, json.loads(response.data.decode("utf-8"))
+
+
+def sync(since):
+    """Return every change after version since, and the version to sync from next."""
+    changes = []
+    while True:
+        status, page = get(f"/changes?since={since}&limit=400")
+        assert status == 200
+        changes.extend(page["changes"])
+        since = page["next"]
+        if not page["more"]:
+            return changes, since
+
+
+def test_changes_feed():
+    # GET /changes?since=0
+    # Syncing from scratch returns every user once, in version order
+    changes, head = sync(0)
+    versions = [change["version"] for change in changes]
+    assert versions == sorted(set(versions))
+    assert head == versions[-1]
+    status, users = get("/users")
+    assert {change["user"]["email"] for change in changes} >= {
+        user["email"] for user in users
+    }
+
+    # Nothing changed since
+    status, page = get(f"/changes?since={head}")
+    assert status == 200
+    assert page == {"changes": [], "next": head, "more": False}
+
+    # POST /users, PUT /users/:email and POST /users/events/:email
+    # A user written several times is returned once, as of its last write
+    client = app.test_client()
+    assert client.post("/users", json=CHANGES_USER_DATA).status_code == 200
+    new_skills = [{"skill": "Syncing", "rating": 5}]
+    response = client.put(f"/users/{CHANGES_USER_EMAIL}", json={"skills": new_skills})
+    assert response.status_code == 200
+    response = client.post(f"/users/events/{CHANGES_USER_EMAIL}", json=EVENTS[2])
+    assert response.status_code == 200
+
+    changes, next_head = sync(head)
+    assert [change["op"] for change in changes] == ["upsert"]
+    user = changes[0]["user"]
+    assert user["email"] == CHANGES_USER_EMAIL
+    assert user["skills"] == new_skills
+    assert user["events"] == [EVENTS[2]]
+    assert next_head == changes[0]["version"] > head
+
+    # Skill and event rows carry the version of the write that wrote them
+    with app.app_context():
+        user_version = db.session.get(User, user["id"]).version
+        assert user_version == next_head
+        (skill_version,) = {
+            skill.version for skill in Skill.query.filter_by(user_id=user["id"])
+        }
+        assert head < skill_version < user_version
+        assert {
+            event.version for event in Event.query.filter_by(user_id=user["id"])
+        } == {user_version}
+
+    # DELETE /users/:email
+    # Deletions are returned as tombstones
+    response = client.delete(f"/users/{CHANGES_USER_EMAIL}")
+    assert response.status_code == 200
+    changes, _ = sync(head)
+    assert [(change["op"], change["user"]) for change in changes] == [
+        ("delete", {"id": user["id"], "email": CHANGES_USER_EMAIL})
+    ]
+
+    # A page holds at most limit changes
+    status, page = get("/changes?since=0&limit=2")
+    assert status == 200
+    assert len(page["changes"]) == 2
+    assert page["more"] is True
+    assert page["next"] == page["changes"][-1]["version"]
+
+
+def test_changes_feed_errors():
+    # GET /changes
+    # The version to sync from is required
+    status, res = get("/changes")
+    assert status == 400
+    assert res == "Invalid request arguments"
+
+    status, res = get("/changes?since=-1")
+    assert status == 400
+    status, res = get("/changes?since=0&limit=0")
+    assert status == 400
+
+    # A version that was never given out, e.g. from before the database was
+    # reset, asks the client to sync again from scratch
+    status, res = get("/changes?since=100000000")
+    assert status == 410
+    assert res == "Version 100000000 is unknown, sync again from version 0"
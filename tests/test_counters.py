@@ -0,0 +1,61 @@
+import json
+import pytest
+
+from api import app, db
+from models import SkillCount
+from .constants import EXISTING_USER_EMAIL_3, NEW_USER_DATA
+
+EVENTS = json.load(open("./mock_data/events_data.json"))
+
+COUNTER_TEST_EMAIL = "counters@example.com"
+
+
+def test_counters_follow_writes():
+    # Register, update, scan and delete a user
+    app.test_client().post(
+        "/users", json={**NEW_USER_DATA, "email": COUNTER_TEST_EMAIL}
+    )
+    app.test_client().put(
+        f"/users/{COUNTER_TEST_EMAIL}",
+        json={"skills": [{"skill": "Counting", "rating": 5}]},
+    )
+    app.test_client().post(f"/users/events/{COUNTER_TEST_EMAIL}", json=EVENTS[2])
+    app.test_client().post(f"/users/events/{EXISTING_USER_EMAIL_3}", json=EVENTS[2])
+
+    response = app.test_client().get("/skills")
+    res = json.loads(response.data.decode("utf-8"))
+    assert {"skill": "Counting", "count": 1} in res
+
+    app.test_client().delete(f"/users/{COUNTER_TEST_EMAIL}")
+
+    response = app.test_client().get("/skills")
+    res = json.loads(response.data.decode("utf-8"))
+    assert "Counting" not in [skill.get("skill") for skill in res]
+
+    # The live counters match the counts rebuilt from scratch
+    result = app.test_cli_runner().invoke(args=["check-counters"])
+    assert result.exit_code == 0
+    assert result.output == "Counters are consistent\n"
+
+
+def test_check_counters_repair():
+    with app.app_context():
+        skill_count = SkillCount.query.filter(SkillCount.count > 0).first()
+        skill_count.count += 10
+        db.session.commit()
+        skill = skill_count.skill
+
+    # flask check-counters
+    # Inconsistent counters are reported
+    result = app.test_cli_runner().invoke(args=["check-counters"])
+    assert result.exit_code == 1
+    assert f"skill '{skill}'" in result.output
+
+    # flask check-counters --repair
+    # Inconsistent counters are rebuilt
+    result = app.test_cli_runner().invoke(args=["check-counters", "--repair"])
+    assert result.exit_code == 0
+    assert "Counters were rebuilt" in result.output
+
+    result = app.test_cli_runner().invoke(args=["check-counters"])
+    assert result.exit_code == 0
@@ -1,6 +1,8 @@
 import json
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 
+import api
 from api import app
 from .constants import (
     EXISTING_USER_EMAIL,
@@ -60,6 +62,16 @@ def test_scan_event():
     assert response.status_code == 400
     assert res == "Invalid event data in body"
 
+    # POST /users/events/:email
+    # Failed attempt to scan a user to an event that isn't a string
+    response = app.test_client().post(
+        f"/users/events/{EXISTING_USER_EMAIL}",
+        json={"event": EVENTS[0]["event"], "category": [EVENTS[0]["category"]]},
+    )
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 400
+    assert res == "Invalid event data in body"
+
     # POST /users/events/:email
     # Failed attempt to scan a user to an event they already scanned into
     response = app.test_client().post(
@@ -127,3 +139,175 @@ def test_get_events():
     assert response.status_code == 200
     counts = [event.get("count") for event in res]
     assert all(count >= min_frequency and count <= max_frequency for count in counts)
+
+
+def test_scan_events_batch():
+    scans = [
+        {"email": EXISTING_USER_EMAIL_2, **EVENTS[4]},
+        {"email": EXISTING_USER_EMAIL_3, **EVENTS[4]},
+        # Duplicate of a scan earlier in the same batch
+        {"email": EXISTING_USER_EMAIL_2, **EVENTS[4]},
+        # Already registered by test_scan_event
+        {"email": EXISTING_USER_EMAIL, **EVENTS[0]},
+        {"email": NON_EXISTING_USER_EMAIL, **EVENTS[4]},
+        {"email": EXISTING_USER_EMAIL_2, **INVALID_EVENT},
+        {
+            "email": EXISTING_USER_EMAIL_2,
+            "event": [EVENTS[4]["event"]],
+            "category": "x",
+        },
+        {"email": EXISTING_USER_EMAIL_2},
+        {"email": [EXISTING_USER_EMAIL_2], **EVENTS[4]},
+    ]
+
+    # POST /events/scans
+    # Scan a batch of users into events
+    response = app.test_client().post("/events/scans", json=scans)
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 200
+    assert [scan.get("result") for scan in res] == [
+        "registered",
+        "registered",
+        "already_registered",
+        "already_registered",
+        "user_not_found",
+        "invalid_event",
+        "invalid_event",
+        "missing_fields",
+        "invalid_email",
+    ]
+    assert res[0] == {**scans[0], "result": "registered"}
+
+    # GET /users/events/:email
+    # Verify the scan was registered
+    response = app.test_client().get(f"/users/events/{EXISTING_USER_EMAIL_3}")
+    res = json.loads(response.data.decode("utf-8"))
+    assert EVENTS[4] in res
+
+    # POST /events/scans
+    # Failed attempt to scan with a body that is not a list
+    response = app.test_client().post("/events/scans", json=scans[0])
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 400
+    assert res == "Body must be a list of scans"
+
+
+def get(url):
+    response = app.test_client().get(url)
+    return response.status_code, json.loads(response.data.decode("utf-8"))
+
+
+def test_event_timeline():
+    event = EVENTS[2]
+    status, users = get("/users?after_id=100&limit=3")
+    for user in users:
+        app.test_client().post(f"/users/events/{user['email']}", json=event)
+
+    # GET /events/:name/timeline
+    # Check-ins are counted in buckets of 15 minutes by default
+    status, res = get(f"/events/{event['event']}/timeline")
+    assert status == 200
+    assert res["event"] == event["event"]
+    assert res["category"] == event["category"]
+    assert res["capacity"] is None
+    assert res["count"] >= 3
+    assert res["buckets"][-1]["attendance"] == res["count"]
+    assert sum(bucket["count"] for bucket in res["buckets"]) == res["count"]
+
+    # GET /events/:name/timeline?bucket=bucket&start=start
+    # Check-ins before start still count towards the attendance
+    last = res["buckets"][-1]
+    status, res = get(
+        f"/events/{event['event']}/timeline?bucket=1&start={last['start']}"
+    )
+    assert status == 200
+    assert res["buckets"][-1]["attendance"] == last["attendance"]
+
+    # Deleting a user removes their check-in
+    app.test_client().delete(f"/users/{users[0]['email']}")
+    status, updated = get(f"/events/{event['event']}/timeline?bucket=60")
+    assert updated["count"] == res["buckets"][-1]["attendance"] - 1
+
+    # GET /events/:name/timeline
+    # Failed attempts with an unknown event, or an invalid bucket
+    status, res = get(f"/events/{INVALID_EVENT['event']}/timeline")
+    assert status == 400
+    assert res == f"Event '{INVALID_EVENT['event']}' does not exist"
+    status, res = get(f"/events/{event['event']}/timeline?category=Food")
+    assert status == 400
+    status, res = get(f"/events/{event['event']}/timeline?bucket=0")
+    assert status == 400
+
+
+def event_count(event):
+    status, events = get(f"/events?category={event['category']}")
+    return next((row["count"] for row in events if row["event"] == event["event"]), 0)
+
+
+def set_capacity(catalog_file, event, capacity):
+    catalog_file.write_text(
+        json.dumps(
+            [
+                {**entry, "capacity": capacity} if entry == event else entry
+                for entry in EVENTS
+            ]
+        )
+    )
+    with app.app_context():
+        api.event_catalog.load()
+
+
+def test_event_capacity(catalog_file):
+    event = EVENTS[5]
+    set_capacity(catalog_file, event, event_count(event) + 2)
+    status, users = get("/users?after_id=200&limit=4")
+    emails = [user["email"] for user in users]
+
+    # POST /events/scans
+    # Scans beyond the capacity of the event are rejected
+    response = app.test_client().post(
+        "/events/scans", json=[{"email": email, **event} for email in emails[:3]]
+    )
+    res = json.loads(response.data.decode("utf-8"))
+    assert [scan["result"] for scan in res] == [
+        "registered",
+        "registered",
+        "event_full",
+    ]
+    status, timeline = get(f"/events/{event['event']}/timeline")
+    assert timeline["capacity"] == timeline["buckets"][-1]["attendance"]
+
+    # POST /users/events/:email
+    response = app.test_client().post(f"/users/events/{emails[3]}", json=event)
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 400
+    assert res == f"Event '{event['event']}' is full"
+
+    status, registered = get(f"/users/events/{emails[3]}")
+    assert event not in registered
+
+    # Seats freed by deleted users can be taken again
+    app.test_client().delete(f"/users/{emails[0]}")
+    response = app.test_client().post(f"/users/events/{emails[3]}", json=event)
+    assert response.status_code == 200
+
+
+def test_event_capacity_concurrent_scans(catalog_file):
+    event = EVENTS[6]
+    capacity = event_count(event) + 3
+    set_capacity(catalog_file, event, capacity)
+    status, users = get("/users?after_id=300&limit=12")
+
+    def scan(user):
+        response = app.test_client().post(f"/users/events/{user['email']}", json=event)
+        return response.status_code
+
+    # Concurrent scans never take more seats than the event has
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        statuses = list(executor.map(scan, users))
+
+    assert statuses.count(200) == 3
+    assert event_count(event) == capacity
+
+    result = app.test_cli_runner().invoke(args=["check-counters"])
+    assert result.output == "Counters are consistent\n"
@@ -0,0 +1,68 @@
+import csv
+import gzip
+import io
+import json
+
+from api import app
+from .constants import EXISTING_USER_EMAIL
+
+EVENTS = json.load(open("./mock_data/events_data.json"))
+
+
+def all_users():
+    response = app.test_client().get("/users")
+    return json.loads(response.data.decode("utf-8"))
+
+
+def test_export_ndjson():
+    app.test_client().post(f"/users/events/{EXISTING_USER_EMAIL}", json=EVENTS[0])
+
+    # GET /export/users
+    # Every user is exported, with the same skills and events as GET /users
+    response = app.test_client().get("/export/users")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert "users.ndjson" in response.headers["Content-Disposition"]
+    assert "Content-Encoding" not in response.headers
+
+    lines = response.data.decode("utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == all_users()
+
+
+def test_export_csv():
+    # GET /export/users?format=csv
+    response = app.test_client().get("/export/users?format=csv")
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+
+    rows = list(csv.DictReader(io.StringIO(response.data.decode("utf-8"))))
+    users = all_users()
+    assert len(rows) == len(users)
+    for row, user in zip(rows, users):
+        assert int(row["id"]) == user["id"]
+        assert (row["name"], row["company"], row["email"], row["phone"]) == (
+            user["name"],
+            user["company"],
+            user["email"],
+            user["phone"],
+        )
+        assert json.loads(row["skills"]) == user["skills"]
+        assert json.loads(row["events"]) == user["events"]
+
+
+def test_export_gzip():
+    # GET /export/users
+    # Clients accepting gzip get a compressed export
+    response = app.test_client().get(
+        "/export/users?format=csv", headers={"Accept-Encoding": "gzip, deflate"}
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert (
+        gzip.decompress(response.data)
+        == app.test_client().get("/export/users?format=csv").data
+    )
+
+    # Failed attempt to export in an unsupported format
+    assert app.test_client().get("/export/users?format=xml").status_code == 400
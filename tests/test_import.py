@@ -0,0 +1,195 @@
+import io
+import json
+import pytest
+
+from api import app, db, repository
+from importer import INVALID_JSON, import_profiles, parse_json_array, parse_ndjson
+from .constants import EXISTING_USER_EMAIL
+
+
+def profile(i, prefix="import"):
+    return {
+        "name": f"Zoë Import {i}",
+        "company": "Imports Inc",
+        "email": f"{prefix}{i}@example.com",
+        "phone": "123-456-7890",
+        "skills": [{"skill": "Importing", "rating": i % 5 + 1}],
+    }
+
+
+def small_chunks(data, size=7):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+class FailingStream(io.BytesIO):
+    """
+    Stream returning at most 100 bytes per read, and failing once more than
+    fail_after bytes were read from it.
+    """
+
+    def __init__(self, data, fail_after):
+        super().__init__(data)
+        self.fail_after = fail_after
+
+    def read(self, size=-1):
+        if self.tell() > self.fail_after:
+            raise OSError("Connection lost")
+        return super().read(min(size, 100))
+
+
+def test_parse_json_array():
+    profiles = [profile(i) for i in range(5)] + [12, "x", None]
+    data = json.dumps(profiles, indent=2).encode("utf-8")
+
+    # Elements are decoded one at a time, across chunk boundaries (including
+    # ones splitting multi-byte characters)
+    parsed = list(parse_json_array(small_chunks(data), 0))
+    assert [element for element, _ in parsed] == profiles
+
+    # Parsing resumes right after any element
+    for i, (_, offset) in enumerate(parsed):
+        resumed = parse_json_array(small_chunks(data[offset:]), offset)
+        assert [element for element, _ in resumed] == profiles[i + 1 :]
+
+    assert list(parse_json_array([b" [ ] "], 0)) == []
+    for invalid in [b'{"a": 1}', b"[1, 2", b"[1 2]", b"[1,]", b""]:
+        with pytest.raises(ValueError):
+            list(parse_json_array(small_chunks(invalid, 2), 0))
+
+
+def test_parse_ndjson():
+    lines = [json.dumps(profile(0)), "", "not json", json.dumps(profile(1))]
+    data = "\n".join(lines).encode("utf-8")
+
+    parsed = list(parse_ndjson(small_chunks(data), 0, len(data)))
+    assert [element for element, _ in parsed] == [
+        profile(0),
+        INVALID_JSON,
+        profile(1),
+    ]
+    assert parsed[-1][1] == len(data)
+
+    _, offset = parsed[0]
+    resumed = parse_ndjson(small_chunks(data[offset:]), offset, len(data))
+    assert [element for element, _ in resumed] == [INVALID_JSON, profile(1)]
+
+    # A last line without a newline may have been cut short, unless the data
+    # is known to end there
+    parsed = parse_ndjson(small_chunks(data + b"\n"), 0)
+    assert [element for element, _ in parsed] == [profile(0), INVALID_JSON, profile(1)]
+    for size in [None, len(data) + 10]:
+        with pytest.raises(ValueError):
+            list(parse_ndjson(small_chunks(data), 0, size))
+
+
+def test_import_endpoint():
+    profiles = [profile(i) for i in range(25)]
+    # Rejected: a duplicate email, missing skill fields, a registered email, an
+    # email that isn't a string
+    profiles.insert(5, profile(3))
+    profiles.insert(10, {**profile(100), "skills": [{"skill": "Importing"}]})
+    profiles.insert(15, {**profile(101), "email": EXISTING_USER_EMAIL})
+    profiles.insert(20, {**profile(102), "email": [profile(102)["email"]]})
+
+    # POST /users/import?batch_size=batch_size
+    response = app.test_client().post(
+        "/users/import?batch_size=10", data=json.dumps(profiles)
+    )
+    assert response.status_code == 200
+    report = response.json
+    assert report["completed"]
+    assert (report["processed"], report["imported"]) == (29, 25)
+    assert report["rejected"] == {
+        "duplicate_email": 1,
+        "invalid_skill": 1,
+        "already_exists": 1,
+        "invalid_fields": 1,
+    }
+    assert [(row["index"], row["error"]) for row in report["rejected_rows"]] == [
+        (5, "duplicate_email"),
+        (10, "invalid_skill"),
+        (15, "already_exists"),
+        (20, "invalid_fields"),
+    ]
+
+    # Imported users can be retrieved
+    response = app.test_client().get("/users/import24@example.com")
+    assert response.status_code == 200
+    assert response.json["skills"] == profile(24)["skills"]
+
+    # POST /users/import
+    # Failed attempts to import malformed data
+    response = app.test_client().post("/users/import", data=b'[{"name": "x"')
+    assert response.status_code == 400
+    assert "error" in response.json
+    assert app.test_client().post("/users/import?batch_size=0").status_code == 400
+
+
+def test_import_resume():
+    profiles = [profile(i, prefix="resume") for i in range(30)]
+    data = "\n".join(json.dumps(profile) for profile in profiles).encode("utf-8")
+
+    with app.app_context():
+        # The import is interrupted while reading the third batch
+        try:
+            import_profiles(
+                FailingStream(data, fail_after=len(data) * 2 // 3),
+                "resume-test",
+                batch_size=10,
+            )
+        except OSError:
+            db.session.rollback()
+        assert repository.find_user("resume9@example.com") is not None
+        assert repository.find_user("resume29@example.com") is None
+
+        # Importing the same data again picks up after the last full batch
+        report = import_profiles(io.BytesIO(data), "resume-test", 10, len(data))
+        assert report["completed"]
+        assert (report["processed"], report["imported"]) == (30, 30)
+        assert report["rejected"] == {}
+        assert repository.find_user("resume29@example.com") is not None
+
+        # A completed import is not repeated
+        report = import_profiles(io.BytesIO(data), "resume-test", 10, len(data))
+        assert (report["processed"], report["imported"]) == (30, 30)
+
+
+def test_import_truncated_ndjson():
+    profiles = [profile(i, prefix="truncated") for i in range(5)]
+    data = "".join(json.dumps(profile) + "\n" for profile in profiles).encode()
+
+    with app.app_context():
+        # A body cut in the middle of its last line, of unknown size, leaves
+        # the import incomplete, checkpointed before that line
+        cut = len(data) - 20
+        report = import_profiles(io.BytesIO(data[:cut]), "truncated-test", 2)
+        assert not report["completed"]
+        assert "error" in report
+        assert report["processed"] == 4
+        assert repository.find_user("truncated4@example.com") is None
+
+        # ...and sending the whole body again imports the rest
+        report = import_profiles(io.BytesIO(data), "truncated-test", 2)
+        assert report["completed"]
+        assert (report["processed"], report["imported"]) == (5, 5)
+        assert repository.find_user("truncated4@example.com") is not None
+
+
+def test_import_command(tmp_path):
+    path = tmp_path / "profiles.ndjson"
+    path.write_text(
+        "\n".join(
+            [json.dumps(profile(i, prefix="command")) for i in range(3)] + ["{oops"]
+        )
+    )
+
+    result = app.test_cli_runner().invoke(args=["import-profiles", str(path)])
+    assert result.exit_code == 0, result.output
+    assert "Imported 3 profiles and rejected 1 of 4" in result.output
+    assert "invalid_json: 1" in result.output
+
+    result = app.test_cli_runner().invoke(args=["import-profiles", str(path)])
+    assert "already imported" in result.output
+
+    with app.app_context():
+        assert repository.find_user("command2@example.com") is not None
@@ -0,0 +1,87 @@
+import json
+import pstats
+
+from api import app
+from metrics import MetricsStore, request_duration, request_queries
+from .constants import EXISTING_USER_EMAIL
+
+
+def get(url):
+    # Metrics are recorded once the response is closed, as WSGI servers do
+    with app.test_client().get(url) as response:
+        return response.status_code, response.get_data(as_text=True)
+
+
+def observations(histogram, labels):
+    """Return the number and sum of the observations of a series."""
+    counts = histogram.snapshot().get(labels, [0])
+    return sum(counts[:-1]), counts[-1] if len(counts) > 1 else 0
+
+
+def test_metrics():
+    get(f"/users/{EXISTING_USER_EMAIL}")
+    get("/users/nonexistent@example.com")
+
+    # GET /metrics
+    status, body = get("/metrics")
+    assert status == 200
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/users/<string:email>",status="400"}'
+    ) in body
+    for name in [
+        "http_request_db_queries",
+        "http_request_db_query_duration_seconds",
+        "http_request_serialization_duration_seconds",
+    ]:
+        assert f'{name}_count{{method="GET",route="/users/<string:email>"}}' in body
+
+    response = app.test_client().get("/metrics")
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+
+
+def test_metrics_count_queries():
+    # GET /users streams its users in chunks of a fixed number of queries, and
+    # the queries of the whole stream are counted
+    labels = ("GET", "/users")
+    count, queries = observations(request_queries, labels)
+    get("/users?limit=600&after_id=0")
+    new_count, new_queries = observations(request_queries, labels)
+    assert new_count == count + 1
+    # (none when served from the cache, never one per user)
+    assert new_queries - queries <= 6
+
+    count, _ = observations(request_duration, ("GET", "/users", "200"))
+    assert count >= 1
+
+
+def test_profiling(tmp_path):
+    app.config["PROFILE_SAMPLE_RATE"] = 1
+    app.config["PROFILE_DIR"] = str(tmp_path)
+    try:
+        get("/skills")
+    finally:
+        app.config["PROFILE_SAMPLE_RATE"] = 0
+
+    # Sampled requests are profiled into a .prof file each
+    [path] = tmp_path.glob("*-GET-skills.prof")
+    assert pstats.Stats(str(path)).total_calls > 0
+
+
+def test_metrics_dir(tmp_path):
+    # Metrics of the other processes writing to the same directory are summed
+    # with the ones of this process
+    labels = ["GET", "/elsewhere", "200"]
+    counts = [0] * len(request_duration.buckets) + [2, 3.5]
+    (tmp_path / "1.json").write_text(
+        json.dumps({"http_request_duration_seconds": [[labels, counts]]})
+    )
+    (tmp_path / "2.json").write_text(
+        json.dumps({"http_request_duration_seconds": [[labels, counts]]})
+    )
+
+    body = MetricsStore(str(tmp_path)).render()
+    prefix = 'http_request_duration_seconds_{}{{method="GET",route="/elsewhere",status="200"}}'
+    assert f"{prefix.format('count')} 4" in body
+    assert f"{prefix.format('sum')} 7.0" in body
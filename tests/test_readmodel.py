@@ -0,0 +1,204 @@
+import json
+import pytest
+from sqlalchemy import select
+
+import api
+from api import app, db, repository, response_cache
+from changes import record_user_changes
+from models import User
+from readmodel import ReadModel, serialize_record
+from .constants import EXISTING_USER_EMAIL, EXISTING_USER_EMAIL_2, sorted_skills
+
+READ_MODEL_TEST_EMAIL = "readmodel@example.com"
+READ_MODEL_TEST_DATA = {
+    "name": "Reade Model",
+    "company": "Snapshots Inc",
+    "email": READ_MODEL_TEST_EMAIL,
+    "phone": "123-456-7890",
+    "skills": [{"skill": "Snapshotting", "rating": 5}, {"skill": "OCaml", "rating": 2}],
+}
+
+READ_URLS = [
+    "/users",
+    "/users?after_id=500&limit=20",
+    f"/users/{EXISTING_USER_EMAIL}",
+    "/users/doesnotexist@gmail.com",
+    "/skills",
+    "/skills?min_frequency=10&max_frequency=30&limit=5&offset=2",
+    "/events",
+    "/events?category=Workshop&min_frequency=2",
+]
+
+
+def get(url):
+    response = app.test_client().get(url)
+    return response.status_code, json.loads(response.data.decode("utf-8"))
+
+
+def get_all(urls):
+    # Skip the cached responses, which could come from either path
+    response_cache.invalidate_all()
+    return [get(url) for url in urls]
+
+
+@pytest.fixture
+def read_model(monkeypatch):
+    model = ReadModel(app.config["SQLALCHEMY_DATABASE_URI"], max_age=60)
+    monkeypatch.setattr(api, "read_model", model)
+    yield model
+    response_cache.invalidate_all()
+
+
+def test_read_model_matches_database(read_model, monkeypatch):
+    responses = get_all(READ_URLS)
+    assert read_model.built
+
+    monkeypatch.setattr(api, "read_model", None)
+    expected = get_all(READ_URLS)
+
+    for url, response, expected_response in zip(READ_URLS, responses, expected):
+        if url.startswith("/events"):
+            # Events with the same count and name are in no particular order
+            response[1].sort(key=json.dumps)
+            expected_response[1].sort(key=json.dumps)
+        assert response == expected_response, url
+
+
+def test_read_model_writes(read_model):
+    with app.app_context():
+        read_model.warm_up()
+    client = app.test_client()
+
+    # POST /users
+    # A new user is served by the read model once registered
+    response = client.post("/users", json=READ_MODEL_TEST_DATA)
+    assert response.status_code == 200
+    status, user = get(f"/users/{READ_MODEL_TEST_EMAIL}")
+    assert status == 200
+    assert (
+        sorted_skills(user)["skills"] == sorted_skills(READ_MODEL_TEST_DATA)["skills"]
+    )
+    status, users = get(f"/users?after_id={user['id'] - 1}")
+    assert [u["email"] for u in users] == [READ_MODEL_TEST_EMAIL]
+    status, skills = get("/skills?max_frequency=1")
+    assert {"skill": "Snapshotting", "count": 1} in skills
+
+    # PUT /users/:email and POST /users/events/:email
+    # Updates and scans replace the user in the read model
+    new_email = "readmodel2@example.com"
+    response = client.put(
+        f"/users/{READ_MODEL_TEST_EMAIL}",
+        json={"email": new_email, "skills": [{"skill": "Snapshotting", "rating": 3}]},
+    )
+    assert response.status_code == 200
+    event = {"event": "Databases with SQLite", "category": "Workshop"}
+    response = client.post(f"/users/events/{new_email}", json=event)
+    assert response.status_code == 200
+
+    status, _ = get(f"/users/{READ_MODEL_TEST_EMAIL}")
+    assert status == 400
+    status, updated = get(f"/users/{new_email}")
+    assert status == 200
+    assert updated["id"] == user["id"]
+    assert updated["skills"] == [{"skill": "Snapshotting", "rating": 3}]
+    assert updated["events"] == [event]
+
+    # DELETE /users/:email
+    response = client.delete(f"/users/{new_email}")
+    assert response.status_code == 200
+    status, _ = get(f"/users/{new_email}")
+    assert status == 400
+    status, users = get(f"/users?after_id={user['id'] - 1}")
+    assert users == []
+    status, skills = get("/skills")
+    assert "Snapshotting" not in [skill["skill"] for skill in skills]
+
+    # Users of the snapshot that were updated are served from the overlay
+    status, existing = get(f"/users/{EXISTING_USER_EMAIL_2}")
+    response = client.put(f"/users/{EXISTING_USER_EMAIL_2}", json={"phone": "555"})
+    assert response.status_code == 200
+    status, updated = get(f"/users/{EXISTING_USER_EMAIL_2}")
+    assert updated == {**existing, "phone": "555"}
+    status, users = get(f"/users?after_id={existing['id'] - 1}&limit=1")
+    assert users == [updated]
+
+    client.put(f"/users/{EXISTING_USER_EMAIL_2}", json={"phone": existing["phone"]})
+
+
+def test_read_model_snapshot(tmp_path, monkeypatch):
+    database_url = app.config["SQLALCHEMY_DATABASE_URI"]
+    path = str(tmp_path / "read_model.snapshot")
+    with app.app_context():
+        built = ReadModel(database_url, max_age=60, snapshot_path=path)
+        built.warm_up()
+        user = serialize_record(built.find_user(EXISTING_USER_EMAIL))
+
+        def export_profiles(chunk_size):
+            raise AssertionError("The snapshot was not loaded")
+
+        # A recent snapshot is memory-mapped rather than read from the database
+        monkeypatch.setattr(repository, "export_profiles", export_profiles)
+        loaded = ReadModel(database_url, max_age=60, snapshot_path=path)
+        loaded.warm_up()
+        assert serialize_record(loaded.find_user(EXISTING_USER_EMAIL)) == user
+        assert loaded.skills() == built.skills()
+        assert loaded.events() == built.events()
+
+        # ...unless the process saw a write since the snapshot was built, the
+        # snapshot is of another database, or there's no max_age bounding how
+        # old it may be
+        models = [
+            ReadModel(database_url, max_age=60, snapshot_path=path),
+            ReadModel("sqlite:///elsewhere.db", max_age=60, snapshot_path=path),
+            ReadModel(database_url, snapshot_path=path),
+        ]
+        models[0].invalidate()
+        for model in models:
+            with pytest.raises(AssertionError):
+                model.warm_up()
+
+
+def test_read_model_follows_other_processes(tmp_path):
+    database_url = app.config["SQLALCHEMY_DATABASE_URI"]
+    path = str(tmp_path / "read_model.snapshot")
+    with app.app_context():
+        built = ReadModel(database_url, max_age=60, snapshot_path=path)
+        built.warm_up()
+        phone = built.find_user(EXISTING_USER_EMAIL_2).phone
+
+        # A write by another process, which can't mark the user stale here...
+        user = db.session.scalar(
+            select(User).where(User.email == EXISTING_USER_EMAIL_2)
+        )
+        user.phone = "555-0199"
+        record_user_changes([user.id])
+        db.session.commit()
+        try:
+            # ...is seen by the next read, and by a read model loading the
+            # snapshot built before it
+            assert built.find_user(EXISTING_USER_EMAIL_2).phone == "555-0199"
+            loaded = ReadModel(database_url, max_age=60, snapshot_path=path)
+            loaded.warm_up()
+            assert loaded.version == built.version
+            assert loaded.find_user(EXISTING_USER_EMAIL_2).phone == "555-0199"
+        finally:
+            user.phone = phone
+            record_user_changes([user.id])
+            db.session.commit()
+
+
+def test_read_model_email_lookup():
+    with app.app_context():
+        model = ReadModel(app.config["SQLALCHEMY_DATABASE_URI"], max_age=60)
+        model.warm_up()
+        snapshot = model.snapshot
+        emails = [
+            snapshot.email_bytes(row).decode() for row in range(len(snapshot.user_ids))
+        ]
+
+    # Every email is found by the binary search over the rows in email order,
+    # and emails sorting before, between or after them aren't
+    for row, email in enumerate(emails):
+        assert snapshot.row_of_email(email) == row
+    for email in ["", "0", min(emails) + "\0", max(emails) + "z", "\U0010ffff"]:
+        assert snapshot.row_of_email(email) is None
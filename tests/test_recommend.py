@@ -0,0 +1,113 @@
+import json
+
+from api import app
+from .constants import EXISTING_USER_EMAIL
+
+MATCH_TEST_EMAIL = "match@example.com"
+MATCH_TEST_DATA = {
+    "name": "Matcher Test",
+    "company": "Matchmaking",
+    "email": MATCH_TEST_EMAIL,
+    "phone": "123-456-7890",
+    "skills": [
+        {"skill": "Matchmaking", "rating": 5},
+        {"skill": "Haskell", "rating": 4},
+    ],
+}
+
+
+def match(body):
+    response = app.test_client().post("/users/match", json=body)
+    return response.status_code, json.loads(response.data.decode("utf-8"))
+
+
+def similar(email, query=""):
+    response = app.test_client().get(f"/users/{email}/similar?{query}")
+    return response.status_code, json.loads(response.data.decode("utf-8"))
+
+
+def test_match_users():
+    # POST /users/match
+    # Every requirement is met, and users are ranked by their weighted ratings
+    status, res = match(
+        {
+            "skills": [
+                {"skill": "haskell", "min_rating": 3, "weight": 2},
+                {"skill": "Lua"},
+            ],
+            "limit": 100,
+        }
+    )
+    assert status == 200
+    assert len(res) > 0
+    for user in res:
+        ratings = {skill["skill"]: skill["rating"] for skill in user["skills"]}
+        assert ratings["Haskell"] >= 3 and "Lua" in ratings
+        assert user["score"] == ratings["Haskell"] * 2 + ratings["Lua"]
+    scores = [user["score"] for user in res]
+    assert scores == sorted(scores, reverse=True)
+
+    # With match=any, meeting one requirement is enough
+    status, any_res = match(
+        {
+            "skills": [{"skill": "Haskell", "min_rating": 5}, {"skill": "Lua"}],
+            "match": "any",
+        }
+    )
+    assert status == 200
+    assert len(any_res) == 10
+    for user in any_res:
+        ratings = {skill["skill"]: skill["rating"] for skill in user["skills"]}
+        assert ratings.get("Haskell", 0) >= 5 or "Lua" in ratings
+
+    # Unknown skills match nobody
+    assert match({"skills": [{"skill": "Nonexistent"}]}) == (200, [])
+
+    # Failed attempts to match with invalid requirements
+    assert match({"skills": []})[0] == 400
+    assert match({"skills": [{"skill": "Haskell", "weight": 0}]})[0] == 400
+    assert match({"skills": [{"skill": "Haskell", "min_rating": 0}]})[0] == 400
+    assert match({"skills": [{"skill": "Haskell"}], "limit": 101})[0] == 400
+    assert match({"skills": [{"skill": "Haskell"}], "match": "some"})[0] == 400
+
+
+def test_match_follows_writes():
+    # Registered users are matched
+    app.test_client().post("/users", json=MATCH_TEST_DATA)
+    status, res = match({"skills": [{"skill": "Matchmaking"}]})
+    assert [(user["email"], user["score"]) for user in res] == [(MATCH_TEST_EMAIL, 5)]
+
+    # Updated users are matched by their new skills
+    app.test_client().put(
+        f"/users/{MATCH_TEST_EMAIL}",
+        json={"skills": [{"skill": "Matchmaking", "rating": 2}]},
+    )
+    status, res = match({"skills": [{"skill": "Matchmaking", "min_rating": 3}]})
+    assert res == []
+    status, res = match({"skills": [{"skill": "Matchmaking"}]})
+    assert [(user["email"], user["score"]) for user in res] == [(MATCH_TEST_EMAIL, 2)]
+
+    # Deleted users are no longer matched
+    app.test_client().delete(f"/users/{MATCH_TEST_EMAIL}")
+    assert match({"skills": [{"skill": "Matchmaking"}]}) == (200, [])
+
+
+def test_similar_users():
+    # GET /users/:email/similar
+    status, res = similar(EXISTING_USER_EMAIL, "limit=5")
+    assert status == 200
+    assert 0 < len(res) <= 5
+    assert EXISTING_USER_EMAIL not in [user["email"] for user in res]
+
+    # Similar users share at least one skill, most similar first
+    user = app.test_client().get(f"/users/{EXISTING_USER_EMAIL}").json
+    skills = {skill["skill"] for skill in user["skills"]}
+    for other in res:
+        assert skills & {skill["skill"] for skill in other["skills"]}
+        assert 0 < other["similarity"] <= 1
+    similarities = [other["similarity"] for other in res]
+    assert similarities == sorted(similarities, reverse=True)
+
+    # Failed attempts to find users similar to a nonexistent user
+    assert similar("nonexistent@example.com")[0] == 400
+    assert similar(EXISTING_USER_EMAIL, "limit=0")[0] == 400
@@ -0,0 +1,110 @@
+import json
+import pytest
+from sqlalchemy import func, select
+
+from api import app, db, event_catalog, repository
+from models import Event, User
+from repository import (
+    PostgresRepository,
+    Repository,
+    SQLiteRepository,
+    create_repository,
+)
+from .constants import EXISTING_USER_EMAIL_2
+
+EVENTS = json.load(open("./mock_data/events_data.json"))
+
+REPOSITORY_TEST_EMAIL = "repository@example.com"
+
+
+def test_create_repository():
+    # The backend is selected from the database URL
+    assert isinstance(
+        create_repository(db.session, "sqlite:///db/database.db"), SQLiteRepository
+    )
+    assert isinstance(
+        create_repository(db.session, "postgresql://user@localhost/htn"),
+        PostgresRepository,
+    )
+    assert isinstance(
+        create_repository(db.session, "postgresql+psycopg2://user@localhost/htn"),
+        PostgresRepository,
+    )
+
+    with pytest.raises(ValueError):
+        create_repository(db.session, "mysql://user@localhost/htn")
+
+    # Backends must provide their INSERT construct
+    with pytest.raises(TypeError):
+        Repository(db.session)
+
+
+def test_bulk_insert():
+    with app.app_context():
+        next_id = db.session.scalar(select(func.max(User.id))) + 1
+        repository.bulk_insert(
+            User,
+            [
+                {
+                    "id": next_id,
+                    "name": "Repository Test",
+                    # Empty strings are kept apart from NULLs
+                    "company": "",
+                    "email": REPOSITORY_TEST_EMAIL,
+                    "phone": '123 "456" 7890',
+                    "version": None,
+                    "updated_at": None,
+                }
+            ],
+        )
+        db.session.commit()
+
+        user = repository.find_user(REPOSITORY_TEST_EMAIL)
+        assert (user.id, user.company, user.phone) == (next_id, "", '123 "456" 7890')
+        assert (user.version, user.updated_at) == (None, None)
+
+    # Users registered afterwards get ids following the bulk inserted ones
+    response = app.test_client().post(
+        "/users",
+        json={
+            "name": "Repository Test",
+            "company": "Repository",
+            "email": "repository2@example.com",
+            "phone": "123-456-7890",
+        },
+    )
+    assert response.status_code == 200
+
+    with app.app_context():
+        assert repository.find_user("repository2@example.com").id > next_id
+
+
+def test_insert_new_events():
+    with app.app_context():
+        user_id = repository.find_user(EXISTING_USER_EMAIL_2).id
+        event_ids = [event_catalog.lookup(**event).id for event in EVENTS[:2]]
+        db.session.execute(Event.__table__.delete().where(Event.user_id == user_id))
+        repository.insert_new_events([{"user_id": user_id, "event_id": event_ids[0]}])
+
+        # Only the registrations that don't exist yet are inserted
+        inserted = repository.insert_new_events(
+            [{"user_id": user_id, "event_id": event_id} for event_id in event_ids]
+        )
+        assert inserted == {(user_id, event_ids[1])}
+        assert repository.insert_new_events([]) == set()
+
+        db.session.rollback()
+
+
+def test_user_chunks():
+    with app.app_context():
+        user_ids = db.session.scalars(select(User.id).order_by(User.id)).all()
+
+        chunks = list(repository.user_chunks(user_ids[9], 25, 10))
+        assert [len(users) for users in chunks] == [10, 10, 5]
+        assert [user.id for users in chunks for user in users] == user_ids[10:35]
+
+        chunks = list(repository.user_chunks(user_ids[-3], None, 10))
+        assert [user.id for users in chunks for user in users] == user_ids[-2:]
+
+        assert list(repository.user_chunks(user_ids[-1], None, 10)) == []
@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+import pytest
+from starlette.testclient import TestClient
+
+import api
+from api import app, write_queued_scans
+from scanlog import ScanLog, ScanQueue
+from .constants import NON_EXISTING_USER_EMAIL
+
+EVENTS = json.load(open("./mock_data/events_data.json"))
+
+
+def get(url):
+    response = app.test_client().get(url)
+    return response.status_code, json.loads(response.data.decode("utf-8"))
+
+
+def user_emails(after_id, limit):
+    status, users = get(f"/users?after_id={after_id}&limit={limit}")
+    return [user["email"] for user in users]
+
+
+@pytest.fixture
+def scan_queue(tmp_path, monkeypatch):
+    # The writer only writes once released, so scans stay queued meanwhile
+    released = threading.Event()
+
+    def apply(scans):
+        released.wait()
+        write_queued_scans(scans)
+
+    queue = ScanQueue(str(tmp_path), apply, max_depth=3, batch_size=100, interval=0.001)
+    queue.released = released
+    monkeypatch.setattr(api, "scan_queue", queue)
+    yield queue
+
+    released.set()
+    queue.stop()
+
+
+def test_queued_scans(scan_queue):
+    event = EVENTS[1]
+    emails = user_emails(400, 4)
+
+    # POST /users/events/:email
+    # Valid scans are acknowledged before they are written
+    response = app.test_client().post(f"/users/events/{emails[0]}", json=event)
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 202
+    assert res == f"Scan of user '{emails[0]}' to event was queued"
+
+    # POST /events/scans
+    scans = [
+        {"email": emails[1], **event},
+        {"email": NON_EXISTING_USER_EMAIL, **event},
+        {"email": emails[2], **event},
+    ]
+    response = app.test_client().post("/events/scans", json=scans)
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 200
+    assert [scan["result"] for scan in res] == ["queued", "user_not_found", "queued"]
+
+    status, registered = get(f"/users/events/{emails[0]}")
+    assert event not in registered
+
+    # Scans beyond the depth of the queue are refused
+    response = app.test_client().post(f"/users/events/{emails[3]}", json=event)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+    # The writer registers the queued scans
+    scan_queue.released.set()
+    scan_queue.drain()
+    for email in emails[:3]:
+        status, registered = get(f"/users/events/{email}")
+        assert event in registered
+
+    response = app.test_client().post(f"/users/events/{emails[3]}", json=event)
+    assert response.status_code == 202
+
+
+def test_queued_scans_asgi(scan_queue):
+    from asgi import app as asgi_app
+
+    event = EVENTS[2]
+    emails = user_emails(420, 4)
+
+    # POST /users/events/:email
+    # The ASGI app queues scans too
+    with TestClient(asgi_app) as client:
+        for email in emails[:3]:
+            response = client.post(f"/users/events/{email}", json=event)
+            assert response.status_code == 202
+            assert response.json() == f"Scan of user '{email}' to event was queued"
+
+        status, registered = get(f"/users/events/{emails[0]}")
+        assert event not in registered
+
+        response = client.post(f"/users/events/{emails[3]}", json=event)
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+
+    scan_queue.released.set()
+    scan_queue.drain()
+    for email in emails[:3]:
+        status, registered = get(f"/users/events/{email}")
+        assert event in registered
+
+
+def test_scan_log_replay(tmp_path):
+    event = EVENTS[3]
+    emails = user_emails(500, 3)
+    scanned_at = "2023-09-15T18:30:00"
+
+    # Scans left in this process's log, followed by a torn line from a crash
+    log = ScanLog(str(tmp_path / "scans-0.log"))
+    assert log.lock()
+    log.append([{"email": emails[0], **event, "scanned_at": scanned_at}])
+    log.file.write(b'{"email": "torn')
+    log.close()
+
+    # ...and in the log of another process that stopped
+    orphan = ScanLog(str(tmp_path / "scans-4.log"))
+    assert orphan.lock()
+    orphan.append(
+        [{"email": email, **event, "scanned_at": scanned_at} for email in emails[1:]]
+    )
+    orphan.close()
+
+    # The scans are written when a process takes the logs again
+    queue = ScanQueue(
+        str(tmp_path), write_queued_scans, max_depth=10, batch_size=1, interval=0
+    )
+    queue.start()
+    queue.stop()
+
+    for email in emails:
+        status, registered = get(f"/users/events/{email}")
+        assert event in registered
+
+    status, timeline = get(
+        f"/events/{event['event']}/timeline?bucket=1&end=2023-09-15T18:31:00"
+    )
+    assert timeline["buckets"][-1] == {
+        "start": scanned_at + "Z",
+        "count": 3,
+        "attendance": 3,
+    }
+
+    # Both logs are checkpointed up to their last scan
+    for path in ["scans-0.log", "scans-4.log"]:
+        log = ScanLog(str(tmp_path / path))
+        assert log.lock()
+        assert log.pending() == []
+        assert os.path.getsize(log.path) == log.read_checkpoint()
+        log.close()
@@ -0,0 +1,238 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from sqlalchemy import func, select
+
+from api import app, db, repository, response_cache
+from changes import record_user_changes, record_user_deletions
+from models import User
+from search import SearchIndex
+from .constants import EXISTING_USER_EMAIL, EXISTING_USER_DATA
+
+EVENTS = json.load(open("./mock_data/events_data.json"))
+
+SEARCH_TEST_EMAIL = "search@example.com"
+SEARCH_TEST_DATA = {
+    "name": "Zebulon Quixote",
+    "company": "Searchlight Widgets",
+    "email": SEARCH_TEST_EMAIL,
+    "phone": "123-456-7890",
+    "skills": [{"skill": "Searching", "rating": 5}],
+}
+
+
+def search(query):
+    response = app.test_client().get(f"/users/search?{query}")
+    return response.status_code, json.loads(response.data.decode("utf-8"))
+
+
+def test_search_text():
+    # GET /users/search?q=q
+    # Every word matches the start of a word of the name or company
+    status, res = search("q=adam hu")
+    assert status == 200
+    assert EXISTING_USER_EMAIL in [user.get("email") for user in res["users"]]
+    for user in res["users"]:
+        words = (user.get("name") + " " + user.get("company")).lower().split()
+        assert any(word.startswith("adam") for word in words)
+
+    # GET /users/search?q=q
+    # Words with a typo still match
+    status, res = search("q=adam huyhn")
+    assert status == 200
+    assert [user.get("email") for user in res["users"]] == [EXISTING_USER_EMAIL]
+    assert res["total"] == 1
+
+    status, res = search("q=nothing matches this")
+    assert status == 200
+    assert res == {
+        "total": 0,
+        "users": [],
+        "facets": {"skills": [], "companies": [], "events": [], "categories": []},
+    }
+
+
+def test_search_filters():
+    # GET /users/search?skill=skill&min_rating=min_rating
+    # Only users rating the skill at least min_rating are returned
+    status, res = search("skill=haskell&min_rating=4&limit=100")
+    assert status == 200
+    assert res["total"] == len(res["users"]) > 0
+    for user in res["users"]:
+        ratings = [
+            skill.get("rating")
+            for skill in user.get("skills")
+            if skill.get("skill") == "Haskell"
+        ]
+        assert ratings and ratings[0] >= 4
+    assert {"skill": "Haskell", "count": res["total"]} in res["facets"]["skills"]
+
+    # GET /users/search?event=event&category=category
+    # Only users scanned into the event are returned
+    app.test_client().post(f"/users/events/{EXISTING_USER_EMAIL}", json=EVENTS[5])
+    status, res = search(
+        f"event={EVENTS[5]['event']}&category={EVENTS[5]['category']}&limit=100"
+    )
+    assert status == 200
+    assert EXISTING_USER_EMAIL in [user.get("email") for user in res["users"]]
+    for user in res["users"]:
+        assert EVENTS[5] in user.get("events")
+    assert {**EVENTS[5], "count": res["total"]} in res["facets"]["events"]
+
+    # GET /users/search?q=q&category=category
+    # Text and filters are combined
+    status, res = search(
+        f"q={EXISTING_USER_DATA['name']}&category={EVENTS[5]['category']}"
+    )
+    assert status == 200
+    assert EXISTING_USER_EMAIL in [user.get("email") for user in res["users"]]
+
+
+def test_search_pagination():
+    # GET /users/search?limit=limit&offset=offset
+    status, first_page = search("limit=10")
+    assert status == 200
+    assert len(first_page["users"]) == 10
+    assert first_page["total"] >= 996
+
+    status, second_page = search("limit=10&offset=10")
+    assert status == 200
+    ids = [user.get("id") for user in first_page["users"] + second_page["users"]]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == 20
+
+    # The facets count every match, not just the returned page
+    assert sum(company["count"] for company in first_page["facets"]["companies"]) > 10
+    assert len(first_page["facets"]["companies"]) == 10
+
+    # GET /users/search?min_rating=min_rating
+    # Failed attempts to search with invalid arguments
+    assert search("min_rating=4")[0] == 400
+    assert search("limit=0")[0] == 400
+    assert search("limit=101")[0] == 400
+
+
+def test_search_follows_writes():
+    # Registered users become searchable
+    app.test_client().post("/users", json=SEARCH_TEST_DATA)
+    status, res = search("q=zebulon")
+    assert status == 200
+    assert [user.get("email") for user in res["users"]] == [SEARCH_TEST_EMAIL]
+
+    # Updated users are searchable by their new fields only
+    new_email = "search2@example.com"
+    app.test_client().put(
+        f"/users/{SEARCH_TEST_EMAIL}",
+        json={"email": new_email, "company": "Lighthouse Widgets"},
+    )
+    assert search("q=searchlight")[1]["total"] == 0
+    status, res = search("q=zebulon lighthouse")
+    assert [user.get("email") for user in res["users"]] == [new_email]
+
+    # Scanned users are found by the event filter
+    app.test_client().post(f"/users/events/{new_email}", json=EVENTS[6])
+    status, res = search(f"q=zebulon&event={EVENTS[6]['event']}")
+    assert [user.get("email") for user in res["users"]] == [new_email]
+
+    # Deleted users are no longer found
+    app.test_client().delete(f"/users/{new_email}")
+    status, res = search("q=zebulon")
+    assert res["total"] == 0
+    assert "Searching" not in [skill["skill"] for skill in res["facets"]["skills"]]
+
+
+OTHER_PROCESS_UPDATE = """
+import sys
+from api import app
+
+email, name = sys.argv[1:]
+response = app.test_client().put(f"/users/{email}", json={"name": name})
+assert response.status_code == 200, response.data
+"""
+
+
+def test_search_follows_other_processes():
+    # The index of this process is built...
+    assert search("q=zebulon")[0] == 200
+
+    # ...then another process, that can't mark its users stale, updates one
+    def update_name(name):
+        subprocess.run(
+            [sys.executable, "-c", OTHER_PROCESS_UPDATE, EXISTING_USER_EMAIL, name],
+            env={**os.environ, "SEED_MODE": "incremental"},
+            cwd=app.root_path,
+            check=True,
+        )
+
+    # (Several workers don't share a memory cache, so skip it here)
+    name = EXISTING_USER_DATA["name"]
+    update_name("Zebulon Otherprocess")
+    try:
+        response_cache.invalidate_all()
+        status, res = search("q=zebulon otherprocess")
+        assert status == 200
+        assert [user.get("email") for user in res["users"]] == [EXISTING_USER_EMAIL]
+    finally:
+        update_name(name)
+    response_cache.invalidate_all()
+    assert search("q=zebulon otherprocess")[1]["total"] == 0
+
+
+def test_search_index_versions():
+    with app.app_context():
+        index = SearchIndex(max_age=60)
+        total = len(index.search()[0])
+
+        # Users written and deleted through the change sequence are reloaded on
+        # the next read, even renamed then deleted between two reads
+        user = User(
+            name="Other Process",
+            company="Elsewhere",
+            email="versioned@example.com",
+            phone="123-456-7890",
+        )
+        db.session.add(user)
+        db.session.flush()
+        record_user_changes([user.id])
+        db.session.commit()
+        ids, facets = index.search(q="other process")
+        assert ids == [user.id]
+
+        user.email = "versioned2@example.com"
+        record_user_changes([user.id])
+        db.session.commit()
+        db.session.delete(user)
+        record_user_deletions([(user.id, user.email)])
+        db.session.commit()
+        assert index.search(q="other process")[0] == []
+        assert len(index.search()[0]) == total
+        assert "versioned@example.com" not in index.ids_by_email
+
+
+def test_search_index_max_age():
+    with app.app_context():
+        index = SearchIndex(max_age=60)
+        total = len(index.search()[0])
+
+        # A user inserted without a version (e.g. restored from a backup) is
+        # not seen by this index
+        repository.bulk_insert(
+            User,
+            [
+                {
+                    "id": db.session.scalar(select(func.max(User.id))) + 1,
+                    "name": "Other Process",
+                    "company": "Elsewhere",
+                    "email": "other-process@example.com",
+                    "phone": "123-456-7890",
+                }
+            ],
+        )
+        db.session.commit()
+        assert len(index.search()[0]) == total
+
+        # Until the index is rebuilt after max_age seconds
+        index.built_at -= 61
+        assert len(index.search()[0]) == total + 1
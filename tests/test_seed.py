@@ -0,0 +1,70 @@
+import json
+import logging
+import pytest
+
+import scripts
+from api import app
+from models import User
+
+SEED_DATA = json.load(open(scripts.SEED_DATA_PATH))
+
+NEW_PROFILE = {
+    "name": "Seed Tester",
+    "company": "Incremental Inc",
+    "email": "seedtester@example.com",
+    "phone": "555-555-5555",
+    "skills": [{"skill": "Rust", "rating": 5}],
+}
+
+
+@pytest.fixture
+def seed_file(tmp_path, monkeypatch):
+    # Point the seeding script at a copy of the seed data, and reseed from the
+    # original file afterwards so the other tests see the usual data
+    path = tmp_path / "seed.json"
+    path.write_text(json.dumps(SEED_DATA))
+    monkeypatch.setattr(scripts, "SEED_DATA_PATH", str(path))
+
+    yield path
+
+    monkeypatch.undo()
+    app.config["SEED_MODE"] = "reset"
+    scripts.init_db()
+
+
+def test_incremental_seed(seed_file, caplog):
+    caplog.set_level(logging.INFO, logger="scripts")
+    app.config["SEED_MODE"] = "reset"
+    scripts.init_db()
+
+    # Register a user through the API, which a reload must not wipe
+    app.test_client().post(
+        "/users",
+        json={**NEW_PROFILE, "email": "apiuser@example.com"},
+    )
+
+    # The seed file is unchanged, so loading is skipped entirely
+    app.config["SEED_MODE"] = "incremental"
+    caplog.clear()
+    scripts.init_db()
+    assert "skipped loading" in caplog.text
+
+    # Change one profile and add a new one
+    changed_data = [dict(profile) for profile in SEED_DATA]
+    changed_data[0]["company"] = "Changed Company"
+    changed_data.append(NEW_PROFILE)
+    seed_file.write_text(json.dumps(changed_data))
+
+    caplog.clear()
+    scripts.init_db()
+    assert "Seeded 2 users and 3 skills" in caplog.text
+
+    with app.app_context():
+        assert User.query.count() == 998
+        user = User.query.filter_by(email=SEED_DATA[0]["email"]).first()
+        assert user.company == "Changed Company"
+        assert sorted(skill.skill for skill in user.skills) == sorted(
+            skill["skill"] for skill in SEED_DATA[0]["skills"]
+        )
+        assert User.query.filter_by(email="apiuser@example.com").first()
+        assert User.query.filter_by(email=NEW_PROFILE["email"]).first()
@@ -0,0 +1,63 @@
+import json
+
+import serialization
+from api import app, response_cache, user_fragments
+from serialization import dumps
+from .constants import EXISTING_USER_EMAIL_3
+
+
+def get(url):
+    response = app.test_client().get(url)
+    return response.status_code, json.loads(response.data.decode("utf-8"))
+
+
+def fragment(email):
+    """Return the cached JSON of the user holding email, without its version."""
+    entry = user_fragments.backend.get(email)
+    return entry and json.loads(entry.split(b"\n", 1)[1])
+
+
+def test_dumps_without_orjson(monkeypatch):
+    value = {
+        "name": "Zoë Ångström",
+        "skills": [{"skill": "C++", "rating": 5}],
+        "score": 0.5,
+        "empty": None,
+    }
+    encoded = dumps(value)
+    assert json.loads(encoded) == value
+
+    # The json module fallback produces the same bytes
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert dumps(value) == encoded
+
+
+def test_user_fragments():
+    response_cache.invalidate_all()
+    user_fragments.clear()
+
+    # GET /users
+    # The JSON of every listed user is cached...
+    status, users = get("/users?limit=5")
+    assert status == 200
+    for user in users:
+        assert fragment(user["email"]) == user
+
+    # GET /users/:email
+    # ...and reused for the same user, until the user changes
+    status, user = get(f"/users/{EXISTING_USER_EMAIL_3}")
+    assert status == 200
+    assert fragment(EXISTING_USER_EMAIL_3) == user
+
+    response = app.test_client().put(
+        f"/users/{EXISTING_USER_EMAIL_3}", json={"phone": "555-0100"}
+    )
+    assert response.status_code == 200
+    assert user_fragments.backend.get(EXISTING_USER_EMAIL_3) is None
+
+    status, updated = get(f"/users/{EXISTING_USER_EMAIL_3}")
+    assert updated == {**user, "phone": "555-0100"}
+
+    app.test_client().put(
+        f"/users/{EXISTING_USER_EMAIL_3}", json={"phone": user["phone"]}
+    )
@@ -1,7 +1,10 @@
 import json
 import pytest
+from sqlalchemy import create_engine, select, text
 
-from api import app
+from api import app, db
+from models import SkillName, User
+from scripts import migrate_skill_names
 
 
 def test_get_skills():
@@ -41,3 +44,63 @@ def test_get_skills():
     assert response.status_code == 200
     counts = [skill.get("count") for skill in res]
     assert all(count >= min_frequency and count <= max_frequency for count in counts)
+
+
+def test_get_skills_paginated():
+    response = app.test_client().get("/skills")
+    all_skills = json.loads(response.data.decode("utf-8"))
+
+    # GET /skills?limit=limit&offset=offset
+    # Retrieve a page of skills
+    response = app.test_client().get("/skills?limit=5&offset=5")
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 200
+    assert res == all_skills[5:10]
+
+    # GET /skills?min_frequency=min_frequency
+    # Failed attempt to retrieve skills with a non-integer filter
+    response = app.test_client().get("/skills?min_frequency=many")
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 400
+    assert res == "Invalid request arguments"
+
+
+def test_migrate_skill_names(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        # A skill table from before skill names were interned, with a rating
+        # stored as text and a skill listed twice for the same user
+        db.metadata.create_all(connection, tables=[User.__table__, SkillName.__table__])
+        connection.execute(
+            text(
+                "CREATE TABLE skill (id INTEGER PRIMARY KEY, user_id INTEGER, "
+                "skill VARCHAR(100) NOT NULL, rating INTEGER NOT NULL)"
+            )
+        )
+        connection.execute(text("CREATE INDEX ix_skill_skill ON skill (skill)"))
+        connection.execute(SkillName.__table__.insert(), [{"name": "Haskell"}])
+        connection.execute(
+            text(
+                "INSERT INTO skill (id, user_id, skill, rating) VALUES "
+                "(1, 1, 'OCaml', '4'), (2, 1, 'Haskell', 2), (3, 1, 'OCaml', 1), "
+                "(4, 2, 'OCaml', 5)"
+            )
+        )
+
+        migrate_skill_names(connection)
+
+        skill_ids = dict(connection.execute(select(SkillName.name, SkillName.id)).all())
+        assert set(skill_ids) == {"Haskell", "OCaml"}
+        assert connection.execute(
+            text(
+                "SELECT user_id, skill_id, rating FROM skill ORDER BY user_id, skill_id"
+            )
+        ).mappings().all() == [
+            {"user_id": 1, "skill_id": skill_ids["Haskell"], "rating": 2},
+            {"user_id": 1, "skill_id": skill_ids["OCaml"], "rating": 4},
+            {"user_id": 2, "skill_id": skill_ids["OCaml"], "rating": 5},
+        ]
+
+        # The migration only runs once
+        migrate_skill_names(connection)
+        assert connection.execute(text("SELECT count(*) FROM skill")).scalar() == 3
@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from api import app, db
+
+
+@pytest.mark.skipif(
+    make_url(app.config["SQLALCHEMY_DATABASE_URI"]).get_backend_name() != "sqlite",
+    reason="SQLite only",
+)
+def test_sqlite_pragmas():
+    # Every connection is tuned for concurrent access from several processes
+    with app.app_context():
+        with db.engine.connect() as connection:
+            pragmas = {
+                pragma: connection.execute(text(f"PRAGMA {pragma}")).scalar()
+                for pragma in ["journal_mode", "synchronous", "busy_timeout"]
+            }
+
+    assert pragmas == {
+        "journal_mode": "wal",
+        # NORMAL
+        "synchronous": 1,
+        "busy_timeout": app.config["SQLITE_BUSY_TIMEOUT"],
+    }
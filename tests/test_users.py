@@ -8,6 +8,7 @@ from .constants import (
     EXISTING_USER_EMAIL,
     EXISTING_USER_DATA,
     NON_EXISTING_USER_EMAIL,
+    sorted_skills,
 )
 
 
@@ -22,6 +23,40 @@ def test_get_users():
     assert len(res) == 996
 
 
+def test_get_users_paginated():
+    # GET /users?limit=limit
+    # Retrieve the first page of users
+    limit = 50
+    response = app.test_client().get(f"/users?limit={limit}")
+    first_page = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 200
+    assert len(first_page) == limit
+    ids = [user.get("id") for user in first_page]
+    assert ids == sorted(ids)
+
+    # GET /users?after_id=after_id&limit=limit
+    # Retrieve the next page of users, starting after the last id of the first page
+    response = app.test_client().get(f"/users?after_id={ids[-1]}&limit={limit}")
+    second_page = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 200
+    assert len(second_page) == limit
+    assert all(user.get("id") > ids[-1] for user in second_page)
+
+    # GET /users?after_id=after_id
+    # Paging past the last user returns an empty list
+    response = app.test_client().get("/users?after_id=1000000")
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 200
+    assert res == []
+
+    # GET /users?limit=limit
+    # Failed attempt to retrieve users with an invalid limit
+    response = app.test_client().get("/users?limit=0")
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 400
+    assert res == "Invalid request arguments"
+
+
 def test_get_user():
     # GET /users/:email
     # Successful retrieval of data for a user
@@ -32,7 +67,7 @@ def test_get_user():
     # Don't include the id or events in the comparison
     res.pop("id")
     res.pop("events")
-    assert res == EXISTING_USER_DATA
+    assert sorted_skills(res) == sorted_skills(EXISTING_USER_DATA)
 
     # GET /users/:email
     # Failed attempt to retrieve the data for a non-existent email
@@ -59,7 +94,7 @@ def test_register_user():
     # Don't include the id or events in the comparison
     res.pop("id")
     res.pop("events")
-    assert res == NEW_USER_DATA
+    assert sorted_skills(res) == sorted_skills(NEW_USER_DATA)
 
     # POST /users/:email
     # Failed attempt to register a user with an email that already exists
@@ -90,7 +125,7 @@ def test_update_user():
     response = app.test_client().get(f"/users/{EXISTING_USER_EMAIL}")
     res = json.loads(response.data.decode("utf-8"))
     assert res.get("phone") == UPDATE_DATA.get("phone")
-    assert res.get("skills") == UPDATE_DATA.get("skills")
+    assert sorted_skills(res)["skills"] == sorted_skills(UPDATE_DATA)["skills"]
 
     # PUT /users/:email
     # Failed attempt to update the data for a non-existent email
@@ -102,6 +137,47 @@ def test_update_user():
     assert res == f"User '{NON_EXISTING_USER_EMAIL}' does not exist"
 
 
+def test_skill_ratings():
+    email = "ratings@example.com"
+    client = app.test_client()
+
+    # POST /users and PUT /users/:email
+    # Ratings sent as numeric strings are stored as integers
+    response = client.post(
+        "/users",
+        json={
+            **NEW_USER_DATA,
+            "email": email,
+            "skills": [{"skill": "Go", "rating": "4"}],
+        },
+    )
+    assert response.status_code == 200
+    response = client.get(f"/users/{email}")
+    assert json.loads(response.data.decode("utf-8"))["skills"] == [
+        {"skill": "Go", "rating": 4}
+    ]
+
+    response = client.put(
+        f"/users/{email}", json={"skills": [{"skill": "Rust", "rating": "2"}]}
+    )
+    assert response.status_code == 200
+    response = client.get(f"/users/{email}")
+    assert json.loads(response.data.decode("utf-8"))["skills"] == [
+        {"skill": "Rust", "rating": 2}
+    ]
+
+    # Booleans and strings that aren't integers are rejected
+    for rating in [True, "three", "2.5", 2.5, None]:
+        response = client.put(
+            f"/users/{email}", json={"skills": [{"skill": "Rust", "rating": rating}]}
+        )
+        res = json.loads(response.data.decode("utf-8"))
+        assert response.status_code == 400
+        assert res == "Invalid skill entry provided"
+
+    assert client.delete(f"/users/{email}").status_code == 200
+
+
 def test_delete_user():
     # DELETE /users/:email
     # Successful deletion
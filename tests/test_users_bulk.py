@@ -0,0 +1,155 @@
+import json
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+
+from api import app
+from .constants import EXISTING_USER_EMAIL_2, NON_EXISTING_USER_EMAIL
+
+BULK_USERS = [
+    {
+        "name": f"Bulk User {i}",
+        "company": "Bulk Co",
+        "email": f"bulk{i}@example.com",
+        "phone": "111-111-1111",
+        "skills": [{"skill": "Go", "rating": 3}],
+    }
+    for i in range(3)
+]
+
+
+def test_register_users_bulk():
+    # POST /users/bulk
+    # Failed attempt to register a batch containing an invalid user
+    invalid_batch = BULK_USERS + [{"name": "No Email"}]
+    response = app.test_client().post("/users/bulk", json=invalid_batch)
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 400
+    assert [user.get("result") for user in res] == [
+        "not_registered",
+        "not_registered",
+        "not_registered",
+        "missing_fields",
+    ]
+
+    # Nothing was written
+    response = app.test_client().get(f"/users/{BULK_USERS[0]['email']}")
+    assert response.status_code == 400
+
+    # POST /users/bulk?mode=partial
+    # Register the valid users of the batch and report the invalid ones
+    partial_batch = BULK_USERS + [
+        {**BULK_USERS[0], "name": "Duplicate"},
+        {**BULK_USERS[0], "email": EXISTING_USER_EMAIL_2},
+        {**BULK_USERS[0], "email": [BULK_USERS[0]["email"]]},
+        {**BULK_USERS[0], "email": "listphone@example.com", "phone": {"x": 1}},
+    ]
+    response = app.test_client().post("/users/bulk?mode=partial", json=partial_batch)
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 200
+    assert [user.get("result") for user in res] == [
+        "registered",
+        "registered",
+        "registered",
+        "duplicate_email",
+        "already_exists",
+        "invalid_fields",
+        "invalid_fields",
+    ]
+
+    # GET /users/:email
+    # Verify the users were registered
+    response = app.test_client().get(f"/users/{BULK_USERS[1]['email']}")
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 200
+    assert res.get("name") == BULK_USERS[1]["name"]
+    assert res.get("skills") == BULK_USERS[1]["skills"]
+
+
+def test_update_users_bulk():
+    updates = [
+        {"email": BULK_USERS[0]["email"], "phone": "222-222-2222"},
+        {
+            "email": BULK_USERS[1]["email"],
+            "new_email": "renamed@example.com",
+            "skills": [{"skill": "Elixir", "rating": 5}],
+        },
+    ]
+
+    # PATCH /users/bulk
+    # Successful update of a batch of users
+    response = app.test_client().patch("/users/bulk", json=updates)
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 200
+    assert [user.get("result") for user in res] == ["updated", "updated"]
+
+    # GET /users/:email
+    # Verify the users were updated
+    response = app.test_client().get(f"/users/{BULK_USERS[0]['email']}")
+    res = json.loads(response.data.decode("utf-8"))
+    assert res.get("phone") == "222-222-2222"
+    assert res.get("skills") == BULK_USERS[0]["skills"]
+
+    response = app.test_client().get("/users/renamed@example.com")
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 200
+    assert res.get("skills") == [{"skill": "Elixir", "rating": 5}]
+
+    # PATCH /users/bulk
+    # Failed attempt to update a batch containing an unknown user
+    response = app.test_client().patch(
+        "/users/bulk",
+        json=[
+            {"email": BULK_USERS[2]["email"], "phone": "333-333-3333"},
+            {"email": NON_EXISTING_USER_EMAIL, "phone": "333-333-3333"},
+        ],
+    )
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 400
+    assert [user.get("result") for user in res] == ["not_updated", "user_not_found"]
+
+    # PATCH /users/bulk?mode=partial
+    # Fields that aren't strings are reported
+    response = app.test_client().patch(
+        "/users/bulk?mode=partial",
+        json=[
+            {"email": [BULK_USERS[2]["email"]], "phone": "333-333-3333"},
+            {"email": BULK_USERS[2]["email"], "new_email": ["x@example.com"]},
+        ],
+    )
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 200
+    assert [user.get("result") for user in res] == ["invalid_fields", "invalid_fields"]
+
+    # PATCH /users/bulk?mode=mode
+    # Failed attempt to update with an invalid mode
+    response = app.test_client().patch("/users/bulk?mode=sometimes", json=updates)
+    res = json.loads(response.data.decode("utf-8"))
+    assert response.status_code == 400
+    assert res == "Invalid request arguments"
+
+
+def test_register_users_concurrently():
+    def register(batch):
+        client = app.test_client()
+        if batch == 0:
+            # POST /users
+            response = client.post("/users", json={**BULK_USERS[0], "email": "c@x.io"})
+        else:
+            # POST /users/bulk
+            response = client.post(
+                "/users/bulk",
+                json=[
+                    {**BULK_USERS[0], "email": f"concurrent{batch}-{i}@example.com"}
+                    for i in range(50)
+                ],
+            )
+        return response.status_code
+
+    # Batches registered at the same time never pick the same user ids
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        statuses = list(executor.map(register, range(8)))
+    assert statuses == [200] * 8
+
+    response = app.test_client().get("/users/concurrent7-49@example.com")
+    assert response.status_code == 200
+    assert json.loads(response.data)["skills"] == BULK_USERS[0]["skills"]